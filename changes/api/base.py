@@ -1,11 +1,15 @@
 import json
 
 from base64 import urlsafe_b64encode, urlsafe_b64decode
+from datetime import datetime
 from functools import wraps
 from urllib import quote
+from uuid import UUID
 import logging
 
 from flask import Response, request, current_app
+from sqlalchemy import DateTime, Integer, String
+from sqlalchemy.sql import literal, tuple_
 
 from flask.ext.sqlalchemy import get_debug_queries
 
@@ -14,6 +18,7 @@ from flask.ext.restful import Resource
 from changes.api.serializer import serialize as serialize_func
 from changes.config import db
 from changes.config import statsreporter
+from changes.db.types.guid import GUID
 
 from time import time
 
@@ -166,7 +171,7 @@ class APIView(Resource):
             ))
         return link_values
 
-    def cursor_paginate(self, queryset, id_func=lambda e: e.id, **kwargs):
+    def cursor_paginate(self, queryset, id_func=lambda e: e.id, sort_keys=None, **kwargs):
         """
         Paginates results using a cursor:
           next page url: ?after=<id_of_last_elem>
@@ -174,9 +179,14 @@ class APIView(Resource):
         This is more stable than offset pagination, especially for real-time
         datasets (people can share static links to builds, for example.)
 
-        queryset: all the data (seems kind of inefficient...)
+        queryset: all the data. If sort_keys is given, this must be an
+        unordered SQLAlchemy query, and only the rows of the requested page are
+        fetched; otherwise the whole sequence is scanned for the cursor.
         id_func (function): maps a single queryset entry to a unique id used
-        for pagination.
+        for pagination. Unused if sort_keys is given.
+        sort_keys (list): columns which together are unique for each row,
+        e.g. [Build.date_created, Build.id]. Results are returned in
+        descending order of these, and cursors encode their values.
         **kwargs:
           fake_request (dict): used by unittest code: items within it
                                override request.args
@@ -188,6 +198,9 @@ class APIView(Resource):
             my_request_args.update(kwargs['fake_request'])
             del kwargs['fake_request']
 
+        if sort_keys:
+            return self._keyset_paginate(queryset, sort_keys, my_request_args, **kwargs)
+
         after = my_request_args.get('after')
         before = my_request_args.get('before')
 
@@ -250,6 +263,105 @@ class APIView(Resource):
         )
         return self.respond(page_of_results, links=links, **kwargs)
 
+    def _keyset_paginate(self, queryset, sort_keys, request_args, **kwargs):
+        """
+        cursor_paginate() for queries, which seeks to the cursor with a
+        WHERE clause on the sort keys so each page costs the same regardless
+        of how far into the results it is.
+        """
+        after = request_args.get('after')
+        before = request_args.get('before')
+        per_page = int(request_args.get('per_page', 25))
+
+        if per_page == 0:
+            return self.respond(list(queryset.order_by(*[k.desc() for k in sort_keys])), **kwargs)
+
+        if after and before:
+            return "Paging Error: cannot pass both after and before as args!", 400
+
+        def sort_key_values(row):
+            return [getattr(row, key.key) for key in sort_keys]
+
+        def first_page():
+            return list(queryset.order_by(
+                *[k.desc() for k in sort_keys]
+            ).limit(per_page + 1))
+
+        if after or before:
+            which_token = "after" if after else "before"
+            try:
+                cursor = self._decode_cursor(after or before, sort_keys)
+            except Exception:
+                return "Paging Error: %s has an invalid value!" % (which_token), 400
+            cursor = tuple_(*[literal(v, type_=k.type) for k, v in zip(sort_keys, cursor)])
+
+        if after:
+            rows = list(queryset.filter(
+                tuple_(*sort_keys) < cursor,
+            ).order_by(
+                *[k.desc() for k in sort_keys]
+            ).limit(per_page + 1))
+            has_previous = True
+            has_next = len(rows) > per_page
+        elif before:
+            rows = list(queryset.filter(
+                tuple_(*sort_keys) > cursor,
+            ).order_by(
+                *[k.asc() for k in sort_keys]
+            ).limit(per_page + 1))
+            if len(rows) > per_page:
+                rows = rows[per_page - 1::-1]
+                has_previous = True
+                has_next = True
+            else:
+                # Like the in-memory pagination, paging back past the start
+                # returns a full first page.
+                rows = first_page()
+                has_previous = False
+                has_next = len(rows) > per_page
+        else:
+            rows = first_page()
+            has_previous = False
+            has_next = len(rows) > per_page
+
+        rows = rows[:per_page]
+        links = self.make_cursor_links(
+            self._encode_cursor(sort_key_values(rows[0])) if has_previous and rows else None,
+            self._encode_cursor(sort_key_values(rows[-1])) if has_next else None,
+        )
+        return self.respond(rows, links=links, **kwargs)
+
+    def _encode_cursor(self, values):
+        def encode_value(value):
+            if isinstance(value, datetime):
+                return value.isoformat()
+            elif isinstance(value, UUID):
+                return value.hex
+            return value
+        return json.dumps([encode_value(v) for v in values], separators=(',', ':'))
+
+    def _decode_cursor(self, token, sort_keys):
+        """
+        Returns the sort key values encoded in `token`. Raises if they
+        aren't values of the sort keys' types, so that a malformed token is
+        rejected before it's used in a query.
+        """
+        values = json.loads(urlsafe_b64decode(str(token)))
+        assert isinstance(values, list) and len(values) == len(sort_keys)
+
+        def decode_value(key, value):
+            if isinstance(key.type, DateTime):
+                fmt = '%Y-%m-%dT%H:%M:%S.%f' if '.' in value else '%Y-%m-%dT%H:%M:%S'
+                return datetime.strptime(value, fmt)
+            elif isinstance(key.type, GUID):
+                return UUID(hex=value)
+            elif isinstance(key.type, Integer):
+                assert isinstance(value, (int, long))
+            elif isinstance(key.type, String):
+                assert isinstance(value, basestring)
+            return value
+        return [decode_value(k, v) for k, v in zip(sort_keys, values)]
+
     def make_cursor_links(self, before_id=None, after_id=None):
         """
         Creates the next/previous links using a specific format. Will
@@ -1,5 +1,7 @@
 import json
 
+from datetime import datetime
+
 from changes.config import db
 from changes.models.build import Build
 from changes.api.base import APIView, error
@@ -38,6 +40,8 @@ class BuildTagAPIView(APIView):
             return self.respond({}, status_code=404)
 
         build.tags = args.tags
+        # invalidates its cached serialized form
+        build.date_modified = datetime.utcnow()
 
         db.session.add(build)
         db.session.commit()
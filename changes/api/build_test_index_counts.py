@@ -1,10 +1,52 @@
-from sqlalchemy.orm import contains_eager
+from sqlalchemy.sql import func
 
 from changes.api.base import APIView
+from changes.config import db
 from changes.constants import Result
 from changes.models.build import Build
+from changes.models.itemstat import ItemStat
 from changes.models.job import Job
 from changes.models.test import TestCase
+from changes.models.testresult import TEST_RESULT_STAT_NAMES, get_result_stat_name
+
+
+def _get_counts_from_stats(build):
+    """
+    Returns the number of tests with each result from the result counts
+    rolled up into the stats of the build, or None if the build doesn't
+    have them (it isn't finished, or was ingested before they existed).
+    """
+    stats = dict(db.session.query(
+        ItemStat.name, ItemStat.value,
+    ).filter(
+        ItemStat.item_id == build.id,
+        ItemStat.name.in_(TEST_RESULT_STAT_NAMES + ('test_count',)),
+    ))
+    test_count = stats.pop('test_count', None)
+    if test_count is None or sum(stats.values()) != test_count:
+        return None
+    return {result.name: stats.get(get_result_stat_name(result), 0) for result in Result}
+
+
+def _get_counts_from_tests(build):
+    """
+    Returns the number of tests with each result by counting the build's
+    TestCases.
+    """
+    counts = db.session.query(
+        TestCase.result, func.count(TestCase.id),
+    ).join(
+        Job, TestCase.job_id == Job.id,
+    ).filter(
+        Job.build_id == build.id,
+    ).group_by(
+        TestCase.result,
+    )
+
+    count_dict = {result.name: 0 for result in Result}
+    for result, count in counts:
+        count_dict[result.name] = count
+    return count_dict
 
 
 class BuildTestIndexCountsAPIView(APIView):
@@ -14,17 +56,8 @@ class BuildTestIndexCountsAPIView(APIView):
         if build is None:
             return '', 404
 
-        test_list = TestCase.query.options(
-            contains_eager('job')
-        ).join(
-            Job, TestCase.job_id == Job.id,
-        ).filter(
-            Job.build_id == build.id,
-        )
-
-        count_dict = {result.name: 0 for result in Result}
-
-        for test in test_list:
-            count_dict[test.result.name] += 1
+        count_dict = _get_counts_from_stats(build)
+        if count_dict is None:
+            count_dict = _get_counts_from_tests(build)
 
         return self.respond(count_dict)
@@ -1,9 +1,10 @@
 from __future__ import absolute_import, division, unicode_literals
 
-from flask import Response, request
+from flask import Response, request, stream_with_context
 
 from changes.api.base import APIView
-from changes.models.log import LogChunk, LogSource
+from changes.lib import log_reader
+from changes.models.log import LOG_CHUNK_SIZE, LogChunk, LogSource
 
 
 LOG_BATCH_SIZE = 50000  # in length of chars
@@ -27,6 +28,36 @@ class JobLogDetailsAPIView(APIView):
         elif limit == -1:
             limit = LOG_BATCH_SIZE
 
+        if source.date_compacted is not None:
+            start, end = self._get_compacted_range(source, offset, limit)
+            if raw:
+                # stream the log rather than reading it all in at once
+                return Response(stream_with_context(log_reader.iter_log(source, start, end - start)),
+                                mimetype='text/plain')
+            logchunks = self._get_compacted_chunks(source, start, end)
+        else:
+            logchunks = self._get_chunks(source, offset, limit)
+
+        if logchunks:
+            next_offset = logchunks[-1].offset + logchunks[-1].size + 1
+        else:
+            next_offset = offset
+
+        if raw:
+            return Response(''.join(l.text for l in logchunks), mimetype='text/plain')
+
+        context = self.serialize({
+            'source': source,
+            'chunks': logchunks,
+            'nextOffset': next_offset,
+        })
+        context['source']['step'] = self.serialize(source.step)
+        if source.step:
+            context['source']['step']['phase'] = self.serialize(source.step.phase),
+
+        return self.respond(context, serialize=False)
+
+    def _get_chunks(self, source, offset, limit):
         queryset = LogChunk.query.filter(
             LogChunk.source_id == source.id,
         ).order_by(LogChunk.offset.desc())
@@ -54,22 +85,38 @@ class JobLogDetailsAPIView(APIView):
             logchunks = list(queryset)
 
         logchunks.sort(key=lambda x: x.date_created)
+        return logchunks
 
-        if logchunks:
-            next_offset = logchunks[-1].offset + logchunks[-1].size + 1
+    def _get_compacted_range(self, source, offset, limit):
+        """
+        Returns the range of text covered by the chunks `_get_chunks` would
+        return if the log was stored in chunks of LOG_CHUNK_SIZE.
+        """
+        size = log_reader.get_log_size(source)
+        if offset == -1:
+            # chunks ending at or after size - limit
+            tail_start = max(size - limit, 0) if limit else 0
+            first = max((tail_start + LOG_CHUNK_SIZE - 1) // LOG_CHUNK_SIZE - 1, 0)
+            end = size
         else:
-            next_offset = offset
-
-        if raw:
-            return Response(''.join(l.text for l in logchunks), mimetype='text/plain')
-
-        context = self.serialize({
-            'source': source,
-            'chunks': logchunks,
-            'nextOffset': next_offset,
-        })
-        context['source']['step'] = self.serialize(source.step)
-        if source.step:
-            context['source']['step']['phase'] = self.serialize(source.step.phase),
-
-        return self.respond(context, serialize=False)
+            # chunks starting after offset, and at or before offset + limit
+            first = offset // LOG_CHUNK_SIZE + 1
+            if limit:
+                end = min(((offset + limit) // LOG_CHUNK_SIZE + 1) * LOG_CHUNK_SIZE, size)
+            else:
+                end = size
+        return min(first * LOG_CHUNK_SIZE, end), end
+
+    def _get_compacted_chunks(self, source, start, end):
+        text = log_reader.read_log(source, start, end - start)
+        return [
+            LogChunk(
+                source=source,
+                job_id=source.job_id,
+                project_id=source.project_id,
+                offset=start + i,
+                size=len(text[i:i + LOG_CHUNK_SIZE]),
+                text=text[i:i + LOG_CHUNK_SIZE],
+            )
+            for i in xrange(0, len(text), LOG_CHUNK_SIZE)
+        ]
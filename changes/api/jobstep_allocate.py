@@ -3,14 +3,17 @@ import json
 import logging
 from datetime import datetime
 from uuid import UUID
-from flask import request
+from flask import current_app, request
 from flask_restful.reqparse import RequestParser
 from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import contains_eager
 from sqlalchemy.sql import func
 from changes.api.base import APIView, error
 from changes.constants import Status
 from changes.config import db, redis, statsreporter
 from changes.ext.redis import UnableToGetLock
+from changes.jobs.sync_job_step import is_adaptive_polling_enabled
+from changes.lib import allocation_queue, heartbeats
 from changes.models.build import Build
 from changes.models.job import Job
 from changes.models.jobplan import JobPlan
@@ -20,25 +23,16 @@ from changes.constants import DEFAULT_CPUS, DEFAULT_MEMORY_MB
 
 class JobStepAllocateAPIView(APIView):
     def find_next_jobsteps(self, limit=10, cluster=None):
-        cluster_filter = JobStep.cluster == cluster if cluster else JobStep.cluster.is_(None)
-
-        # find projects with pending allocations
-        project_list = [p for p, in db.session.query(
-            JobStep.project_id,
-        ).filter(
-            JobStep.status == Status.pending_allocation,
-            cluster_filter,
-        ).group_by(
-            JobStep.project_id
-        )]
-        if not project_list:
-            return []
+        if allocation_queue.is_enabled():
+            return self.find_next_jobsteps_from_queue(limit, cluster)
+        return self.find_next_jobsteps_from_db(limit, cluster)
 
+    def get_unavailable_projects(self, project_list):
         # TODO(dcramer): this should be configurably and handle more cases
         # than just 'active job' as that can be 1 step or 100 steps
         # find the total number of job steps in progress per project
         # hard limit of 10 active jobs per project
-        unavail_projects = [
+        return [
             p for p, c in
             db.session.query(
                 Job.project_id, func.count(Job.project_id),
@@ -51,6 +45,71 @@ class JobStepAllocateAPIView(APIView):
             if c >= 10
             ]
 
+    def find_next_jobsteps_from_queue(self, limit=10, cluster=None):
+        """
+        Same as find_next_jobsteps_from_db, but only considers the first
+        JOBSTEP_ALLOCATION_QUEUE_WINDOW steps of the allocation queue rather
+        than every pending step.
+        """
+        window = max(limit, current_app.config['JOBSTEP_ALLOCATION_QUEUE_WINDOW'])
+        candidate_ids = allocation_queue.get_candidates(cluster, window)
+        if not candidate_ids:
+            return []
+
+        jobsteps = {
+            jobstep.id.hex: jobstep
+            for jobstep in JobStep.query.options(
+                contains_eager('job'),
+            ).join(
+                Job, JobStep.job_id == Job.id,
+            ).filter(
+                JobStep.id.in_(candidate_ids),
+                JobStep.status == Status.pending_allocation,
+                JobStep.cluster == cluster if cluster else JobStep.cluster.is_(None),
+            )
+        }
+        stale_ids = [i for i in candidate_ids if i not in jobsteps]
+        if stale_ids:
+            allocation_queue.remove(cluster, stale_ids)
+            statsreporter.stats().incr('jobstep_allocation_queue_stale_read', len(stale_ids))
+
+        candidates = [jobsteps[i] for i in candidate_ids if i in jobsteps]
+        if not candidates:
+            return []
+
+        unavail_projects = set(self.get_unavailable_projects({j.project_id for j in candidates}))
+        available = [j for j in candidates if j.project_id not in unavail_projects]
+
+        # prioritize a job that's has already started, then any available
+        # project, and then let burst (as in find_next_jobsteps_from_db)
+        results = [
+            j for j in available
+            if j.job.status in (Status.allocated, Status.in_progress)
+        ][:limit]
+        for tier in (available, candidates):
+            if len(results) >= limit:
+                break
+            chosen = set(results)
+            results.extend([j for j in tier if j not in chosen][:limit - len(results)])
+        return results
+
+    def find_next_jobsteps_from_db(self, limit=10, cluster=None):
+        cluster_filter = JobStep.cluster == cluster if cluster else JobStep.cluster.is_(None)
+
+        # find projects with pending allocations
+        project_list = [p for p, in db.session.query(
+            JobStep.project_id,
+        ).filter(
+            JobStep.status == Status.pending_allocation,
+            cluster_filter,
+        ).group_by(
+            JobStep.project_id
+        )]
+        if not project_list:
+            return []
+
+        unavail_projects = self.get_unavailable_projects(project_list)
+
         base_filters = [
             JobStep.status == Status.pending_allocation,
             cluster_filter,
@@ -193,6 +252,9 @@ class JobStepAllocateAPIView(APIView):
                         statsreporter.stats().log_timing('duration_pending_allocation', pending_seconds * 1000)
 
                     db.session.commit()
+                    if is_adaptive_polling_enabled():
+                        # their next heartbeat is from the client they were allocated to
+                        heartbeats.clear_seen(jobsteps)
 
                     return self.respond({'allocated': jobstep_ids})
             except UnableToGetLock:
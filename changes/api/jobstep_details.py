@@ -13,7 +13,7 @@ from changes.config import db
 from changes.constants import Result, Status
 from changes.db.utils import get_or_create
 from changes.jobs.sync_job import sync_job
-from changes.jobs.sync_job_step import is_final_jobphase
+from changes.jobs.sync_job_step import is_final_jobphase, wake_sync_job_step
 from changes.models.command import Command
 from changes.models.failurereason import FailureReason
 from changes.models.jobplan import JobPlan
@@ -185,6 +185,8 @@ class JobStepDetailsAPIView(APIView):
         if db.session.is_modified(jobstep):
             db.session.commit()
 
+            wake_sync_job_step(jobstep)
+
             # TODO(dcramer): this is a little bit hacky, but until we can entirely
             # move to push APIs we need a good way to handle the existing sync
             job = jobstep.job
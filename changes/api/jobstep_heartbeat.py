@@ -2,17 +2,22 @@ from __future__ import absolute_import
 
 from datetime import datetime
 from flask_restful.reqparse import RequestParser
+from flask_restful.types import boolean
 
 from changes.api.base import APIView, error
 from changes.api.validators.datetime import ISODatetime
 from changes.config import db
 from changes.constants import Result
+from changes.jobs.sync_job_step import is_adaptive_polling_enabled, wake_sync_job_step
+from changes.lib import heartbeats
 from changes.models.jobstep import JobStep
 
 
 class JobStepHeartbeatAPIView(APIView):
     post_parser = RequestParser()
     post_parser.add_argument('date', type=ISODatetime())
+    # respond with no content rather than the serialized jobstep
+    post_parser.add_argument('brief', type=boolean, default=False)
 
     def post(self, step_id):
         jobstep = JobStep.query.get(step_id)
@@ -28,8 +33,16 @@ class JobStepHeartbeatAPIView(APIView):
 
         current_datetime = args.date or datetime.utcnow()
 
-        jobstep.last_heartbeat = current_datetime
-        db.session.add(jobstep)
+        # the first heartbeat tells us the step has been picked up, which only
+        # matters to adaptive polling
+        is_first_heartbeat = is_adaptive_polling_enabled() and heartbeats.mark_seen(jobstep)
+
+        heartbeats.record(jobstep, current_datetime)
         db.session.commit()
 
+        if is_first_heartbeat:
+            wake_sync_job_step(jobstep)
+
+        if args.brief:
+            return '', 204
         return self.respond(jobstep)
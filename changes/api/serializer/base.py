@@ -2,9 +2,11 @@ from collections import defaultdict
 from datetime import datetime
 from enum import Enum
 from uuid import UUID
-from typing import cast, Any, Callable, Dict, Generic, Iterable, List, Optional, TypeVar  # NOQA
+from typing import cast, Any, Callable, Dict, Generic, Iterable, List, Optional, Tuple, TypeVar  # NOQA
 from itertools import izip
 
+from changes.api.serializer import cache as crumble_cache
+
 
 # Types for which serialization is a no-op. Everything boils down to these (or
 # to objects without crumblers, which we pass through unscathed)
@@ -66,10 +68,16 @@ def _finalize_futures(needs_crumble, extended_registry):
     been collected, so that we can do `get_extra_attrs_from_db` for many objects
     at a time.
 
+    Items whose crumblers opt in to caching are looked up in the crumble
+    cache first, and the fully serialized form of those that weren't found is
+    stored there once everything has been crumbled.
+
     Args:
         needs_crumble: list of initial Future objects to be crumbled
         extended_registry: additional crumblers to use for this serialization
     """
+    use_cache = crumble_cache.is_enabled()
+    cache_misses = []  # type: List[Tuple[str, Future]]
     while needs_crumble:
         fetches_by_class = defaultdict(list)  # type: Dict[type, List[Future]]
         for future in needs_crumble:
@@ -84,6 +92,10 @@ def _finalize_futures(needs_crumble, extended_registry):
                 for future in futures:
                     future.final = future.data
                 continue
+            if use_cache:
+                futures = _finalize_cached_futures(crumbler, futures, cache_misses)
+                if not futures:
+                    continue
             extra_attrs = crumbler.get_extra_attrs_from_db(
                 {future.data for future in futures})
             for future in futures:
@@ -91,6 +103,38 @@ def _finalize_futures(needs_crumble, extended_registry):
                 crumbled = crumbler.crumble(item, extra_attrs.get(item))
                 future.final = _gather(crumbled, needs_crumble)
 
+    if cache_misses:
+        crumble_cache.set_many({key: _expand(future.final) for key, future in cache_misses})
+
+
+def _finalize_cached_futures(crumbler, futures, cache_misses):
+    # type: (Crumbler[object], List[Future], List[Tuple[str, Future]]) -> List[Future]
+    """
+    Finalizes those of `futures` whose serialized form is in the crumble
+    cache, and returns the rest, which still need to be crumbled. Cacheable
+    futures which weren't found are appended to `cache_misses` along with
+    their cache key.
+    """
+    keys = {}  # type: Dict[Future, str]
+    for future in futures:
+        key = crumble_cache.get_cache_key(crumbler, future.data)
+        if key is not None:
+            keys[future] = key
+    if not keys:
+        return futures
+
+    cached = crumble_cache.get_many(set(keys.itervalues()))
+    remaining = []
+    for future in futures:
+        key = keys.get(future)
+        if key in cached:
+            future.final = cached[key]
+        else:
+            if key is not None:
+                cache_misses.append((key, future))
+            remaining.append(future)
+    return remaining
+
 
 def _expand(data):
     # type: (object) -> object
@@ -225,6 +269,21 @@ class Crumbler(Generic[T]):
         """
         return {}
 
+    def get_cache_version(self, item):
+        # type: (T) -> Optional[str]
+        """
+        Crumblers can opt in to caching the serialized form of items which
+        will no longer change (e.g. finished builds) by returning a version
+        stamp for them that changes whenever the item does. Items for which
+        this returns None are crumbled every time, as are the items of
+        crumblers which only inherit this.
+
+        The cached form includes everything nested in the item, so only opt in
+        if that doesn't change either (or is fine to be stale for
+        SERIALIZER_CACHE_TTL).
+        """
+        return None
+
     def crumble(self, item, attrs):
         # type: (T, Dict[str, Any]) -> object
         """
@@ -0,0 +1,110 @@
+"""
+Cache of the serialized form of objects which will no longer change, such as
+finished builds.
+
+Crumblers opt in by defining `get_cache_version` to return a version stamp
+(subclasses of a crumbler that does aren't cached unless they define it too,
+as they serialize items differently). The fully serialized form of an item is
+then stored under its crumbler, type, id and version, first in a small in-process LRU and then in Redis, so that
+subsequent requests (from this or any other process) can skip crumbling the
+item and everything nested in it. Both expire after SERIALIZER_CACHE_TTL.
+"""
+
+from __future__ import absolute_import
+
+import json
+import logging
+
+from flask import current_app
+
+from changes.config import redis, statsreporter
+from changes.utils.cache import LRUCache
+
+logger = logging.getLogger('changes.serializer.cache')
+
+_local_cache = None
+
+
+def is_enabled():
+    return current_app.config['SERIALIZER_CACHE_ENABLED']
+
+
+def _get_local_cache():
+    global _local_cache
+    if _local_cache is None:
+        _local_cache = LRUCache(max_size=current_app.config['SERIALIZER_CACHE_LOCAL_SIZE'],
+                                ttl=current_app.config['SERIALIZER_CACHE_TTL'])
+    return _local_cache
+
+
+def clear_local_cache():
+    _get_local_cache().clear()
+
+
+def get_cache_key(crumbler, item):
+    """
+    Returns the key to cache the serialized form of `item` under, or None if
+    it shouldn't be cached.
+    """
+    crumbler_cls = type(crumbler)
+    if 'get_cache_version' not in crumbler_cls.__dict__:
+        return None
+    version = crumbler.get_cache_version(item)
+    if version is None:
+        return None
+    return 'crumble:{}.{}:{}:{}:{}'.format(
+        crumbler_cls.__module__, crumbler_cls.__name__, type(item).__name__, item.id.hex, version)
+
+
+def get_many(keys):
+    """
+    Returns a dict of the cached value of each of `keys` that is in the
+    cache.
+    """
+    local_cache = _get_local_cache()
+    result = {}
+    remote_keys = []
+    for key in keys:
+        value = local_cache.get(key)
+        if value is None:
+            remote_keys.append(key)
+        else:
+            result[key] = json.loads(value)
+
+    if remote_keys:
+        try:
+            remote_values = redis.mget(remote_keys)
+        except Exception:
+            logger.exception('Unable to fetch serialized objects from redis')
+            remote_values = [None] * len(remote_keys)
+        for key, value in zip(remote_keys, remote_values):
+            if value is not None:
+                local_cache[key] = value
+                result[key] = json.loads(value)
+
+    stats = statsreporter.stats()
+    stats.incr('serializer_cache_local_hit', len(keys) - len(remote_keys))
+    stats.incr('serializer_cache_redis_hit', len(result) - (len(keys) - len(remote_keys)))
+    stats.incr('serializer_cache_miss', len(keys) - len(result))
+    return result
+
+
+def set_many(values):
+    """
+    Caches each of `values` (a dict of key to serialized object).
+    """
+    local_cache = _get_local_cache()
+    ttl = current_app.config['SERIALIZER_CACHE_TTL']
+    pipe = redis.pipeline(transaction=False)
+    for key, value in values.iteritems():
+        try:
+            encoded = json.dumps(value)
+        except TypeError:
+            # contains an object we don't know how to serialize
+            continue
+        local_cache[key] = encoded
+        pipe.setex(key, encoded, ttl)
+    try:
+        pipe.execute()
+    except Exception:
+        logger.exception('Unable to store serialized objects in redis')
@@ -1,5 +1,5 @@
 from changes.api.serializer import Crumbler, register
-from changes.constants import SelectiveTestingPolicy
+from changes.constants import SelectiveTestingPolicy, Status
 from changes.models.build import Build
 from changes.models.failurereason import FailureReason
 from changes.models.itemstat import ItemStat
@@ -53,6 +53,11 @@ class BuildCrumbler(Crumbler):
 
         return result
 
+    def get_cache_version(self, item):
+        if item.status == Status.finished and item.date_modified:
+            return item.date_modified.isoformat()
+        return None
+
     def crumble(self, item, attrs):
         if item.project_id:
             avg_build_time = item.project.avg_build_time
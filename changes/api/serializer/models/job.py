@@ -1,6 +1,7 @@
 from sqlalchemy.orm import joinedload
 
 from changes.api.serializer import Crumbler, register, serialize
+from changes.constants import Status
 from changes.models.build import Build
 from changes.models.itemstat import ItemStat
 from changes.models.job import Job
@@ -23,6 +24,11 @@ class JobCrumbler(Crumbler):
 
         return result
 
+    def get_cache_version(self, instance):
+        if instance.status == Status.finished and instance.date_modified:
+            return instance.date_modified.isoformat()
+        return None
+
     def crumble(self, instance, attrs):
         if instance.project_id:
             avg_build_time = instance.project.avg_build_time
@@ -1,5 +1,6 @@
 from collections import defaultdict
 from changes.api.serializer import Crumbler, register
+from changes.constants import Status
 from changes.models.jobplan import JobPlan
 from changes.models.jobstep import JobStep
 
@@ -26,6 +27,14 @@ class JobStepCrumbler(Crumbler):
 
         return result
 
+    def get_cache_version(self, instance):
+        # Finished steps can still be replaced by a retry.
+        if instance.status == Status.finished and instance.date_finished:
+            return '{}-{}'.format(
+                instance.date_finished.isoformat(),
+                instance.replacement_id.hex if instance.replacement_id else '')
+        return None
+
     def crumble(self, instance, attrs):
         jobplan = attrs['jobplan']
         return {
@@ -30,7 +30,7 @@ class AnalyticsJsonHandler(ArtifactHandler):
         super(AnalyticsJsonHandler, self).__init__(step)
         self.max_artifact_bytes = current_app.config['MAX_ARTIFACT_BYTES_ANALYTICS_JSON']
 
-    def process(self, fp, artifact):
+    def process(self, fp, artifact, size=None):
         allowed_tables = current_app.config.get('ANALYTICS_PROJECT_TABLES', [])
         try:
             contents = json.load(fp)
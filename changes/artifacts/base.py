@@ -52,9 +52,10 @@ class ArtifactHandler(object):
                 return True
         return False
 
-    def process(self, fp, artifact):
+    def process(self, fp, artifact, size=None):
         """
-        Process the given artifact.
+        Process the given artifact, whose content is read from `fp`. `size`
+        is the size of the content in bytes, if the caller already knows it.
         """
 
     def report_malformed(self):
@@ -13,7 +13,7 @@ from changes.utils.agg import aggregate_result
 class BazelTargetHandler(XunitHandler):
     FILENAMES = ('test.bazel.xml',)
 
-    def process(self, fp, artifact):
+    def process(self, fp, artifact, size=None):
         target_name = self._get_target_name(artifact)
         target, _ = get_or_create(BazelTarget, where={
             'step_id': self.step.id,
@@ -1,51 +1,138 @@
 from __future__ import absolute_import, division
 
-from collections import defaultdict
-from hashlib import md5
+import uuid
+
+from collections import OrderedDict, defaultdict
+from datetime import datetime
 from lxml import etree
-from sqlalchemy.exc import IntegrityError
+from sqlalchemy.sql import bindparam
 
 from changes.artifacts.xml import DelegateParser
-from changes.config import db, redis
-from changes.lib.coverage import merge_coverage, get_coverage_stats
+from changes.config import db, redis, statsreporter
+from changes.lib.coverage import merge_coverages, get_coverage_stats
 from changes.models.filecoverage import FileCoverage
 from changes.utils.diff_parser import DiffParser
 from .base import ArtifactHandler
 
 
+# Number of FileCoverage rows written per statement when saving coverage.
+COVERAGE_WRITE_CHUNK_SIZE = 1000
+
+# How long (in seconds) the per-job coverage lock may be held before it
+# expires, and how long other artifacts of the job wait to acquire it.
+COVERAGE_LOCK_EXPIRE = 300
+COVERAGE_LOCK_TIMEOUT = 120
+
+
 class CoverageHandler(ArtifactHandler):
     FILENAMES = ('coverage.xml', '*.coverage.xml')
 
-    def process(self, fp, artifact):
-        results = self.get_coverage(fp)
+    def process(self, fp, artifact, size=None):
+        with statsreporter.stats().timer('coveragehandler_parse'):
+            results = self.get_coverage(fp)
 
-        for result in results:
-            try:
-                with db.session.begin_nested():
-                    db.session.add(result)
-            except IntegrityError:
-                lock_key = 'coverage:{job_id}:{file_hash}'.format(
-                    job_id=result.job_id.hex,
-                    file_hash=md5(result.filename).hexdigest(),
-                )
-                with redis.lock(lock_key):
-                    result = self.merge_coverage(result)
-                    db.session.add(result)
-            db.session.commit()
+        # Every coverage artifact of a job writes to the same set of rows, so
+        # hold one lock while reading, merging and writing all of them.
+        lock_key = 'coverage:{job_id}'.format(job_id=self.step.job_id.hex)
+        with redis.lock(lock_key, expire=COVERAGE_LOCK_EXPIRE,
+                        blocking_timeout=COVERAGE_LOCK_TIMEOUT):
+            with statsreporter.stats().timer('coveragehandler_save'):
+                results = self.save_coverage(results)
 
         return results
 
-    def merge_coverage(self, new):
-        existing = FileCoverage.query.filter(
-            FileCoverage.job_id == new.job_id,
-            FileCoverage.filename == new.filename,
-        ).first()
+    def save_coverage(self, results):
+        """Merge `results` into the FileCoverage rows of the job and write them.
 
-        existing.data = merge_coverage(existing.data, new.data)
+        Existing rows for the job are read with one query and merged in
+        memory, and rows are then inserted and updated in chunks. Callers must
+        hold the job's coverage lock.
 
-        self.add_file_stats(existing)
+        Returns:
+            list: a FileCoverage for each file in `results`, with its data
+            merged with any coverage already stored for the job.
+        """
+        if not results:
+            return []
+
+        step = self.step
 
-        return existing
+        # A report can cover the same file more than once (e.g. one class
+        # element per class in the file).
+        data_by_filename = OrderedDict()
+        for result in results:
+            data_by_filename.setdefault(result.filename, []).append(result.data)
+
+        existing = dict(
+            (filename, (id_, data))
+            for id_, filename, data in db.session.query(
+                FileCoverage.id, FileCoverage.filename, FileCoverage.data,
+            ).filter(
+                FileCoverage.job_id == step.job_id,
+                FileCoverage.filename.in_(data_by_filename.keys()),
+            )
+        )
+
+        merged_results = []
+        insert_rows = []
+        update_rows = []
+        for filename, data_list in data_by_filename.iteritems():
+            if filename in existing:
+                id_, data = existing[filename]
+                data_list.insert(0, data)
+            else:
+                id_ = uuid.uuid4()
+
+            result = FileCoverage(
+                id=id_,
+                step_id=step.id,
+                job_id=step.job_id,
+                project_id=step.project_id,
+                filename=filename,
+                data=data_list[0] if len(data_list) == 1 else merge_coverages(data_list),
+            )
+            self.add_file_stats(result)
+            merged_results.append(result)
+
+            row = {
+                'data': result.data,
+                'lines_covered': result.lines_covered,
+                'lines_uncovered': result.lines_uncovered,
+                'diff_lines_covered': result.diff_lines_covered,
+                'diff_lines_uncovered': result.diff_lines_uncovered,
+            }
+            if filename in existing:
+                row['_id'] = id_
+                update_rows.append(row)
+            else:
+                row.update({
+                    'id': id_,
+                    'step_id': result.step_id,
+                    'job_id': result.job_id,
+                    'project_id': result.project_id,
+                    'filename': filename,
+                    'date_created': datetime.utcnow(),
+                })
+                insert_rows.append(row)
+
+        table = FileCoverage.__table__
+        update = table.update().where(table.c.id == bindparam('_id')).values(
+            data=bindparam('data'),
+            lines_covered=bindparam('lines_covered'),
+            lines_uncovered=bindparam('lines_uncovered'),
+            diff_lines_covered=bindparam('diff_lines_covered'),
+            diff_lines_uncovered=bindparam('diff_lines_uncovered'),
+        )
+        for i in xrange(0, len(insert_rows), COVERAGE_WRITE_CHUNK_SIZE):
+            db.session.execute(table.insert().values(insert_rows[i:i + COVERAGE_WRITE_CHUNK_SIZE]))
+        for i in xrange(0, len(update_rows), COVERAGE_WRITE_CHUNK_SIZE):
+            db.session.execute(update, update_rows[i:i + COVERAGE_WRITE_CHUNK_SIZE])
+        db.session.commit()
+
+        statsreporter.stats().incr('coveragehandler_files_inserted', len(insert_rows))
+        statsreporter.stats().incr('coveragehandler_files_merged', len(update_rows))
+
+        return merged_results
 
     def process_diff(self):
         lines_by_file = defaultdict(set)
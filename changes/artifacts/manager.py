@@ -21,6 +21,6 @@ class Manager(object):
                 if not fp:
                     fp = artifact.file.get_file()
                 try:
-                    handler.process(fp, artifact)
+                    handler.process(fp, artifact, size=size)
                 finally:
                     fp.close()
@@ -11,18 +11,37 @@ from flask import current_app
 from changes.artifacts.xml import DelegateParser
 from changes.config import statsreporter
 from changes.constants import Result
+from changes.models.testmessage import get_messages
 from changes.models.testresult import TestResult, TestResultManager, TestSuite
 from changes.utils.agg import aggregate_result
 from changes.utils.http import build_web_uri
 
 from .base import ArtifactHandler, ArtifactParseError
 
+# Number of bytes fed to expat at a time when parsing incrementally.
+PARSE_CHUNK_SIZE = 1024 * 1024
+
 
 class XunitHandler(ArtifactHandler):
     FILENAMES = ('xunit.xml', 'junit.xml', 'nosetests.xml', '*.xunit.xml', '*.junit.xml', '*.nosetests.xml')
     logger = logging.getLogger('xunit')
 
-    def process(self, fp, artifact):
+    def process(self, fp, artifact, size=None):
+        """
+        Parses and saves the tests of an artifact.
+
+        Returns:
+            list: The TestResults saved, or None if the artifact was large
+            enough to be processed incrementally, which doesn't keep them.
+        """
+        streaming_min_bytes = current_app.config.get('XUNIT_STREAMING_MIN_BYTES')
+        if streaming_min_bytes is not None and artifact.file:
+            if size is None:
+                size = artifact.file.get_size()
+            if size >= streaming_min_bytes:
+                self.process_incrementally(fp, artifact)
+                return None
+
         test_list = self.get_tests(fp)
 
         manager = TestResultManager(self.step, artifact)
@@ -30,6 +49,71 @@ class XunitHandler(ArtifactHandler):
 
         return test_list
 
+    @statsreporter.timer('xunithandler_process_incrementally')
+    def process_incrementally(self, fp, artifact):
+        """Parse and save the tests of a large artifact without holding all of
+        them in memory.
+
+        Finished test suites are collected until they hold at least
+        XUNIT_STREAMING_BATCH_SIZE tests, which are then saved together, so
+        peak memory depends on the batch size (and the largest suite) rather
+        than on the size of the file.  Tests repeated in a later batch are
+        merged into the result saved by an earlier one, just as
+        `aggregate_tests_from_suites` would have combined them.  If the file
+        turns out to be malformed part way through, the batches parsed before
+        the error are kept.
+
+        Returns:
+            int: the number of distinct tests saved.
+        """
+        batch_size = current_app.config['XUNIT_STREAMING_BATCH_SIZE']
+        manager = TestResultManager(self.step, artifact)
+        saved_names = set()
+        batch = []
+
+        def flush():
+            tests = _deduplicate_testresults(batch)
+            manager.save([t for t in tests if t.name not in saved_names])
+            manager.merge([t for t in tests if t.name in saved_names])
+            saved_names.update(t.name for t in tests)
+            del batch[:]
+
+        for suite in self.iter_test_suites(fp):
+            batch.extend(suite.test_results)
+            if len(batch) >= batch_size:
+                flush()
+        flush()
+
+        return len(saved_names)
+
+    def iter_test_suites(self, fp):
+        """Like `get_test_suites`, but yields each suite as soon as it has
+        been parsed.  Each suite's test results are released once the
+        consumer moves on to the next suite.
+        """
+        try:
+            start = fp.tell()
+            suites = XunitDelegate(self.step).iter_test_suites(fp)
+            try:
+                first = next(suites, None)
+            except expat.ExpatError as e:
+                if e.message == expat.errors.XML_ERROR_UNKNOWN_ENCODING:
+                    # If the encoding is not known, assume it's UTF-8
+                    fp.seek(start)
+                    suites = XunitDelegate(self.step, 'UTF-8').iter_test_suites(fp)
+                    first = next(suites, None)
+                else:
+                    raise e
+            if first is not None:
+                yield first
+                for suite in suites:
+                    yield suite
+        except Exception as e:
+            uri = build_web_uri('/find_build/{0}/'.format(self.step.job.build_id.hex))
+            self.logger.warning('Failed to parse XML; (step=%s, build=%s); exception %s',
+                                self.step.id.hex, uri, e.message, exc_info=True)
+            self.report_malformed()
+
     @statsreporter.timer('xunithandler_get_test_suites')
     def get_test_suites(self, fp):
         try:
@@ -78,6 +162,7 @@ class XunitDelegate(DelegateParser):
         self.step = step
 
         self._encoding = encoding
+        self._on_suite_end = None
         self._parser = expat.ParserCreate(encoding)
         # Buffer the text so that we call CharacterDataHandler only once (or so) per text field
         # Buffer size was determined from memory limits of machines and testing on a 20MB junit.xml file
@@ -97,6 +182,28 @@ class XunitDelegate(DelegateParser):
             raise ArtifactParseError('Empty file found')
         return self._subparser.test_suites
 
+    def iter_test_suites(self, fp, chunk_size=PARSE_CHUNK_SIZE):
+        """Parse `fp` in chunks of `chunk_size` bytes, yielding each TestSuite
+        once its closing tag has been parsed.
+
+        Expat reports byte indices relative to the start of the document, so
+        message offsets are the same as with `parse`.  The test results of a
+        yielded suite are dropped from the parser when the generator resumes.
+        """
+        finished = []
+        self._on_suite_end = finished.append
+        while True:
+            chunk = fp.read(chunk_size)
+            self._parser.Parse(chunk, not chunk)
+            for suite in finished:
+                yield suite
+                suite.test_results = []
+            del finished[:]
+            if not chunk:
+                break
+        if not isinstance(self._subparser, XunitBaseParser):
+            raise ArtifactParseError('Empty file found')
+
     def xml_decl(self, version, encoding, standalone):
         if self._encoding:
             encoding = self._encoding
@@ -108,7 +215,7 @@ class XunitDelegate(DelegateParser):
         if tag == 'unittest-results':
             raise ArtifactParseError('Bitten is not supported.')
         else:
-            self._set_subparser(XunitParser(self.step, self._parser))
+            self._set_subparser(XunitParser(self.step, self._parser, self._on_suite_end))
             statsreporter.stats().incr('new_xunit_result_file')
         self._parser.StartElementHandler(tag, attrs)
 
@@ -155,9 +262,11 @@ class XunitBaseParser(object):
 
 class XunitParser(XunitBaseParser):
 
-    def __init__(self, step, parser):
+    def __init__(self, step, parser, on_suite_end=None):
         super(XunitParser, self).__init__(step, parser)
         self._test_is_quarantined = None
+        # called with each TestSuite once it has been fully parsed
+        self._on_suite_end = on_suite_end
 
     def start(self, tag, attrs):
         # Spec: http://windyroad.com.au/dl/Open%20Source/JUnit.xsd
@@ -267,6 +376,9 @@ class XunitParser(XunitBaseParser):
             else:
                 if self.test_suites[-1].date_created is None:
                     self.test_suites[-1].date_created = datetime.utcnow()
+
+            if self._on_suite_end is not None:
+                self._on_suite_end(self.test_suites[-1])
         elif tag == 'testcase':
             if self._current_result.result == Result.unknown:
                 # Default result is passing
@@ -353,9 +465,20 @@ def truncate_message(msg, limit):
     return _TRUNCATION_HEADER + msg
 
 
-def get_testcase_messages(testcase):
+def get_testcase_messages(testcase, bodies=None):
+    """
+    Returns the full message of `testcase`, including the messages it has
+    in its artifacts.
+
+    Args:
+        testcase (TestCase): The test case, with its messages loaded.
+        bodies (Optional[Dict[UUID, str]]): The bodies of its TestMessages,
+            as returned by get_messages; fetched if not given.
+    """
     message = testcase.message or ''
     message_limit = current_app.config.get('TEST_MESSAGE_MAX_LEN')
+    if bodies is None:
+        bodies = get_messages(testcase.messages)
     # Sort messages by start offset to ensure original ordering
     testcase.messages.sort(key=lambda x: (x.artifact_id, x.start_offset))
     for m in testcase.messages:
@@ -364,7 +487,7 @@ def get_testcase_messages(testcase):
         message += \
             (' ' + m.label + ' ').center(78, '=') + '\n' + \
             truncate_message(
-                saxutils.unescape(m.get_message().decode('utf-8'), {"&apos;": "'", "&quot;": '"'}),
+                saxutils.unescape(bodies[m.id].decode('utf-8'), {"&apos;": "'", "&quot;": '"'}),
                 message_limit,
             )
     return message
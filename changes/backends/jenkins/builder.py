@@ -29,6 +29,7 @@ from changes.constants import Result, Status
 from changes.db.utils import get_or_create
 from changes.jobs.sync_job_step import sync_job_step
 from changes.lib.artifact_store_lib import ArtifactStoreClient
+from changes.lib.log_forwarding import coalesced_read_ahead
 from changes.models.artifact import Artifact
 from changes.models.failurereason import FailureReason
 from changes.models.jobphase import JobPhase
@@ -55,6 +56,10 @@ ID_XML_RE = re.compile(r'<id>(\d+)</id>')
 
 LOG_SYNC_TIMEOUT_SECS = 30
 
+# How many chunks of a log to read from Jenkins ahead of writing them to the
+# artifact store.
+LOG_READ_AHEAD_CHUNKS = 64
+
 # Redis key for storing the master blacklist set
 # The blacklist is used to temporarily remove jenkins masters from the pool of available masters.
 MASTER_BLACKLIST_KEY = 'jenkins_master_blacklist'
@@ -290,6 +295,7 @@ class JenkinsBuilder(BaseBackend):
         )
 
         start_time = time.time()
+        bytes_forwarded = 0
 
         with closing(self._streaming_get(url, params={'start': offset})) as resp:
             log_length = int(resp.headers['X-Text-Size'])
@@ -307,29 +313,45 @@ class JenkinsBuilder(BaseBackend):
             # XXX: requests doesnt seem to guarantee chunk_size, so we force it
             # with our own helper
             iterator = resp.iter_content()
-            for chunk in chunked(iterator, LOG_CHUNK_SIZE):
-                chunk_size = len(chunk)
-                try:
-                    self.artifact_store_client.post_artifact_chunk(bucket_name, artifact_name, offset, chunk)
-                    offset += chunk_size
-
-                    if time.time() > start_time + LOG_SYNC_TIMEOUT_SECS:
-                        raise RuntimeError('TOO LONG TO DOWNLOAD LOG: %s' % logsource.get_url())
-                except Exception as e:
-                    # On an exception or a timeout, attempt to truncate the log
-                    # Catch all exceptions, including timeouts and HTTP errors
-
-                    self.logger.warning('Exception when uploading logchunks: %s', e.message)
-
-                    has_more = False
-
-                    warning = ("\nLOG TRUNCATED. SEE FULL LOG AT "
-                               "{base}/job/{job}/{build}/consoleText\n").format(
-                        base=jobstep.data['master'],
-                        job=jobstep.data['job_name'],
-                        build=jobstep.data['build_no'])
-                    self.artifact_store_client.post_artifact_chunk(bucket_name, artifact_name, offset, warning)
-                    break
+            # The log is read from Jenkins while the previous write to the
+            # artifact store is in flight, and whatever was read meanwhile is
+            # written at once.
+            writes = coalesced_read_ahead(
+                chunked(iterator, LOG_CHUNK_SIZE),
+                max_size=current_app.config['JENKINS_LOG_MAX_WRITE_SIZE'],
+                max_buffered=LOG_READ_AHEAD_CHUNKS,
+            )
+            with closing(writes):
+                for data in writes:
+                    try:
+                        self.artifact_store_client.post_artifact_chunk(bucket_name, artifact_name, offset, data)
+                        offset += len(data)
+                        bytes_forwarded += len(data)
+
+                        if time.time() > start_time + LOG_SYNC_TIMEOUT_SECS:
+                            raise RuntimeError('TOO LONG TO DOWNLOAD LOG: %s' % logsource.get_url())
+                    except Exception as e:
+                        # On an exception or a timeout, attempt to truncate the log
+                        # Catch all exceptions, including timeouts and HTTP errors
+
+                        self.logger.warning('Exception when uploading logchunks: %s', e.message)
+                        statsreporter.stats().incr('jenkins_log_truncated')
+
+                        has_more = False
+
+                        warning = ("\nLOG TRUNCATED. SEE FULL LOG AT "
+                                   "{base}/job/{job}/{build}/consoleText\n").format(
+                            base=jobstep.data['master'],
+                            job=jobstep.data['job_name'],
+                            build=jobstep.data['build_no'])
+                        self.artifact_store_client.post_artifact_chunk(bucket_name, artifact_name, offset, warning)
+                        break
+
+        if bytes_forwarded:
+            duration = time.time() - start_time
+            statsreporter.stats().incr('jenkins_log_bytes_forwarded', bytes_forwarded)
+            if duration > 0:
+                statsreporter.stats().set_gauge('jenkins_log_forward_bytes_per_sec', bytes_forwarded / duration)
 
         # We **must** track the log offset externally as Jenkins embeds encoded
         # links and we cant accurately predict the next `start` param.
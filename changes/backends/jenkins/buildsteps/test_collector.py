@@ -19,6 +19,7 @@ from changes.constants import Result, Status
 from changes.db.utils import get_or_create, try_create
 from changes.expanders.tests import TestsExpander
 from changes.jobs.sync_job_step import sync_job_step
+from changes.models.durationstat import DurationStatType, get_duration_stats
 from changes.models.failurereason import FailureReason
 from changes.models.jobphase import JobPhase
 from changes.models.jobstep import JobStep
@@ -279,7 +280,10 @@ class JenkinsTestCollectorBuildStep(JenkinsGenericBuildStep):
             raise ArtifactParseError('No tests attribute')
 
         num_tests = len(phase_config['tests'])
-        test_stats, avg_test_time = TestsExpander.get_test_stats(self.get_test_stats_from() or step.project.slug)
+        project_slug = self.get_test_stats_from() or step.project.slug
+        duration_stats = get_duration_stats(project_slug, DurationStatType.test)
+        test_stats, avg_test_time = TestsExpander.get_test_stats(project_slug, duration_stats)
+        test_variances = TestsExpander.get_test_variances(project_slug, duration_stats)
 
         phase, _ = get_or_create(JobPhase, where={
             'job': step.job,
@@ -312,7 +316,8 @@ class JenkinsTestCollectorBuildStep(JenkinsGenericBuildStep):
             # Create all of the job steps and commit them together.
             groups = shard(phase_config['tests'], self.max_shards,
                            test_stats, avg_test_time,
-                           normalize_object_name=TestsExpander._normalize_test_segments)
+                           normalize_object_name=TestsExpander._normalize_test_segments,
+                           object_variances=test_variances)
             steps = [
                 self._create_jobstep(phase, phase_config['cmd'], phase_config.get('path', ''),
                                      weight, test_list, len(groups), cluster=step.cluster)
@@ -19,6 +19,7 @@ from changes.config import db, statsreporter
 from changes.constants import Cause, Result, ResultSource, Status, DEFAULT_CPUS, DEFAULT_MEMORY_MB
 from changes.db.utils import get_or_create
 from changes.jobs.sync_job_step import sync_job_step
+from changes.lib import heartbeats
 from changes.models.bazeltarget import BazelTarget
 from changes.models.bazeltargetmessage import BazelTargetMessage
 from changes.models.command import CommandType, FutureCommand
@@ -419,8 +420,11 @@ class DefaultBuildStep(BuildStep):
 
     def update_step(self, step):
         # type: (JobStep) -> None
-        if step.status == Status.allocated and step.last_heartbeat:
-            duration = utcnow() - step.last_heartbeat
+        if step.status != Status.allocated:
+            return
+        last_heartbeat = heartbeats.get_last_heartbeat(step)
+        if last_heartbeat:
+            duration = utcnow() - last_heartbeat
             if duration.total_seconds() >= current_app.config['JOBSTEP_ALLOCATION_TIMEOUT_SECONDS']:
                 # Allocation has timed out; move back to being elligible for allocation.
                 step.status = Status.pending_allocation
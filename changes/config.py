@@ -101,6 +101,68 @@ def create_app(_read_config=True, **config):
 
     app.config['API_TRACEBACKS'] = True
 
+    # Cache the serialized form of API objects which no longer change (such as
+    # finished builds) in a per-process LRU of this many objects and in redis
+    # for SERIALIZER_CACHE_TTL seconds. See changes.api.serializer.cache.
+    app.config['SERIALIZER_CACHE_ENABLED'] = False
+    app.config['SERIALIZER_CACHE_LOCAL_SIZE'] = 10000
+    app.config['SERIALIZER_CACHE_TTL'] = 600
+
+    # Keep an index of the jobsteps pending allocation in redis, and have
+    # schedulers pick from the first JOBSTEP_ALLOCATION_QUEUE_WINDOW entries
+    # of it. See changes.lib.allocation_queue.
+    app.config['JOBSTEP_ALLOCATION_QUEUE_ENABLED'] = False
+    app.config['JOBSTEP_ALLOCATION_QUEUE_WINDOW'] = 1000
+
+    # Number of parsed project configs to keep per process, and (if non-zero)
+    # how many seconds to share them between processes via redis. See
+    # changes.lib.project_config_cache.
+    app.config['PROJECT_CONFIG_CACHE_SIZE'] = 1000
+    app.config['PROJECT_CONFIG_CACHE_REDIS_TTL'] = 0
+
+    # Weight given to the newest sample in the per-project duration stats of
+    # tests and targets used for sharding. See changes.models.durationstat.
+    app.config['DURATION_STATS_ALPHA'] = 0.3
+    # Drop the stats of tests and targets which haven't run this long, as
+    # they were likely removed or renamed.
+    app.config['DURATION_STATS_MAX_AGE'] = timedelta(days=14)
+
+    # The time (in ms) it takes to set up a shard before it runs any tests.
+    # When set, builds are split over fewer shards if more wouldn't make
+    # them finish noticeably sooner. See changes.utils.shards.
+    app.config['SHARD_OVERHEAD_MS'] = 0
+
+    # Compact the logs of jobsteps which finished at least this long ago into
+    # compressed segments, up to LOG_COMPACTION_BATCH_SIZE logs per run. See
+    # changes.jobs.compact_logs.
+    app.config['LOG_COMPACTION_ENABLED'] = False
+    app.config['LOG_COMPACTION_DELAY'] = timedelta(hours=1)
+    app.config['LOG_COMPACTION_BATCH_SIZE'] = 100
+
+    # Keep the state of running tasks in redis, writing it back to the task
+    # table in batches. See changes.queue.task_state.
+    app.config['TASK_STATE_REDIS_ENABLED'] = False
+
+    # Poll jobsteps less often the longer they've been running, up to every
+    # SYNC_JOB_STEP_MAX_POLL_INTERVAL seconds, and poll them right away when
+    # they report a change to us.
+    app.config['SYNC_JOB_STEP_ADAPTIVE_POLLING'] = False
+    app.config['SYNC_JOB_STEP_MAX_POLL_INTERVAL'] = 60
+
+    # Buffer jobstep heartbeats in redis, writing them to the jobstep table in
+    # batches. See changes.lib.heartbeats.
+    app.config['JOBSTEP_HEARTBEAT_REDIS_ENABLED'] = False
+
+    # Serve reads from local repositories with long-lived git cat-file and hg
+    # command server processes, pooled per worker process, rather than a new
+    # process per read. See changes.vcs.server.
+    app.config['VCS_COMMAND_SERVER_ENABLED'] = False
+
+    # Run the listeners for a signal in the fire_signal task itself, sharing
+    # the build or job they're about, rather than in a run_event_listener
+    # task each. Failed listeners are still retried in their own tasks.
+    app.config['SIGNAL_DISPATCH_IN_PROCESS'] = False
+
     # Expiration delay between when a snapshot image becomes superceded and when
     # it becomes truly expired (and thus no longer included in the sync information
     # for any cluster that runs that particular image's plan)
@@ -128,8 +190,27 @@ def create_app(_read_config=True, **config):
     # without being overridden. This value is referenced in test code.
     app.config['ARTIFACTS_SERVER'] = 'http://localhost:1234'
 
+    # The most bytes of a Jenkins log to send to the artifact store in one
+    # write. Chunks of the log read while a write is in flight are combined
+    # into the next write, up to this size.
+    app.config['JENKINS_LOG_MAX_WRITE_SIZE'] = 512 * 1024
+
+    # A local directory to cache the content of finished artifacts from the
+    # artifact store in, so each is fetched once and then read from disk, and
+    # the most bytes to keep there. None disables the cache. See
+    # changes.storage.content_cache.
+    app.config['ARTIFACT_CONTENT_CACHE_DIR'] = None
+    app.config['ARTIFACT_CONTENT_CACHE_MAX_BYTES'] = 2 * 1024 * 1024 * 1024
+    # Larger artifacts aren't cached, so one doesn't evict most of the cache.
+    app.config['ARTIFACT_CONTENT_CACHE_MAX_ENTRY_BYTES'] = 64 * 1024 * 1024
+
     # The default max artifact size handlers should be capable of processing.
     app.config['MAX_ARTIFACT_BYTES'] = 200 * 1024 * 1024
+    # Xunit artifacts of at least this many bytes are parsed incrementally and
+    # saved in batches of XUNIT_STREAMING_BATCH_SIZE tests, rather than being
+    # read into memory whole. None disables incremental parsing.
+    app.config['XUNIT_STREAMING_MIN_BYTES'] = 32 * 1024 * 1024
+    app.config['XUNIT_STREAMING_BATCH_SIZE'] = 10000
     # The max artifact size the analytics json handler should be capable of processing.
     app.config['MAX_ARTIFACT_BYTES_ANALYTICS_JSON'] = 70 * 1024 * 1024
 
@@ -323,7 +404,23 @@ def create_app(_read_config=True, **config):
         'update-local-repos': {
             'task': 'update_local_repos',
             'schedule': timedelta(minutes=1),
-        }
+        },
+        'reconcile-allocation-queue': {
+            'task': 'reconcile_allocation_queue',
+            'schedule': timedelta(minutes=1),
+        },
+        'compact-logs': {
+            'task': 'compact_logs',
+            'schedule': timedelta(minutes=5),
+        },
+        'flush-task-state': {
+            'task': 'flush_task_state',
+            'schedule': timedelta(seconds=30),
+        },
+        'flush-heartbeats': {
+            'task': 'flush_heartbeats',
+            'schedule': timedelta(seconds=30),
+        },
     }
     app.config['CELERY_TIMEZONE'] = 'UTC'
 
@@ -581,6 +678,7 @@ def create_app(_read_config=True, **config):
 
     configure_jobs(app)
     configure_transaction_logging(app)
+    configure_allocation_queue(app)
 
     rules_file = app.config.get('CATEGORIZE_RULES_FILE')
     if rules_file:
@@ -926,10 +1024,14 @@ def configure_debug_routes(app):
 def configure_jobs(app):
     from changes.jobs.flaky_tests import aggregate_flaky_tests
     from changes.jobs.check_repos import check_repos
+    from changes.jobs.compact_logs import compact_logs
     from changes.jobs.cleanup_tasks import cleanup_tasks
     from changes.jobs.create_job import create_job
     from changes.jobs.delete_old_data import delete_old_data, delete_old_data_10m, delete_old_data_5h_delayed
+    from changes.jobs.flush_heartbeats import flush_heartbeats
+    from changes.jobs.flush_task_state import flush_task_state
     from changes.jobs.import_repo import import_repo
+    from changes.jobs.reconcile_allocation_queue import reconcile_allocation_queue
     from changes.jobs.signals import (
         fire_signal, run_event_listener
     )
@@ -940,18 +1042,23 @@ def configure_jobs(app):
     from changes.jobs.sync_job_step import sync_job_step
     from changes.jobs.sync_repo import sync_repo
     from changes.jobs.update_project_stats import (
-        update_project_stats, update_project_plan_stats)
+        update_project_stats, update_project_plan_stats,
+        update_project_duration_stats, update_test_failure_streaks)
     from changes.jobs.update_local_repos import update_local_repos
 
     queue.register('aggregate_flaky_tests', aggregate_flaky_tests)
     queue.register('check_repos', check_repos)
+    queue.register('compact_logs', compact_logs)
     queue.register('cleanup_tasks', cleanup_tasks)
     queue.register('create_job', create_job)
     queue.register('delete_old_data', delete_old_data)
     queue.register('delete_old_data_10m', delete_old_data_10m)
     queue.register('delete_old_data_5h_delayed', delete_old_data_5h_delayed)
     queue.register('fire_signal', fire_signal)
+    queue.register('flush_heartbeats', flush_heartbeats)
+    queue.register('flush_task_state', flush_task_state)
     queue.register('import_repo', import_repo)
+    queue.register('reconcile_allocation_queue', reconcile_allocation_queue)
     queue.register('run_event_listener', run_event_listener)
     queue.register('sync_artifact', sync_artifact)
     queue.register('sync_build', sync_build)
@@ -961,6 +1068,8 @@ def configure_jobs(app):
     queue.register('sync_repo', sync_repo)
     queue.register('update_project_stats', update_project_stats)
     queue.register('update_project_plan_stats', update_project_plan_stats)
+    queue.register('update_project_duration_stats', update_project_duration_stats)
+    queue.register('update_test_failure_streaks', update_test_failure_streaks)
     queue.register('update_local_repos', update_local_repos)
 
     @task_postrun.connect
@@ -1034,3 +1143,13 @@ def configure_transaction_logging(app):
             if time_taken_ms > app.config['TRANSACTION_MS_WARNING_THRESHOLD']:
                 logging.warning("Long running transaction in %s took %dms.",
                                 context_name, time_taken_ms)
+
+
+def configure_allocation_queue(app):
+    """Keep the jobstep allocation queue up to date as sessions commit."""
+    from changes.lib import allocation_queue
+
+    event.listen(Session, 'after_flush', allocation_queue.after_flush)
+    event.listen(Session, 'after_flush_postexec', allocation_queue.after_flush_postexec)
+    event.listen(Session, 'after_commit', allocation_queue.after_commit)
+    event.listen(Session, 'after_soft_rollback', allocation_queue.after_soft_rollback)
@@ -1,5 +1,6 @@
 from __future__ import absolute_import, division
 
+from flask import current_app
 from typing import Dict, List, Tuple  # NOQA
 
 from changes.api.client import api_client
@@ -10,6 +11,7 @@ from changes.models.bazeltarget import BazelTarget
 from changes.models.bazeltargetmessage import BazelTargetMessage
 from changes.models.buildmessage import BuildMessage
 from changes.models.command import FutureCommand
+from changes.models.durationstat import DurationStatType, get_duration_stats
 from changes.models.job import Job
 from changes.models.jobstep import FutureJobStep
 from changes.utils.shards import shard
@@ -59,8 +61,9 @@ class BazelTargetsExpander(Expander):
             'cmd'], 'Missing ``{target_names}`` in command'
 
     def expand(self, job, max_executors, test_stats_from=None):
-        target_stats, avg_time = self.get_target_stats(
-            test_stats_from or self.project.slug)
+        project_slug = test_stats_from or self.project.slug
+        duration_stats = get_duration_stats(project_slug, DurationStatType.target)
+        target_stats, avg_time = self.get_target_stats(project_slug, duration_stats)
 
         affected_targets = self.data['affected_targets']
         unaffected_targets = self.data['unaffected_targets']
@@ -104,8 +107,11 @@ class BazelTargetsExpander(Expander):
                 message = BuildMessage(build_id=job.build_id, text=text)
                 db.session.add(message)
 
+        target_variances = self.get_target_variances(project_slug, duration_stats)
         groups = shard(to_shard, max_executors,
-                       target_stats, avg_time)
+                       target_stats, avg_time,
+                       object_variances=target_variances,
+                       shard_overhead=current_app.config['SHARD_OVERHEAD_MS'])
 
         for weight, target_list in groups:
             future_command = FutureCommand(
@@ -135,12 +141,18 @@ class BazelTargetsExpander(Expander):
         return 'Run test targets'
 
     @classmethod
-    def get_target_stats(cls, project_slug):
-        # type: (str) -> Tuple[Dict[str, int], int]
+    def get_target_stats(cls, project_slug, duration_stats=None):
+        # type: (str, Dict[str, Tuple[float, float]]) -> Tuple[Dict[str, int], int]
         """Collect the run time statistics for targets.
 
+        These come from the project's duration stats or, for a project without
+        any yet, from its last build.
+
         Arguments:
             project_slug (str)
+            duration_stats (Dict[str, Tuple[float, float]]): The project's
+                duration stats, as from `get_duration_stats`, if they were
+                already fetched.
 
         Returns:
             Tuple[Dict[str, int], int]: The first item is the mapping
@@ -149,6 +161,39 @@ class BazelTargetsExpander(Expander):
                 If a target has no duration recorded, it is excluded
                 from all calculations and mapping.
         """
+        if duration_stats is None:
+            duration_stats = get_duration_stats(project_slug, DurationStatType.target)
+        target_durations = {
+            name: int(round(mean))
+            for name, (mean, _) in duration_stats.iteritems()
+        }
+        if not target_durations:
+            # the project has no duration stats yet
+            target_durations = cls._get_last_build_target_durations(project_slug)
+
+        total_duration = sum(target_durations.itervalues())
+
+        if total_duration > 0:
+            avg_test_time = int(total_duration / len(target_durations))
+        else:
+            avg_test_time = 0
+
+        return target_durations, avg_test_time
+
+    @classmethod
+    def get_target_variances(cls, project_slug, duration_stats=None):
+        # type: (str, Dict[str, Tuple[float, float]]) -> Dict[str, float]
+        """Collect the variance of the run duration of each target.
+
+        Projects without duration stats have none.
+        """
+        if duration_stats is None:
+            duration_stats = get_duration_stats(project_slug, DurationStatType.target)
+        return {name: variance for name, (_, variance) in duration_stats.iteritems()}
+
+    @classmethod
+    def _get_last_build_target_durations(cls, project_slug):
+        # type: (str) -> Dict[str, int]
         response = api_client.get('/projects/{project}/'.format(
             project=project_slug))
         last_build = response['lastPassingBuild']
@@ -158,27 +203,17 @@ class BazelTargetsExpander(Expander):
             last_build = response['lastBuild']
 
         if not last_build:
-            return {}, 0
+            return {}
 
         job_list = db.session.query(Job.id).filter(
             Job.build_id == last_build['id'],
         )
 
         if job_list:
-            target_durations = dict(db.session.query(
+            return dict(db.session.query(
                 BazelTarget.name, BazelTarget.duration
             ).filter(
                 BazelTarget.job_id.in_(job_list),
                 ~BazelTarget.duration.is_(None),
             ))
-        else:
-            target_durations = dict()
-
-        total_duration = sum(target_durations.itervalues())
-
-        if total_duration > 0:
-            avg_test_time = int(total_duration / len(target_durations))
-        else:
-            avg_test_time = 0
-
-        return target_durations, avg_test_time
+        return {}
@@ -1,16 +1,18 @@
 from __future__ import absolute_import
 
+from collections import defaultdict
+from flask import current_app
 from typing import Dict, List, Tuple  # NOQA
 
 from changes.api.client import api_client
 from changes.config import db
 from changes.expanders.base import Expander
 from changes.models.command import FutureCommand
+from changes.models.durationstat import DurationStatType, get_duration_stats
 from changes.models.job import Job
 from changes.models.jobstep import FutureJobStep
 from changes.models.test import TestCase
 from changes.utils.shards import shard
-from changes.utils.trees import build_flat_tree
 
 
 class TestsExpander(Expander):
@@ -34,14 +36,19 @@ class TestsExpander(Expander):
         assert '{test_names}' in self.data['cmd'], 'Missing ``{test_names}`` in command'
 
     def expand(self, job, max_executors, test_stats_from=None):
-        test_stats, avg_test_time = self.get_test_stats(test_stats_from or self.project.slug)
+        project_slug = test_stats_from or self.project.slug
+        duration_stats = get_duration_stats(project_slug, DurationStatType.test)
+        test_stats, avg_test_time = self.get_test_stats(project_slug, duration_stats)
+        test_variances = self.get_test_variances(project_slug, duration_stats)
 
         groups = shard(
             self.data['tests'],
             max_executors,
             test_stats,
             avg_test_time,
-            normalize_object_name=self._normalize_test_segments
+            normalize_object_name=self._normalize_test_segments,
+            object_variances=test_variances,
+            shard_overhead=current_app.config['SHARD_OVERHEAD_MS'],
         )
 
         for weight, test_list in groups:
@@ -70,7 +77,68 @@ class TestsExpander(Expander):
         return 'Run tests'
 
     @classmethod
-    def get_test_stats(cls, project_slug):
+    def get_test_stats(cls, project_slug, duration_stats=None):
+        """
+        `duration_stats` are the project's, as from `get_duration_stats`, if
+        they were already fetched.
+        """
+        if duration_stats is None:
+            duration_stats = get_duration_stats(project_slug, DurationStatType.test)
+        test_durations = {name: mean for name, (mean, _) in duration_stats.iteritems()}
+        if not test_durations:
+            # the project has no duration stats yet
+            test_durations = cls._get_last_build_test_durations(project_slug)
+
+        total_count, total_duration = 0, 0
+        # the total duration of the tests under each prefix
+        group_durations = defaultdict(int)  # type: Dict[str, float]
+        sep = None
+        for test, duration in test_durations.iteritems():
+            total_duration += duration
+            total_count += 1
+            if sep is None:
+                sep = TestCase(name=test).sep
+            segments = test.split(sep)
+            for i in xrange(len(segments)):
+                group_durations[sep.join(segments[:i + 1])] += duration
+
+        test_stats = {}
+        for group_name, duration in group_durations.iteritems():
+            segments = cls._normalize_test_segments(group_name)
+            test_stats[segments] = int(round(duration))
+
+        # the build report can contain different test suites so this isnt the
+        # most accurate
+        if total_duration > 0:
+            avg_test_time = int(total_duration / total_count)
+        else:
+            avg_test_time = 0
+
+        return test_stats, avg_test_time
+
+    @classmethod
+    def get_test_variances(cls, project_slug, duration_stats=None):
+        # type: (str, Dict[str, Tuple[float, float]]) -> Dict[Tuple[str, ...], float]
+        """
+        Returns the variance of the duration of the tests under each prefix,
+        normalized as in `get_test_stats`, taking tests to be independent.
+        Projects without duration stats have none.
+        """
+        if duration_stats is None:
+            duration_stats = get_duration_stats(project_slug, DurationStatType.test)
+
+        group_variances = defaultdict(float)  # type: Dict[Tuple[str, ...], float]
+        sep = None
+        for test, (_, variance) in duration_stats.iteritems():
+            if sep is None:
+                sep = TestCase(name=test).sep
+            segments = test.split(sep)
+            for i in xrange(len(segments)):
+                group_variances[cls._normalize_test_segments(sep.join(segments[:i + 1]))] += variance
+        return dict(group_variances)
+
+    @classmethod
+    def _get_last_build_test_durations(cls, project_slug):
         response = api_client.get('/projects/{project}/'.format(
             project=project_slug))
         last_build = response['lastPassingBuild']
@@ -80,7 +148,7 @@ class TestsExpander(Expander):
             last_build = response['lastBuild']
 
         if not last_build:
-            return {}, 0
+            return {}
 
         # XXX(dcramer): ideally this would be abstracted via an API
         job_list = db.session.query(Job.id).filter(
@@ -88,37 +156,12 @@ class TestsExpander(Expander):
         )
 
         if job_list:
-            test_durations = dict(db.session.query(
+            return dict(db.session.query(
                 TestCase.name, TestCase.duration
             ).filter(
                 TestCase.job_id.in_(job_list),
             ))
-        else:
-            test_durations = dict()
-
-        test_names = []
-        total_count, total_duration = 0, 0
-        for test in test_durations:
-            test_names.append(test)
-            total_duration += test_durations[test]
-            total_count += 1
-
-        test_stats = {}
-        if test_names:
-            sep = TestCase(name=test_names[0]).sep
-            tree = build_flat_tree(test_names, sep=sep)
-            for group_name, group_tests in tree.iteritems():
-                segments = cls._normalize_test_segments(group_name)
-                test_stats[segments] = sum(test_durations[t] for t in group_tests)
-
-        # the build report can contain different test suites so this isnt the
-        # most accurate
-        if total_duration > 0:
-            avg_test_time = int(total_duration / total_count)
-        else:
-            avg_test_time = 0
-
-        return test_stats, avg_test_time
+        return {}
 
     @classmethod
     def _normalize_test_segments(cls, test_name):
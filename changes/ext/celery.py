@@ -47,6 +47,27 @@ class _Celery(object):
             )
         return task_id
 
+    def delay_many(self, name, kwargs_list, **fn_kwargs):
+        """
+        Publishes a `name` task for each of `kwargs_list`, back to back over
+        a single producer (and so a single connection and channel), rather
+        than acquiring one from the pool for each.
+        """
+        self.logger.debug('Firing %d tasks %r', len(kwargs_list), name)
+        celery = self.celery
+        if celery.conf.CELERY_ALWAYS_EAGER:
+            task_ids = []
+            for kwargs in kwargs_list:
+                task_ids.append(uuid4())
+                celery.tasks[name].delay(**kwargs)
+            return task_ids
+
+        with celery.producer_or_acquire() as producer:
+            return [
+                celery.send_task(name, None, kwargs, producer=producer, **fn_kwargs)
+                for kwargs in kwargs_list
+            ]
+
     def retry(self, name, *args, **kwargs):
         # unlike delay, we actually want to rely on Celery's retry logic
         # and because we can only execute this within a task, it's safe
@@ -11,8 +11,7 @@ def check_repos():
         Repository.backend != RepositoryBackend.unknown,
     ))
 
-    for repo in repo_list:
-        sync_repo.delay_if_needed(
-            task_id=repo.id.hex,
-            repo_id=repo.id.hex,
-        )
+    sync_repo.delay_if_needed_many([{
+        'task_id': repo.id.hex,
+        'repo_id': repo.id.hex,
+    } for repo in repo_list])
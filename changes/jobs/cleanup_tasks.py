@@ -5,6 +5,7 @@ from datetime import datetime, timedelta
 from changes.config import queue, statsreporter
 from changes.constants import Status
 from changes.models.task import Task
+from changes.queue import task_state
 from changes.queue.task import TrackedTask
 
 CHECK_TIME = timedelta(minutes=60)
@@ -22,10 +23,14 @@ def cleanup_tasks():
     """
     now = datetime.utcnow()
 
-    pending_tasks = Task.query.filter(
+    pending_tasks = list(Task.query.filter(
         Task.status != Status.finished,
         Task.date_modified < now - CHECK_TIME,
-    )
+    ))
+    if task_state.is_enabled():
+        # the task may have checked in since its row was last written
+        task_state.merge(pending_tasks)
+        pending_tasks = [t for t in pending_tasks if t.date_modified < now - CHECK_TIME]
 
     for task in pending_tasks:
         task_func = TrackedTask(queue.get_task(task.task_name))
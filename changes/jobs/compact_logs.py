@@ -0,0 +1,122 @@
+from __future__ import absolute_import
+
+import logging
+
+from datetime import datetime
+
+from flask import current_app
+
+from changes.config import db, redis, statsreporter
+from changes.constants import Status
+from changes.ext.redis import UnableToGetLock
+from changes.models.jobstep import JobStep
+from changes.models.log import LOG_SEGMENT_SIZE, LogChunk, LogSegment, LogSource
+
+logger = logging.getLogger('changes.compact_logs')
+
+# Number of chunks to read at a time.
+CHUNK_BATCH_SIZE = 500
+
+
+@statsreporter.timer('task_duration_compact_logs')
+def compact_logs():
+    """
+    Compact the logs of finished jobsteps into log segments.
+    """
+    if not current_app.config['LOG_COMPACTION_ENABLED']:
+        return
+
+    cutoff = datetime.utcnow() - current_app.config['LOG_COMPACTION_DELAY']
+    source_ids = [source_id for source_id, in db.session.query(
+        LogSource.id,
+    ).join(
+        JobStep, LogSource.step_id == JobStep.id,
+    ).filter(
+        LogSource.date_compacted.is_(None),
+        LogSource.in_artifact_store.isnot(True),
+        JobStep.status == Status.finished,
+        JobStep.date_finished < cutoff,
+    ).order_by(
+        JobStep.date_finished.asc(),
+    ).limit(current_app.config['LOG_COMPACTION_BATCH_SIZE'])]
+
+    try:
+        with redis.lock('compact_logs', expire=600, nowait=True):
+            for source_id in source_ids:
+                compact_log(LogSource.query.get(source_id))
+    except UnableToGetLock:
+        logger.info('Logs are already being compacted')
+
+
+def compact_log(source):
+    """
+    Replaces the LogChunks of `source` with LogSegments of (at least)
+    LOG_SEGMENT_SIZE, made of whole chunks, and commits.
+
+    Gaps between chunks are kept as gaps between segments, so the compacted
+    log reads exactly as the chunks did.
+    """
+    if source.date_compacted is not None:
+        return
+
+    stats = statsreporter.stats()
+    num_chunks = 0
+    num_segments = 0
+    compressed_size = 0
+
+    segment_offset = None
+    segment_end = None
+    parts = []
+
+    def add_segment():
+        segment = LogSegment(
+            source_id=source.id,
+            offset=segment_offset,
+            text=u''.join(parts),
+        )
+        db.session.add(segment)
+        return segment
+
+    last_offset = -1
+    while True:
+        chunks = db.session.query(
+            LogChunk.offset, LogChunk.size, LogChunk.text,
+        ).filter(
+            LogChunk.source_id == source.id,
+            LogChunk.offset > last_offset,
+        ).order_by(LogChunk.offset.asc()).limit(CHUNK_BATCH_SIZE).all()
+        if not chunks:
+            break
+
+        for offset, size, text in chunks:
+            if parts and (offset != segment_end or segment_end - segment_offset >= LOG_SEGMENT_SIZE):
+                compressed_size += len(add_segment().data)
+                num_segments += 1
+                parts = []
+            if not parts:
+                segment_offset = offset
+            if isinstance(text, str):
+                text = text.decode('utf-8')
+            parts.append(text)
+            segment_end = offset + size
+            num_chunks += 1
+        last_offset = chunks[-1].offset
+        db.session.flush()
+
+    if parts:
+        compressed_size += len(add_segment().data)
+        num_segments += 1
+
+    # Only remove what was compacted; a chunk appended since (which a
+    # finished step shouldn't get) is kept rather than lost.
+    LogChunk.query.filter(
+        LogChunk.source_id == source.id,
+        LogChunk.offset <= last_offset,
+    ).delete(synchronize_session=False)
+    source.date_compacted = datetime.utcnow()
+    db.session.add(source)
+    db.session.commit()
+
+    stats.incr('log_chunks_compacted', num_chunks)
+    stats.incr('log_segments_created', num_segments)
+    stats.incr('log_segment_bytes', compressed_size)
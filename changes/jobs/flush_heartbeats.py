@@ -0,0 +1,15 @@
+from __future__ import absolute_import
+
+from changes.config import statsreporter
+from changes.lib import heartbeats
+
+
+@statsreporter.timer('task_duration_flush_heartbeats')
+def flush_heartbeats():
+    """
+    Write the jobstep heartbeats buffered in redis to the jobstep table.
+    """
+    if not heartbeats.is_enabled():
+        return
+
+    heartbeats.flush()
@@ -0,0 +1,15 @@
+from __future__ import absolute_import
+
+from changes.config import statsreporter
+from changes.queue import task_state
+
+
+@statsreporter.timer('task_duration_flush_task_state')
+def flush_task_state():
+    """
+    Write the task states cached in redis back to the task table.
+    """
+    if not task_state.is_enabled():
+        return
+
+    task_state.flush()
@@ -5,11 +5,15 @@ import logging
 from datetime import datetime
 
 from changes.config import db
+from changes.lib.revision_ingestion import backfill_revisions
 from changes.models.repository import Repository, RepositoryStatus
 from changes.queue.task import tracked_task
 
 logger = logging.getLogger('repo.sync')
 
+# Number of commits to import per run.
+IMPORT_BATCH_SIZE = 1000
+
 
 @tracked_task(max_retries=None)
 def import_repo(repo_id, parent=None):
@@ -39,10 +43,8 @@ def import_repo(repo_id, parent=None):
     else:
         vcs.clone()
 
-    for commit in vcs.log(parent=parent):
-        revision, created, _ = commit.save(repo)
-        db.session.commit()
-        parent = commit.id
+    commits = list(vcs.log(parent=parent, limit=IMPORT_BATCH_SIZE))
+    backfill_revisions(repo, commits)
 
     Repository.query.filter(
         Repository.id == repo.id,
@@ -52,9 +54,10 @@ def import_repo(repo_id, parent=None):
     }, synchronize_session=False)
     db.session.commit()
 
-    if parent:
+    # The log starts at `parent`, so we're done once it is all that's left.
+    if commits and commits[-1].id != parent:
         import_repo.delay(
             repo_id=repo.id.hex,
             task_id=repo.id.hex,
-            parent=parent,
+            parent=commits[-1].id,
         )
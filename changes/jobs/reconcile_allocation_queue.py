@@ -0,0 +1,15 @@
+from __future__ import absolute_import
+
+from changes.config import statsreporter
+from changes.lib import allocation_queue
+
+
+@statsreporter.timer('task_duration_reconcile_allocation_queue')
+def reconcile_allocation_queue():
+    """
+    Repair any drift between the jobstep allocation queue and the database.
+    """
+    if not allocation_queue.is_enabled():
+        return
+
+    allocation_queue.reconcile()
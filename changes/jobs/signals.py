@@ -1,26 +1,132 @@
+import logging
+
 from flask import current_app
+from sqlalchemy.orm import joinedload, subqueryload
 
+from changes.config import db, redis, statsreporter
+from changes.models.build import Build
+from changes.models.job import Job
 from changes.queue.task import tracked_task
 from changes.utils.imports import import_string
 
+logger = logging.getLogger('signals')
+
+# The listeners that have already run for a fire_signal task, so that they
+# aren't run again if the task is retried.
+LISTENERS_DONE_KEY = 'fire_signal:{}:done'
+LISTENERS_DONE_TTL = 60 * 60 * 24
+
 
 class SuspiciousOperation(Exception):
     pass
 
 
+def is_in_process_dispatch_enabled():
+    return current_app.config['SIGNAL_DISPATCH_IN_PROCESS']
+
+
+def _get_listeners(signal):
+    return [listener for listener, l_signal in current_app.config['EVENT_LISTENERS']
+            if l_signal == signal]
+
+
 @tracked_task
 def fire_signal(signal, kwargs):
     """
     Tasks fire signals by spawning fire_signal tasks; they grab every
-    associated listener and spawn run_event_listener tasks for each
-    """
-    for listener, l_signal in current_app.config['EVENT_LISTENERS']:
-        if l_signal == signal:
-            run_event_listener.delay(
-                listener=listener,
-                signal=signal,
-                kwargs=kwargs,
-            )
+    associated listener and spawn run_event_listener tasks for each.
+
+    With SIGNAL_DISPATCH_IN_PROCESS, the listeners are instead run here, one
+    after the other, and only those that fail get run_event_listener tasks
+    (which retry them on their own).
+    """
+    listeners = _get_listeners(signal)
+    if is_in_process_dispatch_enabled():
+        listeners = _run_listeners(listeners, kwargs)
+
+    run_event_listener.delay_many([{
+        'listener': listener,
+        'signal': signal,
+        'kwargs': kwargs,
+    } for listener in listeners])
+
+    if is_in_process_dispatch_enabled():
+        redis.delete(LISTENERS_DONE_KEY.format(fire_signal.task_id))
+
+
+def _preload(kwargs):
+    """
+    Loads the build or job a signal is about, and what listeners commonly
+    use of it, into the session, so that the listeners' own lookups of them
+    are answered from the session's identity map.
+
+    Returns the loaded objects, which must be kept referenced for as long as
+    they should stay in the session.
+    """
+    objects = []
+    if 'build_id' in kwargs:
+        build = Build.query.options(
+            joinedload('project'),
+            joinedload('source').joinedload('revision'),
+            joinedload('author'),
+            subqueryload('stats'),
+        ).get(kwargs['build_id'])
+        if build:
+            objects.append(build)
+            objects.extend(Job.query.filter(Job.build_id == build.id))
+    if 'job_id' in kwargs:
+        job = Job.query.options(
+            joinedload('build'),
+            joinedload('project'),
+            joinedload('source'),
+        ).get(kwargs['job_id'])
+        if job:
+            objects.append(job)
+    return objects
+
+
+def _run_listeners(listeners, kwargs):
+    """
+    Runs `listeners` with `kwargs`, each in isolation from the others, and
+    returns those that failed.
+
+    The objects loaded by `_preload` serve the first listener; everything in
+    the session is expired after each listener, committed or rolled back,
+    so that those that follow see what it changed rather than stale state.
+    """
+    done_key = LISTENERS_DONE_KEY.format(fire_signal.task_id)
+    done = redis.smembers(done_key)
+
+    preloaded = _preload(kwargs)
+
+    failed = []
+    for listener in listeners:
+        if listener in done:
+            continue
+
+        stat_name = listener.replace('.', '_')
+        try:
+            with statsreporter.stats().timer('signal_listener_duration_' + stat_name):
+                import_string(listener)(**kwargs)
+            db.session.commit()
+        except Exception:
+            db.session.rollback()
+            logger.exception('Listener %s failed', listener)
+            statsreporter.stats().incr('signal_listener_failed_' + stat_name)
+            failed.append(listener)
+            continue
+        finally:
+            db.session.expire_all()
+
+        pipe = redis.pipeline()
+        pipe.sadd(done_key, listener)
+        pipe.expire(done_key, LISTENERS_DONE_TTL)
+        pipe.execute()
+
+    # the preloaded objects are kept referenced, and so in the session, until
+    # every listener ran
+    del preloaded
+    return failed
 
 
 @tracked_task
@@ -4,32 +4,34 @@ from sqlalchemy.sql import func
 
 from changes.config import db, queue, statsreporter
 from changes.constants import Result, Status
-from changes.db.utils import try_create
 from changes.jobs.signals import fire_signal
+from changes.jobs.sync_job import AGGREGATE_STAT_NAMES
 from changes.models.build import Build
-from changes.models.itemstat import ItemStat
+from changes.models.itemstat import ItemStat, create_item_stats
 from changes.models.job import Job
 from changes.utils.agg import aggregate_result, aggregate_status, safe_agg
 from changes.queue.task import tracked_task
 
 
-def aggregate_build_stat(build, name, func_=func.sum):
-    value = db.session.query(
-        func.coalesce(func_(ItemStat.value), 0),
+def aggregate_build_stats(build, names=AGGREGATE_STAT_NAMES):
+    """Record the sum of each of the `names` stats of the build's jobs
+    as stats of the build, using a single grouped query and a single insert
+    for all of them.
+    """
+    values = dict(db.session.query(
+        ItemStat.name, func.sum(ItemStat.value),
     ).filter(
         ItemStat.item_id.in_(
             db.session.query(Job.id).filter(
                 Job.build_id == build.id,
             )
         ),
-        ItemStat.name == name,
-    ).as_scalar()
+        ItemStat.name.in_(names),
+    ).group_by(
+        ItemStat.name,
+    ))
 
-    try_create(ItemStat, where={
-        'item_id': build.id,
-        'name': name,
-        'value': value,
-    })
+    create_item_stats(build.id, {name: values.get(name) or 0 for name in names})
 
 
 def abort_build(task):
@@ -126,18 +128,15 @@ def sync_build(build_id):
 
     with statsreporter.stats().timer('build_stat_aggregation'):
         try:
-            aggregate_build_stat(build, 'test_count')
-            aggregate_build_stat(build, 'test_duration')
-            aggregate_build_stat(build, 'test_failures')
-            aggregate_build_stat(build, 'test_rerun_count')
-            aggregate_build_stat(build, 'tests_missing')
-            aggregate_build_stat(build, 'lines_covered')
-            aggregate_build_stat(build, 'lines_uncovered')
-            aggregate_build_stat(build, 'diff_lines_covered')
-            aggregate_build_stat(build, 'diff_lines_uncovered')
+            aggregate_build_stats(build)
         except Exception:
             current_app.logger.exception('Failing recording aggregate stats for build %s', build.id)
 
+    # the stats are part of the serialized build, which is cached by date_modified
+    build.date_modified = datetime.utcnow()
+    db.session.add(build)
+    db.session.commit()
+
     fire_signal.delay(
         signal='build.finished',
         kwargs={'build_id': build.id.hex},
@@ -146,3 +145,8 @@ def sync_build(build_id):
     queue.delay('update_project_stats', kwargs={
         'project_id': build.project_id.hex,
     }, countdown=1)
+
+    queue.delay('update_test_failure_streaks', kwargs={
+        'project_id': build.project_id.hex,
+        'build_id': build.id.hex,
+    }, countdown=1)
@@ -7,14 +7,14 @@ from sqlalchemy.sql import func
 from changes.backends.base import UnrecoverableException
 from changes.config import db, queue, statsreporter
 from changes.constants import Status, Result
-from changes.db.utils import try_create
 from changes.jobs.signals import fire_signal
-from changes.models.itemstat import ItemStat
+from changes.models.itemstat import ItemStat, create_item_stats
 from changes.models.job import Job
 from changes.models.jobphase import JobPhase
 from changes.models.jobplan import JobPlan
 from changes.models.jobstep import JobStep
 from changes.models.test import TestCase
+from changes.models.testresult import TEST_RESULT_STAT_NAMES
 from changes.queue.task import tracked_task
 from changes.utils.agg import aggregate_status, safe_agg
 
@@ -22,10 +22,28 @@ from changes.utils.agg import aggregate_status, safe_agg
 # TODO(nate): make this a config
 MAX_DURATION_FOR_RETRY_SECS = 900
 
-
-def aggregate_job_stat(job, name, func_=func.sum):
-    value = db.session.query(
-        func.coalesce(func_(ItemStat.value), 0),
+# Stats of job steps which are summed into stats of their job (and then of
+# their build) once the job finishes.
+AGGREGATE_STAT_NAMES = (
+    'test_count',
+    'test_duration',
+    'test_failures',
+    'test_rerun_count',
+    'tests_missing',
+    'lines_covered',
+    'lines_uncovered',
+    'diff_lines_covered',
+    'diff_lines_uncovered',
+) + TEST_RESULT_STAT_NAMES
+
+
+def aggregate_job_stats(job, names=AGGREGATE_STAT_NAMES):
+    """Record the sum of each of the `names` stats of the job's steps which
+    have not been replaced as stats of the job, using a single grouped query
+    and a single insert for all of them.
+    """
+    values = dict(db.session.query(
+        ItemStat.name, func.sum(ItemStat.value),
     ).filter(
         ItemStat.item_id.in_(
             db.session.query(JobStep.id).filter(
@@ -33,14 +51,12 @@ def aggregate_job_stat(job, name, func_=func.sum):
                 JobStep.replacement_id.is_(None),
             )
         ),
-        ItemStat.name == name,
-    ).as_scalar()
+        ItemStat.name.in_(names),
+    ).group_by(
+        ItemStat.name,
+    ))
 
-    try_create(ItemStat, where={
-        'item_id': job.id,
-        'name': name,
-        'value': value,
-    })
+    create_item_stats(job.id, {name: values.get(name) or 0 for name in names})
 
 
 def _should_retry_jobstep(step):
@@ -212,18 +228,15 @@ def sync_job(job_id):
         raise sync_job.NotFinished
 
     try:
-        aggregate_job_stat(job, 'test_count')
-        aggregate_job_stat(job, 'test_duration')
-        aggregate_job_stat(job, 'test_failures')
-        aggregate_job_stat(job, 'test_rerun_count')
-        aggregate_job_stat(job, 'tests_missing')
-        aggregate_job_stat(job, 'lines_covered')
-        aggregate_job_stat(job, 'lines_uncovered')
-        aggregate_job_stat(job, 'diff_lines_covered')
-        aggregate_job_stat(job, 'diff_lines_uncovered')
+        aggregate_job_stats(job)
     except Exception:
         current_app.logger.exception('Failing recording aggregate stats for job %s', job.id)
 
+    # the stats are part of the serialized job, which is cached by date_modified
+    job.date_modified = datetime.utcnow()
+    db.session.add(job)
+    db.session.commit()
+
     fire_signal.delay(
         signal='job.finished',
         kwargs={'job_id': job.id.hex},
@@ -234,3 +247,8 @@ def sync_job(job_id):
             'project_id': job.project_id.hex,
             'plan_id': jobplan.plan_id.hex,
         }, countdown=1)
+
+    queue.delay('update_project_duration_stats', kwargs={
+        'project_id': job.project_id.hex,
+        'job_id': job.id.hex,
+    }, countdown=1)
@@ -2,6 +2,7 @@ from __future__ import absolute_import, print_function
 
 import os
 import requests
+import time
 
 from collections import defaultdict
 from datetime import datetime
@@ -13,7 +14,7 @@ from sqlalchemy.exc import IntegrityError
 from sqlalchemy.sql import func
 
 from changes.constants import Status, Result, ResultSource
-from changes.config import db, statsreporter
+from changes.config import db, queue, redis, statsreporter
 from changes.db.utils import try_create
 from changes.jobs.sync_artifact import sync_artifact
 from changes.lib.artifact_store_lib import ArtifactStoreClient
@@ -29,12 +30,25 @@ from changes.models.log import LogSource
 from changes.models.option import ItemOption
 from changes.models.snapshot import SnapshotImage
 from changes.models.test import TestCase
-from changes.queue.task import tracked_task
+from changes.queue.task import CONTINUE_COUNTDOWN, tracked_task
 from changes.db.utils import get_or_create
 from changes.storage.artifactstore import ARTIFACTSTORE_PREFIX, ArtifactStoreFileStorage
 
 INFRA_FAILURE_REASONS = ['malformed_manifest_json', 'missing_manifest_json']
 
+# The polling state of a step: when its next poll is due (as a unix time) and
+# how many times it has been polled.
+POLL_KEY = 'sync_job_step:{}'
+WAKEUP_KEY = 'sync_job_step:wakeup:{}'
+
+# With adaptive polling, an unfinished step is polled after this fraction of
+# the time it has been in its current state.
+POLL_BACKOFF = 0.1
+
+# How early (in seconds) a poll may run and still be taken as the one that's
+# due, rather than one superseded by a wakeup.
+POLL_SLACK = 2
+
 
 def abort_step(task):
     step = JobStep.query.get(task.kwargs['step_id'])
@@ -351,12 +365,123 @@ def _sync_artifacts_for_jobstep(step):
     # buildstep may want to check for e.g. required artifacts
     buildstep.verify_final_artifacts(step, to_sync)
 
-    for artifact in to_sync:
-        sync_artifact.delay_if_needed(
-            artifact_id=artifact.id.hex,
-            task_id=artifact.id.hex,
-            parent_task_id=step.id.hex,
-        )
+    sync_artifact.delay_if_needed_many([{
+        'artifact_id': artifact.id.hex,
+        'task_id': artifact.id.hex,
+        'parent_task_id': step.id.hex,
+    } for artifact in to_sync])
+
+
+def is_adaptive_polling_enabled():
+    return current_app.config['SYNC_JOB_STEP_ADAPTIVE_POLLING']
+
+
+def get_poll_interval(step):
+    """
+    Returns the number of seconds to wait before polling an unfinished step
+    again when polling adaptively.
+
+    Steps are polled less often the longer they've been queued or running, as
+    they're then less likely to change soon; finished steps are only waiting
+    on their artifacts to sync, so they're polled as often as ever.
+    """
+    if step.status == Status.finished:
+        return CONTINUE_COUNTDOWN
+
+    since = step.date_started or step.date_created
+    age = (datetime.utcnow() - since).total_seconds()
+    max_interval = current_app.config['SYNC_JOB_STEP_MAX_POLL_INTERVAL']
+    return int(min(max(age * POLL_BACKOFF, CONTINUE_COUNTDOWN), max_interval))
+
+
+def wake_sync_job_step(step):
+    """
+    Polls `step` now rather than at its next scheduled poll, to be called when
+    we're told something about the step changed.
+
+    This does nothing unless polling adaptively, or if a poll is due soon
+    anyway, and wakeups of the same step are debounced.
+    """
+    if not is_adaptive_polling_enabled():
+        return
+
+    key = POLL_KEY.format(step.id.hex)
+    next_poll = redis.hget(key, 'next_poll')
+    # not polled yet, or already done with
+    if next_poll is None or float(next_poll) == float('inf'):
+        return
+    # Also guarantees the step isn't being polled right now, which would make
+    # the wakeup fail to get the task's lock.
+    if float(next_poll) - time.time() <= CONTINUE_COUNTDOWN:
+        return
+    if not redis.set(WAKEUP_KEY.format(step.id.hex), 1, nx=True, ex=CONTINUE_COUNTDOWN):
+        return
+
+    redis.hset(key, 'next_poll', time.time())
+    # The task is already tracked, so this only needs to enqueue another run.
+    queue.delay('sync_job_step', kwargs={
+        'step_id': step.id.hex,
+        'task_id': step.id.hex,
+        'parent_task_id': step.job_id.hex,
+    })
+    statsreporter.stats().incr('sync_job_step_wakeups')
+
+
+def _poll_ttl():
+    # outlives the longest wait between polls
+    return current_app.config['SYNC_JOB_STEP_MAX_POLL_INTERVAL'] * 2 + 60
+
+
+def _start_poll(step):
+    """
+    Records a poll of `step`, or returns False if it was superseded by a
+    wakeup (which will have scheduled the next poll itself).
+    """
+    key = POLL_KEY.format(step.id.hex)
+    if is_adaptive_polling_enabled():
+        next_poll = redis.hget(key, 'next_poll')
+        if next_poll is not None and float(next_poll) > time.time() + POLL_SLACK:
+            return False
+
+    pipe = redis.pipeline()
+    pipe.hincrby(key, 'polls', 1)
+    pipe.expire(key, _poll_ttl())
+    pipe.execute()
+    statsreporter.stats().incr('sync_job_step_polls')
+    return True
+
+
+def _schedule_poll(step):
+    """
+    Returns the number of seconds until the next poll of `step`.
+    """
+    if not is_adaptive_polling_enabled():
+        return CONTINUE_COUNTDOWN
+
+    interval = get_poll_interval(step)
+    key = POLL_KEY.format(step.id.hex)
+    pipe = redis.pipeline()
+    pipe.hset(key, 'next_poll', time.time() + interval)
+    pipe.expire(key, _poll_ttl())
+    pipe.execute()
+    return interval
+
+
+def _finish_polling(step):
+    key = POLL_KEY.format(step.id.hex)
+    polls = redis.hget(key, 'polls')
+    if is_adaptive_polling_enabled():
+        # drop any polls still scheduled
+        pipe = redis.pipeline()
+        pipe.hset(key, 'next_poll', float('inf'))
+        pipe.expire(key, _poll_ttl())
+        pipe.execute()
+    else:
+        redis.delete(key)
+
+    stats = statsreporter.stats()
+    stats.incr('sync_job_step_completed')
+    stats.incr('sync_job_step_completed_polls', int(polls or 0))
 
 
 @tracked_task(on_abort=abort_step, max_retries=100)
@@ -368,6 +493,9 @@ def sync_job_step(step_id):
     if not step:
         return
 
+    if not _start_poll(step):
+        raise sync_job_step.Superseded
+
     jobplan, implementation = JobPlan.get_build_step_for_job(job_id=step.job_id)
 
     # only synchronize if upstream hasn't suggested we're finished
@@ -430,7 +558,7 @@ def sync_job_step(step_id):
                 current_app.logger.warning(
                     "Timed out jobstep that wasn't in progress: %s (was %s)", step.id, old_status)
 
-        raise sync_job_step.NotFinished
+        raise sync_job_step.NotFinished(retry_after=_schedule_poll(step))
 
     # Close the ArtifactStore bucket used by jenkins, if it exists
     bucket_name = step.data.get('jenkins_bucket_name')
@@ -446,6 +574,7 @@ def sync_job_step(step_id):
     # well, or have some named condition like "not meaningful_result(step.result)".
     if step.result in (Result.aborted, Result.infra_failed):
         _report_jobstep_result(step)
+        _finish_polling(step)
         return
 
     # Check for FailureReason objects generated by child jobs
@@ -456,6 +585,7 @@ def sync_job_step(step_id):
         db.session.commit()
         if failure_result == Result.infra_failed:
             _report_jobstep_result(step)
+            _finish_polling(step)
             return
 
     try:
@@ -524,6 +654,9 @@ def sync_job_step(step_id):
         db.session.commit()
 
     _report_jobstep_result(step)
+    # Only once the step is done with, as a poll that fails before then has
+    # to be retried.
+    _finish_polling(step)
 
 
 def _report_jobstep_result(step):
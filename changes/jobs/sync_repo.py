@@ -6,8 +6,8 @@ from datetime import datetime
 
 from changes.config import db
 from changes.jobs.signals import fire_signal
+from changes.lib.revision_ingestion import sync_revisions
 from changes.models.repository import Repository, RepositoryBackend, RepositoryStatus
-from changes.models.revision import Revision
 from changes.queue.task import tracked_task
 from changes.vcs.base import ConcurrentUpdateError
 
@@ -56,50 +56,19 @@ def sync(repo):
     else:
         vcs.clone()
 
-    # The loop below do two things:
-    # 1) adds new revisions to the database
-    # 2) fire off revision created signals for recent revisions
-    #
-    # TODO(dcramer): this doesnt scrape everything, and really we wouldn't
-    # want to do this all in a single job so we should split this into a
-    # backfill task
+    # Adds new revisions to the database, and fires revision.created signals
+    # for recent revisions. Older history is imported by import_repo.
     if repo.backend == RepositoryBackend.git:
         revisions = vcs.log(parent=None, limit=NUM_RECENT_COMMITS, first_parent=False)
     else:
         revisions = vcs.log(parent=None, limit=NUM_RECENT_COMMITS)
 
-    for commit in revisions:
-        known_revision = Revision.query.filter(
-            Revision.repository_id == repo.id,
-            Revision.sha == commit.id
-        ).with_for_update().scalar()
-
-        if known_revision and known_revision.date_created_signal:
-            db.session.commit()
-            continue
-
-        revision, created, _ = commit.save(repo)
-        db.session.commit()
-
-        # Lock the revision.
-        revision = Revision.query.filter(
-            Revision.repository_id == repo.id,
-            Revision.sha == commit.id
-        ).with_for_update().scalar()
-
-        # Fire the signal if the revision was created or its branches were discovered.
-        #
-        # The `revision.branches` check is a hack right now to prevent builds from
-        # triggering on branchless commits.
-        if revision.branches and not revision.date_created_signal:
-            revision.date_created_signal = datetime.utcnow()
-            fire_signal.delay(
-                signal='revision.created',
-                kwargs={'repository_id': repo.id.hex,
-                        'revision_sha': revision.sha},
-            )
-            db.session.commit()
-        db.session.commit()
+    fire_signal.delay_many([{
+        'signal': 'revision.created',
+        'kwargs': {'repository_id': repo.id.hex,
+                   'revision_sha': sha},
+    } for sha in sync_revisions(repo, list(revisions))])
+    db.session.commit()
 
     Repository.query.filter(
         Repository.id == repo.id,
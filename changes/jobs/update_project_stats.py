@@ -1,12 +1,18 @@
+from flask import current_app
 from sqlalchemy import and_
+from sqlalchemy.sql import func, select
 
-from changes.config import db
-from changes.constants import Result, Status
+from changes.config import db, redis
+from changes.constants import Result, ResultSource, Status
+from changes.models.bazeltarget import BazelTarget
 from changes.models.build import Build
+from changes.models.durationstat import DurationStatType, prune_durations, record_durations
 from changes.models.job import Job
 from changes.models.jobplan import JobPlan
 from changes.models.plan import Plan
 from changes.models.project import Project
+from changes.models.test import TestCase
+from changes.models.testfailurestreak import record_build_failures
 from changes.utils.locking import lock
 
 
@@ -65,3 +71,65 @@ def update_project_plan_stats(project_id, plan_id):
     ).update({
         Plan.avg_build_time: avg_build_time,
     }, synchronize_session=False)
+
+
+def update_project_duration_stats(project_id, job_id):
+    """
+    Adds the test and target durations of a finished job to the duration
+    stats of its project.
+    """
+    job = Job.query.get(job_id)
+    if not job or job.status != Status.finished:
+        return
+    # diffs can change how long anything takes, so only learn from commits
+    if not job.build.source.is_commit():
+        return
+
+    test_durations = select([
+        TestCase.name, func.max(TestCase.duration).label('duration'),
+    ]).where(and_(
+        TestCase.job_id == job.id,
+        TestCase.duration.isnot(None),
+    )).group_by(TestCase.name)
+
+    target_durations = select([
+        BazelTarget.name, func.max(BazelTarget.duration).label('duration'),
+    ]).where(and_(
+        BazelTarget.job_id == job.id,
+        BazelTarget.result_source == ResultSource.from_self,
+        BazelTarget.duration.isnot(None),
+    )).group_by(BazelTarget.name)
+
+    # the stats are inserted if they don't exist yet, so updates to a project
+    # have to be serialized
+    with redis.lock('duration_stats:{}'.format(project_id), expire=300, blocking_timeout=60):
+        record_durations(job.project_id, DurationStatType.test, test_durations)
+        record_durations(job.project_id, DurationStatType.target, target_durations)
+        max_age = current_app.config['DURATION_STATS_MAX_AGE']
+        for stat_type in (DurationStatType.test, DurationStatType.target):
+            prune_durations(job.project_id, stat_type, max_age)
+        db.session.commit()
+
+
+def update_test_failure_streaks(project_id, build_id):
+    """
+    Advances the test failure streaks of a project by a finished build.
+    """
+    build = Build.query.get(build_id)
+    if not build or build.status != Status.finished:
+        return
+    # streaks follow the commits of a project, and only builds that ran tests
+    if build.result not in (Result.failed, Result.passed) or not build.source.is_commit():
+        return
+
+    failures = select([TestCase.name_sha.label('name_sha')]).where(and_(
+        TestCase.job_id == Job.id,
+        Job.build_id == build.id,
+        Job.status == Status.finished,
+        Job.result == Result.failed,
+        TestCase.result == Result.failed,
+    )).distinct()
+
+    with redis.lock('failure_streaks:{}'.format(project_id), expire=300, blocking_timeout=60):
+        record_build_failures(build, failures)
+        db.session.commit()
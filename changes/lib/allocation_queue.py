@@ -0,0 +1,260 @@
+"""
+An index of the JobSteps waiting to be allocated, so that schedulers polling
+JobStepAllocateAPIView don't each have to scan and join every pending step.
+
+Each cluster has a Redis sorted set of the ids of its pending_allocation
+steps, scored so that ascending order is allocation order: higher build
+priority first, then older steps first. The sets are updated from session
+hooks as steps enter and leave pending_allocation (and when a build's
+priority changes), and only once the change is committed.
+
+Changes made outside the ORM, or lost because Redis was unavailable, are
+repaired by `reconcile`, which compares the sets against the database and is
+run periodically. Readers should still treat entries as hints and check the
+status of the steps they load.
+"""
+
+from __future__ import absolute_import
+
+import logging
+
+from calendar import timegm
+from collections import OrderedDict, defaultdict
+
+from flask import current_app
+from sqlalchemy import inspect
+from sqlalchemy.sql import select
+
+from changes.config import db, redis, statsreporter
+from changes.constants import Status
+from changes.models.build import Build
+from changes.models.job import Job
+from changes.models.jobstep import JobStep
+
+logger = logging.getLogger('changes.allocation_queue')
+
+QUEUE_KEY = 'jobstep:allocation_queue'
+
+# Priorities are multiples of 100, and milliseconds since the epoch stay
+# well below this for the foreseeable future.
+PRIORITY_WEIGHT = 10 ** 13
+
+_STEPS_INFO_KEY = 'allocation_queue_steps'
+_BUILDS_INFO_KEY = 'allocation_queue_builds'
+_UPDATES_INFO_KEY = 'allocation_queue_updates'
+
+
+def is_enabled():
+    return current_app.config['JOBSTEP_ALLOCATION_QUEUE_ENABLED']
+
+
+def get_queue_key(cluster):
+    if cluster is None:
+        return QUEUE_KEY
+    return '{}:{}'.format(QUEUE_KEY, cluster)
+
+
+def get_score(priority, date_created):
+    """
+    Returns the score of a step with the given build priority and creation
+    date; lower scores are allocated first.
+    """
+    timestamp = timegm(date_created.utctimetuple()) * 1000 + date_created.microsecond // 1000
+    return -priority.value * PRIORITY_WEIGHT + timestamp
+
+
+def get_candidates(cluster, count):
+    """
+    Returns the ids (as hex strings) of the first `count` steps in the queue
+    for `cluster`, in allocation order.
+    """
+    return redis.zrange(get_queue_key(cluster or None), 0, count - 1)
+
+
+def remove(cluster, jobstep_ids):
+    """
+    Removes entries (e.g. ones found to be stale) from the queue for `cluster`.
+    """
+    if jobstep_ids:
+        redis.zrem(get_queue_key(cluster or None), *jobstep_ids)
+
+
+def _pending_step_query(filters):
+    return select([
+        JobStep.id, JobStep.cluster, JobStep.date_created, Build.priority,
+    ]).select_from(
+        JobStep.__table__.join(
+            Job.__table__, JobStep.job_id == Job.id,
+        ).join(
+            Build.__table__, Job.build_id == Build.id,
+        )
+    ).where(JobStep.status == Status.pending_allocation).where(filters)
+
+
+def after_flush(session, flush_context):
+    """
+    Records which steps were added to or removed from (and which builds were
+    reprioritized in) the queue by this flush. The queue itself is only
+    updated once the transaction is committed.
+    """
+    if not is_enabled():
+        return
+
+    steps = session.info.setdefault(_STEPS_INFO_KEY, defaultdict(set))
+    builds = session.info.setdefault(_BUILDS_INFO_KEY, set())
+    for instance in session.new | session.dirty | session.deleted:
+        if isinstance(instance, JobStep):
+            state = inspect(instance)
+            cluster = state.attrs.cluster.history
+            if instance in session.new or instance in session.deleted or \
+                    cluster.has_changes() or state.attrs.status.history.has_changes():
+                # remember every cluster the step was in, so that it can be
+                # removed from the right queue
+                steps[instance.id].update(cluster.sum())
+                steps[instance.id].add(instance.cluster)
+        elif isinstance(instance, Build):
+            if inspect(instance).attrs.priority.history.has_changes():
+                builds.add(instance.id)
+
+
+def _get_savepoint(session):
+    """
+    Returns the innermost savepoint (or the outermost transaction) the
+    session is in, skipping over subtransactions.
+    """
+    transaction = session.transaction
+    while transaction.parent is not None and not transaction.nested:
+        transaction = transaction.parent
+    return transaction
+
+
+def after_flush_postexec(session, flush_context):
+    """
+    Reads the queue entries for everything recorded by `after_flush`, now that
+    the flush is visible to this transaction.
+    """
+    steps = session.info.pop(_STEPS_INFO_KEY, None)
+    builds = session.info.pop(_BUILDS_INFO_KEY, None)
+    if not (steps or builds):
+        return
+
+    # keep the updates of each savepoint apart, so that they can be rolled back
+    updates = session.info.setdefault(_UPDATES_INFO_KEY, OrderedDict()) \
+        .setdefault(_get_savepoint(session), {})
+    if steps:
+        for jobstep_id, clusters in steps.iteritems():
+            updates[jobstep_id] = (clusters, None)
+        for row in session.execute(_pending_step_query(JobStep.id.in_(steps.keys()))):
+            updates[row.id] = (steps[row.id], (row.cluster, get_score(row.priority, row.date_created)))
+    if builds:
+        for row in session.execute(_pending_step_query(Job.build_id.in_(builds))):
+            clusters, _ = updates.get(row.id, (set(), None))
+            updates[row.id] = (clusters, (row.cluster, get_score(row.priority, row.date_created)))
+
+
+def after_commit(session):
+    updates_by_savepoint = session.info.pop(_UPDATES_INFO_KEY, None)
+    if not updates_by_savepoint:
+        return
+
+    updates = {}
+    for savepoint_updates in updates_by_savepoint.itervalues():
+        for jobstep_id, (clusters, entry) in savepoint_updates.iteritems():
+            old_clusters, _ = updates.get(jobstep_id, (set(), None))
+            updates[jobstep_id] = (old_clusters | clusters, entry)
+
+    pipe = redis.pipeline(transaction=False)
+    added = 0
+    for jobstep_id, (old_clusters, entry) in updates.iteritems():
+        member = jobstep_id.hex
+        if entry is not None:
+            cluster, score = entry
+            old_clusters = old_clusters - {cluster}
+            pipe.zadd(get_queue_key(cluster), **{member: score})
+            added += 1
+        for cluster in old_clusters:
+            pipe.zrem(get_queue_key(cluster), member)
+    try:
+        pipe.execute()
+    except Exception:
+        # reconcile will catch up
+        logger.exception('Unable to update the allocation queue')
+        return
+
+    stats = statsreporter.stats()
+    stats.incr('jobstep_allocation_queue_added', added)
+    stats.incr('jobstep_allocation_queue_removed', len(updates) - added)
+
+
+def after_soft_rollback(session, previous_transaction):
+    """
+    Forgets the queue updates of a rolled back transaction. Rolling back a
+    savepoint (e.g. in `try_create`) only forgets the updates made since it
+    was started, as the rest of the transaction may still be committed.
+    """
+    session.info.pop(_STEPS_INFO_KEY, None)
+    session.info.pop(_BUILDS_INFO_KEY, None)
+    if previous_transaction.parent is None:
+        session.info.pop(_UPDATES_INFO_KEY, None)
+    else:
+        session.info.get(_UPDATES_INFO_KEY, {}).pop(previous_transaction, None)
+
+
+def reconcile():
+    """
+    Brings the queue in line with the database, which remains the source of
+    truth. Returns the number of (missing, stale) entries that were repaired.
+    """
+    expected = defaultdict(dict)
+    for row in db.session.execute(_pending_step_query(True)):
+        expected[get_queue_key(row.cluster)][row.id.hex] = get_score(row.priority, row.date_created)
+
+    keys = set(expected)
+    keys.update(redis.keys(QUEUE_KEY))
+    keys.update(redis.keys(QUEUE_KEY + ':*'))
+
+    missing = {}
+    stale = {}
+    for key in keys:
+        actual = dict(redis.zrange(key, 0, -1, withscores=True))
+        missing[key] = {
+            member: score
+            for member, score in expected[key].iteritems()
+            if actual.get(member) != score
+        }
+        stale[key] = [member for member in actual if member not in expected[key]]
+
+    # Steps may have started pending since we looked, in which case
+    # their entries were added by the commit which changed them.
+    stale_ids = {member for members in stale.itervalues() for member in members}
+    if stale_ids:
+        still_pending = {
+            (get_queue_key(cluster), jobstep_id.hex)
+            for jobstep_id, cluster in db.session.query(JobStep.id, JobStep.cluster).filter(
+                JobStep.id.in_(stale_ids),
+                JobStep.status == Status.pending_allocation,
+            )
+        }
+        stale = {
+            key: [member for member in members if (key, member) not in still_pending]
+            for key, members in stale.iteritems()
+        }
+
+    pipe = redis.pipeline(transaction=False)
+    for key, members in missing.iteritems():
+        if members:
+            pipe.zadd(key, **members)
+    for key, members in stale.iteritems():
+        if members:
+            pipe.zrem(key, *members)
+    pipe.execute()
+
+    num_missing = sum(len(m) for m in missing.itervalues())
+    num_stale = sum(len(m) for m in stale.itervalues())
+    if num_missing or num_stale:
+        logger.warning('Allocation queue was missing %d and had %d stale entries',
+                       num_missing, num_stale)
+    stats = statsreporter.stats()
+    stats.incr('jobstep_allocation_queue_missing', num_missing)
+    stats.incr('jobstep_allocation_queue_stale', num_stale)
+    return num_missing, num_stale
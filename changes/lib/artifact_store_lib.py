@@ -12,6 +12,9 @@ DEFAULT_TIMEOUT_SEC = 15
 MAX_RETRIES = 5
 RETRY_SLEEP_MSEC = 1000
 
+# Size of the chunks artifact contents are streamed in.
+CONTENT_CHUNK_SIZE = 64 * 1024
+
 
 def is_error(resp):
     return not resp.ok
@@ -271,3 +274,18 @@ class ArtifactStoreClient:
                                        headers=headers)
                 .content
         )
+
+    def iter_artifact_content(self, bucket_name, artifact_name, chunk_size=CONTENT_CHUNK_SIZE):
+        """
+        Fetches the contents of an artifact from artifactstore without
+        holding all of it in memory.
+
+        :return: Iterator of strings of up to `chunk_size` bytes
+        """
+        resp = self._simple_retry_request('get', '/buckets/%s/artifacts/%s/content' % (bucket_name, artifact_name),
+                                          stream=True)
+        try:
+            for chunk in resp.iter_content(chunk_size):
+                yield chunk
+        finally:
+            resp.close()
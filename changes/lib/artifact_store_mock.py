@@ -192,3 +192,8 @@ class ArtifactStoreMock:
                 end_offset = offset + limit
 
         return StringIO(ArtifactStoreMock.artifact_content[bucket_name][artifact_name][start_offset:end_offset])
+
+    def iter_artifact_content(self, bucket_name, artifact_name, chunk_size=64 * 1024):
+        content = ArtifactStoreMock.artifact_content[bucket_name][artifact_name]
+        for offset in xrange(0, len(content), chunk_size):
+            yield content[offset:offset + chunk_size]
@@ -6,13 +6,15 @@ from flask import current_app
 
 from changes.api.build_details import get_parents_last_builds
 from changes.constants import Result
+from changes.lib import log_reader
 from changes.models.build import Build  # NOQA
 from changes.models.job import Job
 from changes.models.jobstep import JobStep
-from changes.models.log import LogSource, LogChunk
+from changes.models.log import LOG_CHUNK_SIZE, LogSource
+from changes.models.testmessage import get_messages
 from changes.models.test import TestCase
 from changes.utils.http import build_web_uri
-from sqlalchemy.orm import subqueryload_all
+from sqlalchemy.orm import subqueryload_all, undefer
 
 from typing import Any, cast, Dict, List, NamedTuple, Optional, Tuple  # NOQA
 
@@ -187,18 +189,23 @@ def _get_job_context(job):
     # type: (Job) -> Dict[str, Any]
     def get_job_failing_tests(job, limit=500):
         failing_tests = TestCase.query.options(
-            subqueryload_all('messages')
+            subqueryload_all('messages'),
+            undefer('message'),
         ).filter(
             TestCase.job_id == job.id,
             TestCase.result == Result.failed,
         ).order_by(TestCase.name.asc())
 
+        failing_tests = failing_tests[:limit]
+        # Read the messages of every test together, rather than test by test.
+        bodies = get_messages(list(chain(*[t.messages for t in failing_tests])))
+
         failing_tests = [
             {
                 'test_case': test_case,
                 'uri': build_web_uri(_get_test_case_uri(test_case)),
-                'message': xunit.get_testcase_messages(test_case),
-            } for test_case in failing_tests[:limit]
+                'message': xunit.get_testcase_messages(test_case, bodies),
+            } for test_case in failing_tests
         ]
         failing_tests_count = len(failing_tests)
 
@@ -244,20 +251,16 @@ def _get_log_clipping(logsource, max_size=5000, max_lines=25):
     if logsource.in_artifact_store:
         # We don't yet get clippings for ArtifactStore logs.
         return ""
-    queryset = LogChunk.query.filter(
-        LogChunk.source_id == logsource.id,
-    )
-    tail = queryset.order_by(LogChunk.offset.desc()).limit(1).first()
-    # in case logsource has no LogChunks
-    if tail is None:
+    size = log_reader.get_log_size(logsource)
+    # in case logsource has no text
+    if not size:
         current_app.logger.warning('LogSource (id=%s) had no LogChunks', logsource.id.hex)
         return ""
 
-    chunks = list(queryset.filter(
-        (LogChunk.offset + LogChunk.size) >= max(tail.offset - max_size, 0),
-    ).order_by(LogChunk.offset.asc()))
+    # allow for trailing whitespace, which is stripped
+    text = log_reader.read_log(logsource, max(size - max_size - LOG_CHUNK_SIZE, 0))
 
-    clipping = ''.join(l.text for l in chunks).strip()[-max_size:]
+    clipping = text.strip()[-max_size:]
     # only return the last 25 lines
     clipping = '\r\n'.join(clipping.splitlines()[-max_lines:])
 
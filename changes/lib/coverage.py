@@ -1,4 +1,9 @@
 
+import binascii
+
+from collections import defaultdict
+from string import maketrans
+
 from changes.config import db
 from changes.constants import Status
 from changes.models.build import Build
@@ -6,7 +11,13 @@ from changes.models.filecoverage import FileCoverage
 from changes.models.job import Job
 from changes.models.project import Project
 from changes.models.source import Source
-from typing import Iterable, NamedTuple, Set  # NOQA
+from typing import Dict, Iterable, List, NamedTuple, Set  # NOQA
+
+# Coverage characters are translated to one byte of flags per line, chosen so
+# that OR-ing the flags of two lines gives the flags of the 'stronger' one:
+# 'C' defeats 'U' and both defeat 'N'.  Any other character counts as 'N'.
+_FLAGS_BY_CHAR = ''.join({'U': '\x01', 'C': '\x03'}.get(chr(i), '\x00') for i in xrange(256))
+_CHAR_BY_FLAGS = maketrans('\x00\x01\x03', 'NUC')
 
 
 def get_coverage_by_source_id(source_id):
@@ -82,25 +93,36 @@ def merge_coverage(old, new):
     The merged string contains the 'stronger' or the two corresponding
     characters, where 'C' defeats 'U' and both defeat 'N'.
     """
-    cov_data = []
-    for lineno in range(max(len(old), len(new))):
-        try:
-            old_cov = old[lineno]
-        except IndexError:
-            old_cov = 'N'
-
-        try:
-            new_cov = new[lineno]
-        except IndexError:
-            new_cov = 'N'
-
-        if old_cov == 'C' or new_cov == 'C':
-            cov_data.append('C')
-        elif old_cov == 'U' or new_cov == 'U':
-            cov_data.append('U')
-        else:
-            cov_data.append('N')
-    return ''.join(cov_data)
+    return merge_coverages([old, new])
+
+
+def merge_coverages(coverages):
+    # type: (Iterable[str]) -> str
+    """Merge any number of coverage strings at once, as merge_coverage() does
+    for two of them.
+
+    Rather than comparing line by line in Python, each string is translated
+    to flags (see _FLAGS_BY_CHAR) and read as one big integer, so merging is
+    a bitwise OR of the integers and all of the per-line work happens in C.
+    """
+    flags_list = []
+    for data in coverages:
+        if not data:
+            continue
+        if isinstance(data, unicode):
+            data = data.encode('ascii', 'replace')
+        flags_list.append(data.translate(_FLAGS_BY_CHAR))
+
+    if not flags_list:
+        return ''
+
+    length = max(len(flags) for flags in flags_list)
+    merged = 0
+    for flags in flags_list:
+        # Lines past the end of a shorter string have no coverage info.
+        merged |= int(binascii.hexlify(flags.ljust(length, '\x00')), 16)
+    merged_flags = binascii.unhexlify(('%x' % merged).zfill(length * 2))
+    return merged_flags.translate(_CHAR_BY_FLAGS)
 
 
 def merged_coverage_data(coverages):
@@ -111,14 +133,16 @@ def merged_coverage_data(coverages):
     value is a dict mapping filenames to the merged coverage data in
     the form as described for get_coverage_by_job_ids().
     """
-    coverage = {}  # type: Dict[str, str]
+    data_by_filename = defaultdict(list)  # type: Dict[str, List[str]]
     for c in coverages:
-        data = coverage.get(c.filename)
-        if data:
-            data = merge_coverage(data, c.data)
+        data_by_filename[c.filename].append(c.data)
+
+    coverage = {}  # type: Dict[str, str]
+    for filename, data_list in data_by_filename.iteritems():
+        if len(data_list) == 1:
+            coverage[filename] = data_list[0]
         else:
-            data = c.data
-        coverage[c.filename] = data
+            coverage[filename] = merge_coverages(data_list)
     return coverage
 
 
@@ -134,21 +158,21 @@ def get_coverage_stats(diff_lines, data):
     # type: (Set[int], str) -> CoverageStats
     """Return a tuple of coverage stats."""
 
-    lines_covered = 0
-    lines_uncovered = 0
+    lines_covered = data.count('C')
+    lines_uncovered = data.count('U')
     diff_lines_covered = 0
     diff_lines_uncovered = 0
 
-    for lineno, code in enumerate(data):
+    # Diffs are usually much smaller than the files they touch, so look up
+    # the diff lines instead of scanning the whole file for them.
+    for lineno in diff_lines:
         # lineno is 1-based in diff
-        line_in_diff = bool((lineno + 1) in diff_lines)
+        if not 0 < lineno <= len(data):
+            continue
+        code = data[lineno - 1]
         if code == 'C':
-            lines_covered += 1
-            if line_in_diff:
-                diff_lines_covered += 1
+            diff_lines_covered += 1
         elif code == 'U':
-            lines_uncovered += 1
-            if line_in_diff:
-                diff_lines_uncovered += 1
+            diff_lines_uncovered += 1
 
     return CoverageStats(lines_covered, lines_uncovered, diff_lines_covered, diff_lines_uncovered)
@@ -0,0 +1,126 @@
+"""
+A Redis buffer of JobStep heartbeats, so that recording a heartbeat doesn't
+need a write to the jobstep table.
+
+Heartbeats are kept in a hash of step id to the time of the step's latest
+heartbeat, and `flush` (run periodically) writes them to
+JobStep.last_heartbeat in one batch. Code that judges whether a step is alive
+should read its heartbeat with `get_last_heartbeat`, which also sees the
+heartbeats that haven't been flushed yet.
+
+Allocation sets JobStep.last_heartbeat too, so whether a step has had a
+heartbeat from its client since it was allocated is kept apart, see
+`mark_seen`.
+"""
+
+from __future__ import absolute_import
+
+from datetime import datetime
+from uuid import UUID
+
+from flask import current_app
+from redis.exceptions import ResponseError
+from sqlalchemy.sql import bindparam, func
+
+from changes.config import db, redis, statsreporter
+from changes.models.jobstep import JobStep
+
+HEARTBEATS_KEY = 'jobstep_heartbeats'
+FLUSHING_KEY = 'jobstep_heartbeats:flushing'
+
+DATE_FORMAT = '%Y-%m-%dT%H:%M:%S.%f'
+
+SEEN_KEY = 'jobstep_heartbeats:seen:{}'
+# Long enough to outlive nearly every step; a step that runs longer is just
+# seen for the first time again.
+SEEN_TTL = 24 * 60 * 60
+
+
+def is_enabled():
+    return current_app.config['JOBSTEP_HEARTBEAT_REDIS_ENABLED']
+
+
+def record(step, date):
+    """
+    Records a heartbeat of `step` (a JobStep) at `date`, in Redis if enabled
+    and otherwise on the step itself (to be committed by the caller).
+    """
+    if not is_enabled():
+        step.last_heartbeat = date
+        db.session.add(step)
+        return
+
+    redis.hset(HEARTBEATS_KEY, step.id.hex, date.strftime(DATE_FORMAT))
+    statsreporter.stats().incr('jobstep_heartbeats_buffered')
+
+
+def mark_seen(step):
+    """
+    Marks `step` (a JobStep) as having had a heartbeat from its client.
+    Returns whether it is the first since the step was allocated.
+    """
+    return bool(redis.set(SEEN_KEY.format(step.id.hex), '1', ex=SEEN_TTL, nx=True))
+
+
+def clear_seen(steps):
+    """
+    Forgets that `steps` (JobSteps) have had a heartbeat, so that the next
+    one of each is its first again, such as when they are allocated.
+    """
+    if steps:
+        redis.delete(*[SEEN_KEY.format(step.id.hex) for step in steps])
+
+
+def get_last_heartbeat(step):
+    """
+    Returns the time of the latest heartbeat of `step` (a JobStep), or None if
+    it has never had one.
+    """
+    last_heartbeat = step.last_heartbeat
+    if not is_enabled():
+        return last_heartbeat
+
+    pipe = redis.pipeline(transaction=False)
+    pipe.hget(HEARTBEATS_KEY, step.id.hex)
+    pipe.hget(FLUSHING_KEY, step.id.hex)
+    for value in pipe.execute():
+        if value is None:
+            continue
+        date = datetime.strptime(value, DATE_FORMAT)
+        if last_heartbeat is None or date > last_heartbeat:
+            last_heartbeat = date
+    return last_heartbeat
+
+
+def flush():
+    """
+    Writes the buffered heartbeats to the jobstep table. Returns the number
+    of steps written.
+    """
+    # Take the buffer over, unless a failed flush left one behind, in which
+    # case that is written first and the rest waits for the next flush.
+    if not redis.exists(FLUSHING_KEY):
+        try:
+            redis.rename(HEARTBEATS_KEY, FLUSHING_KEY)
+        except ResponseError:
+            # no heartbeats since the last flush
+            return 0
+
+    heartbeats = redis.hgetall(FLUSHING_KEY)
+    if heartbeats:
+        table = JobStep.__table__
+        # A heartbeat older than the row's, such as one recorded before the
+        # step was allocated again, is not written.
+        db.session.execute(table.update().where(
+            table.c.id == bindparam('_step_id'),
+        ).values(
+            last_heartbeat=func.greatest(table.c.last_heartbeat, bindparam('_last_heartbeat')),
+        ), [{
+            '_step_id': UUID(step_id),
+            '_last_heartbeat': datetime.strptime(value, DATE_FORMAT),
+        } for step_id, value in heartbeats.iteritems()])
+        db.session.commit()
+
+    redis.delete(FLUSHING_KEY)
+    statsreporter.stats().incr('jobstep_heartbeats_flushed', len(heartbeats))
+    return len(heartbeats)
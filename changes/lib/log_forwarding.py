@@ -0,0 +1,90 @@
+"""
+Helpers for forwarding a log from one service to another, so that reading
+the log and writing it overlap rather than alternate.
+"""
+
+from __future__ import absolute_import
+
+import threading
+
+from Queue import Empty, Full, Queue
+
+# How often a reader blocked on a full buffer checks whether it should stop.
+_STOP_POLL_SECS = 0.1
+
+_END = object()
+
+
+class _ReadAhead(object):
+    def __init__(self, chunks, max_buffered):
+        self.queue = Queue(maxsize=max_buffered)
+        self.stopped = threading.Event()
+        self.thread = threading.Thread(target=self._read, args=(chunks,))
+        # Reads that are blocked on the source when the consumer gives up
+        # shouldn't keep the process alive.
+        self.thread.daemon = True
+        self.thread.start()
+
+    def _put(self, item):
+        while not self.stopped.is_set():
+            try:
+                self.queue.put(item, timeout=_STOP_POLL_SECS)
+                return True
+            except Full:
+                pass
+        return False
+
+    def _read(self, chunks):
+        try:
+            for chunk in chunks:
+                if not self._put((chunk, None)):
+                    return
+        except Exception as e:
+            self._put((None, e))
+        else:
+            self._put((_END, None))
+
+    def get(self, block):
+        chunk, error = self.queue.get(block=block)
+        if error is not None:
+            raise error
+        return chunk
+
+    def stop(self):
+        self.stopped.set()
+
+
+def coalesced_read_ahead(chunks, max_size, max_buffered):
+    """
+    Reads `chunks` (an iterator of strings) on a separate thread, up to
+    `max_buffered` chunks ahead of the consumer, and yields them joined into
+    strings of at most `max_size` (or a single chunk, if that is larger).
+
+    Everything read ahead by the time the consumer asks for more is yielded
+    at once, so a consumer that is slower than the source gets fewer, larger
+    strings. Errors raised by `chunks` are raised to the consumer.
+    """
+    reader = _ReadAhead(chunks, max_buffered)
+    try:
+        pending = reader.get(block=True)
+        while pending is not _END:
+            parts = [pending]
+            size = len(pending)
+            pending = None
+            while True:
+                try:
+                    chunk = reader.get(block=False)
+                except Empty:
+                    break
+                if chunk is _END or size + len(chunk) > max_size:
+                    pending = chunk
+                    break
+                parts.append(chunk)
+                size += len(chunk)
+
+            yield ''.join(parts)
+
+            if pending is None:
+                pending = reader.get(block=True)
+    finally:
+        reader.stop()
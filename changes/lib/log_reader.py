@@ -0,0 +1,76 @@
+"""
+Reads the text of a LogSource, whether it is still stored as LogChunks or
+has been compacted into LogSegments.
+
+Offsets and sizes are in characters, as for LogChunk, and ranges are only
+read from the chunks or segments that overlap them.
+"""
+
+from __future__ import absolute_import
+
+from sqlalchemy.sql import func
+
+from changes.config import db
+from changes.models.log import LogChunk, LogSegment
+
+
+def _get_model(source):
+    if source.date_compacted is not None:
+        return LogSegment
+    return LogChunk
+
+
+def get_log_size(source):
+    """
+    Returns the length of the text of `source`.
+    """
+    model = _get_model(source)
+    size = db.session.query(
+        func.max(model.offset + model.size),
+    ).filter(
+        model.source_id == source.id,
+    ).scalar()
+    return size or 0
+
+
+def iter_log(source, offset=0, limit=None):
+    """
+    Yields the text of `source` from `offset`, up to `limit` characters in
+    total, a chunk or segment at a time.
+    """
+    model = _get_model(source)
+    queryset = db.session.query(
+        model,
+    ).filter(
+        model.source_id == source.id,
+        model.offset + model.size > offset,
+    )
+    if limit is not None:
+        end = offset + limit
+        queryset = queryset.filter(model.offset < end)
+    else:
+        end = None
+
+    # only decompress one segment at a time
+    for part in queryset.order_by(model.offset.asc()).yield_per(1 if model is LogSegment else 100):
+        text = part.text
+        start = max(offset - part.offset, 0)
+        stop = None if end is None else end - part.offset
+        if start or (stop is not None and stop < part.size):
+            text = text[start:stop]
+        yield text
+
+
+def read_log(source, offset=0, limit=None):
+    """
+    Returns the text of `source` from `offset`, up to `limit` characters.
+    """
+    return u''.join(iter_log(source, offset, limit))
+
+
+def read_log_tail(source, limit):
+    """
+    Returns the offset and text of the last `limit` characters of `source`.
+    """
+    offset = max(get_log_size(source) - limit, 0)
+    return offset, read_log(source, offset)
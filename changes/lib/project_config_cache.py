@@ -0,0 +1,116 @@
+"""
+Cache of parsed project configs.
+
+A project config is determined by the repository, the (full) revision sha,
+the config path and the diff applied on top, so it can be cached
+indefinitely under those. Configs are kept in a small in-process LRU and,
+if PROJECT_CONFIG_CACHE_REDIS_TTL is set, shared between processes via
+Redis, saving a git/hg invocation (and applying the diff) per lookup.
+"""
+
+from __future__ import absolute_import
+
+import json
+import logging
+import re
+
+from copy import deepcopy
+from hashlib import sha1
+
+from flask import current_app
+
+from changes.config import redis, statsreporter
+from changes.utils.cache import LRUCache
+
+logger = logging.getLogger('changes.project_config_cache')
+
+# Only full revision ids address a fixed revision; anything else (a branch
+# name or a short sha) could refer to something else later.
+FULL_SHA_RE = re.compile(r'^[0-9a-f]{40}$')
+
+_local_cache = None
+
+
+def _get_local_cache():
+    global _local_cache
+    if _local_cache is None:
+        _local_cache = LRUCache(max_size=current_app.config['PROJECT_CONFIG_CACHE_SIZE'])
+    return _local_cache
+
+
+def clear_local_cache():
+    if _local_cache is not None:
+        _local_cache.clear()
+
+
+def get_cache_key(repository_id, revision_sha, config_path, diff=None):
+    """
+    Returns the key to cache the config read with the given arguments
+    under, or None if it can't be cached.
+    """
+    if not current_app.config['PROJECT_CONFIG_CACHE_SIZE']:
+        return None
+    if not revision_sha or not FULL_SHA_RE.match(revision_sha):
+        return None
+    return 'project_config:{}:{}:{}:{}'.format(
+        repository_id.hex,
+        revision_sha,
+        _hash(config_path),
+        _hash(diff) if diff else '',
+    )
+
+
+def _hash(value):
+    if isinstance(value, unicode):
+        value = value.encode('utf-8')
+    return sha1(value).hexdigest()
+
+
+def get_config(key):
+    """
+    Returns a copy of the config cached under `key`, or None if there isn't
+    one.
+    """
+    stats = statsreporter.stats()
+    entry = _get_local_cache().get(key)
+    if entry is not None:
+        stats.incr('project_config_cache_local_hit')
+    elif current_app.config['PROJECT_CONFIG_CACHE_REDIS_TTL']:
+        try:
+            value = redis.get(key)
+        except Exception:
+            logger.exception('Unable to fetch project config from redis')
+            value = None
+        if value is not None:
+            entry = json.loads(value)
+            _get_local_cache()[key] = entry
+            stats.incr('project_config_cache_redis_hit')
+
+    if entry is None:
+        stats.incr('project_config_cache_miss')
+        return None
+
+    stats.incr('project_config_cache_vcs_ms_saved', entry['vcs_ms'])
+    return deepcopy(entry['config'])
+
+
+def set_config(key, config, vcs_ms):
+    """
+    Caches `config`, which took `vcs_ms` milliseconds to read from the
+    repository.
+    """
+    entry = {'config': deepcopy(config), 'vcs_ms': int(vcs_ms)}
+    _get_local_cache()[key] = entry
+
+    ttl = current_app.config['PROJECT_CONFIG_CACHE_REDIS_TTL']
+    if not ttl:
+        return
+    try:
+        encoded = json.dumps(entry)
+    except TypeError:
+        # YAML can contain values (e.g. dates) that JSON can't
+        return
+    try:
+        redis.setex(key, encoded, ttl)
+    except Exception:
+        logger.exception('Unable to store project config in redis')
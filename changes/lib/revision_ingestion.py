@@ -0,0 +1,195 @@
+"""
+Saves batches of commits read from a repository's VCS as Revisions, with a
+handful of queries per batch rather than several per commit.
+
+`sync_revisions` is what sync_repo runs over the recent commits of a
+repository, and `backfill_revisions` imports older history (as import_repo
+does) as quickly as possible.
+"""
+
+from __future__ import absolute_import
+
+from datetime import datetime
+from uuid import UUID  # NOQA
+from uuid import uuid4
+
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.sql import and_
+from typing import Dict, List  # NOQA
+
+from changes.config import db
+from changes.db.utils import get_or_create
+from changes.models.author import Author
+from changes.models.repository import Repository  # NOQA
+from changes.models.revision import Revision
+from changes.models.source import Source
+from changes.vcs.base import RevisionResult, parse_author  # NOQA
+
+
+def _get_author_ids(values):
+    # type: (List[str]) -> Dict[str, UUID]
+    """
+    Returns a dict of author string (as in RevisionResult.author) to the id
+    of its Author, creating the authors that don't exist yet.
+    """
+    parsed = {value: parse_author(value) for value in set(values)}
+    names = {email: name for name, email in parsed.itervalues()}
+
+    ids = dict(db.session.query(
+        Author.email, Author.id,
+    ).filter(
+        Author.email.in_(names),
+    ))
+
+    missing = sorted(email for email in names if email not in ids)
+    if missing:
+        rows = [{
+            'id': uuid4(),
+            'email': email,
+            'name': names[email],
+            'date_created': datetime.utcnow(),
+        } for email in missing]
+        try:
+            with db.session.begin_nested():
+                db.session.execute(Author.__table__.insert(), rows)
+        except IntegrityError:
+            # some were created concurrently
+            for email in missing:
+                author, _ = get_or_create(Author, where={
+                    'email': email,
+                }, defaults={
+                    'name': names[email],
+                })
+                ids[email] = author.id
+        else:
+            ids.update((row['email'], row['id']) for row in rows)
+
+    return {value: ids[email] for value, (_, email) in parsed.iteritems()}
+
+
+def _create_revisions(repository, commits, with_branches):
+    # type: (Repository, List[RevisionResult], bool) -> bool
+    """
+    Creates Revisions, and the Sources that represent them, for `commits`,
+    none of which should be known yet.
+
+    Returns False, having created nothing, if any of them were created
+    concurrently.
+    """
+    author_ids = _get_author_ids(
+        [c.author for c in commits] + [c.committer for c in commits])
+
+    vcs = repository.get_vcs()
+    patch_hashes = vcs.get_patch_hashes([c.id for c in commits]) if vcs else {}
+
+    now = datetime.utcnow()
+    revision_rows = [{
+        'repository_id': repository.id,
+        'sha': c.id,
+        'author_id': author_ids[c.author],
+        'committer_id': author_ids[c.committer],
+        'message': c.message,
+        'patch_hash': patch_hashes.get(c.id),
+        'parents': c.parents,
+        'branches': c.branches if with_branches else None,
+        'date_created': c.author_date,
+        'date_committed': c.committer_date,
+    } for c in commits]
+    source_rows = [{
+        'id': uuid4(),
+        'repository_id': repository.id,
+        'revision_sha': c.id,
+        'date_created': now,
+    } for c in commits]
+
+    try:
+        with db.session.begin_nested():
+            db.session.execute(Revision.__table__.insert(), revision_rows)
+            db.session.execute(Source.__table__.insert(), source_rows)
+    except IntegrityError:
+        return False
+    return True
+
+
+def _get_known_revisions(repository, commits):
+    # type: (Repository, List[RevisionResult]) -> Dict[str, datetime]
+    """
+    Returns a dict of sha to date_created_signal for those of `commits` that
+    are already known.
+    """
+    return dict(db.session.query(
+        Revision.sha, Revision.date_created_signal,
+    ).filter(
+        Revision.repository_id == repository.id,
+        Revision.sha.in_([c.id for c in commits]),
+    ))
+
+
+def sync_revisions(repository, commits):
+    # type: (Repository, List[RevisionResult]) -> List[str]
+    """
+    Saves `commits` (RevisionResults, newest first), and returns the shas of
+    those that revision.created should now be fired for, in the same order.
+
+    The returned revisions are marked as signalled without committing, so the
+    caller should fire the signals and then commit.
+
+    Revisions that are already known are only saved again (to pick up their
+    branches) while they are still waiting for their signal.
+    """
+    if not commits:
+        return []
+
+    known = _get_known_revisions(repository, commits)
+    pending = [c for c in commits if known.get(c.id) is None]
+
+    new = [c for c in pending if c.id not in known]
+    if new and not _create_revisions(repository, new, with_branches=True):
+        for commit in new:
+            commit.save(repository)
+    for commit in pending:
+        if commit.id in known:
+            commit.save(repository)
+    db.session.commit()
+
+    # The `branches` check is a hack right now to prevent builds from
+    # triggering on branchless commits.
+    to_signal = [c.id for c in pending if c.branches]
+    if not to_signal:
+        return []
+
+    # Claim the signals in one statement, so concurrent syncs never fire
+    # the same one.
+    table = Revision.__table__
+    claimed = set(sha for sha, in db.session.execute(table.update().where(and_(
+        table.c.repository_id == repository.id,
+        table.c.sha.in_(to_signal),
+        table.c.date_created_signal.is_(None),
+    )).values(
+        date_created_signal=datetime.utcnow(),
+    ).returning(table.c.sha)))
+
+    return [sha for sha in to_signal if sha in claimed]
+
+
+def backfill_revisions(repository, commits):
+    # type: (Repository, List[RevisionResult]) -> int
+    """
+    Saves those of `commits` that aren't known yet, and returns how many
+    that was.
+
+    Finding the branches of a commit is the most expensive part of saving it,
+    and only recent commits need them (to decide whether to build them), so
+    backfilled revisions are saved without branches. sync_repo fills them in
+    for the revisions it sees that haven't been signalled yet.
+    """
+    if not commits:
+        return 0
+
+    known = _get_known_revisions(repository, commits)
+    new = [c for c in commits if c.id not in known]
+    if new and not _create_revisions(repository, new, with_branches=False):
+        for commit in new:
+            commit.save(repository)
+    db.session.commit()
+    return len(new)
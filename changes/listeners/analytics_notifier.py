@@ -19,10 +19,11 @@ from typing import Any, Dict, List, Tuple, Union  # NOQA
 
 from changes.config import db, statsreporter
 from changes.constants import Result
+from changes.lib import log_reader
 from changes.models.build import Build
 from changes.models.job import Job
 from changes.models.jobstep import JobStep
-from changes.models.log import LogChunk, LogSource
+from changes.models.log import LogSource
 from changes.models.failurereason import FailureReason
 from changes.models.itemstat import ItemStat
 from changes.experimental import categorize
@@ -280,10 +281,7 @@ def _get_failing_log_sources(job):
 
 
 def _get_log_data(source):
-    queryset = LogChunk.query.filter(
-        LogChunk.source_id == source.id,
-    ).order_by(LogChunk.offset.asc())
-    return ''.join(l.text for l in queryset)
+    return log_reader.read_log(source)
 
 
 def _get_rules():
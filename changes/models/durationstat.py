@@ -0,0 +1,137 @@
+from __future__ import absolute_import
+
+from datetime import datetime
+from enum import Enum
+from hashlib import md5
+
+from flask import current_app
+from sqlalchemy import Column, DateTime, Float, ForeignKey, Integer, String, Text
+from sqlalchemy.sql import and_, delete, exists, func, insert, literal, select, update
+
+from changes.config import db
+from changes.db.types.enum import Enum as EnumType
+from changes.db.types.guid import GUID
+from changes.models.project import Project
+
+
+class DurationStatType(Enum):
+    test = 1
+    target = 2
+
+
+class DurationStat(db.Model):
+    """
+    Running statistics of how long each test (or bazel target) of a project
+    takes, used to balance shards.
+
+    The mean and variance are exponentially weighted, with each new sample
+    given a weight of DURATION_STATS_ALPHA, so that they follow changes to a
+    test without being thrown off by a single slow run. They are updated from
+    each finished job of a commit build, see `record_durations`, and the
+    stats of what hasn't run in a while are dropped, see `prune_durations`.
+    """
+    __tablename__ = 'durationstat'
+
+    project_id = Column(GUID, ForeignKey('project.id', ondelete="CASCADE"), primary_key=True)
+    type = Column(EnumType(DurationStatType), primary_key=True)
+    # md5 of the name, as names can be longer than an index entry allows
+    name_md5 = Column(String(32), primary_key=True)
+    name = Column(Text, nullable=False)
+    mean = Column(Float, nullable=False)
+    variance = Column(Float, nullable=False, default=0)
+    sample_count = Column(Integer, nullable=False, default=1)
+    date_modified = Column(DateTime, nullable=False, default=datetime.utcnow)
+
+    def __init__(self, **kwargs):
+        super(DurationStat, self).__init__(**kwargs)
+        if self.name_md5 is None and self.name is not None:
+            self.name_md5 = md5(self.name.encode('utf-8')).hexdigest()
+        if self.variance is None:
+            self.variance = 0
+        if self.sample_count is None:
+            self.sample_count = 1
+        if self.date_modified is None:
+            self.date_modified = datetime.utcnow()
+
+
+def record_durations(project_id, stat_type, durations):
+    """Add a sample to the duration stats of each test (or target).
+
+    Args:
+        project_id (UUID): The project the durations were measured in.
+        stat_type (DurationStatType): What the durations are of.
+        durations (Select): A query of (name, duration) rows, with a row
+            for each name at most once.
+
+    The update happens entirely in the database, but concurrent calls for
+    the same project should be serialized by the caller.
+    """
+    alpha = current_app.config['DURATION_STATS_ALPHA']
+    table = DurationStat.__table__
+    samples = durations.alias('samples')
+    now = datetime.utcnow()
+
+    matches_sample = and_(
+        table.c.project_id == project_id,
+        table.c.type == stat_type,
+        table.c.name_md5 == func.md5(samples.c.name),
+    )
+
+    # the incremental form of an exponentially weighted mean and variance
+    delta = samples.c.duration - table.c.mean
+    db.session.execute(update(table).values(
+        mean=table.c.mean + alpha * delta,
+        variance=(1 - alpha) * (table.c.variance + alpha * delta * delta),
+        sample_count=table.c.sample_count + 1,
+        date_modified=now,
+    ).where(matches_sample))
+
+    db.session.execute(insert(table).from_select(
+        ['project_id', 'type', 'name_md5', 'name', 'mean', 'variance', 'sample_count', 'date_modified'],
+        select([
+            literal(project_id, type_=table.c.project_id.type),
+            literal(stat_type, type_=table.c.type.type),
+            func.md5(samples.c.name),
+            samples.c.name,
+            samples.c.duration,
+            literal(0.0),
+            literal(1),
+            literal(now),
+        ]).where(~exists().where(matches_sample)),
+    ))
+
+
+def prune_durations(project_id, stat_type, max_age):
+    """Remove the duration stats of tests (or targets) that haven't had a
+    sample in `max_age` (a timedelta), so that ones which were removed or
+    renamed stop counting towards the durations of shards.
+
+    Returns the number of stats removed.
+    """
+    table = DurationStat.__table__
+    result = db.session.execute(delete(table).where(and_(
+        table.c.project_id == project_id,
+        table.c.type == stat_type,
+        table.c.date_modified < datetime.utcnow() - max_age,
+    )))
+    return result.rowcount
+
+
+def get_duration_stats(project_slug, stat_type):
+    """Fetch the duration stats of the tests (or targets) of a project.
+
+    Returns:
+        Dict[str, Tuple[float, float]]: The mean and variance of the
+            duration of each name, in ms and ms^2.
+    """
+    return {
+        name: (mean, variance)
+        for name, mean, variance in db.session.query(
+            DurationStat.name, DurationStat.mean, DurationStat.variance,
+        ).join(
+            Project, Project.id == DurationStat.project_id,
+        ).filter(
+            Project.slug == project_slug,
+            DurationStat.type == stat_type,
+        )
+    }
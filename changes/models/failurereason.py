@@ -3,11 +3,13 @@ from __future__ import absolute_import, division
 from uuid import uuid4
 
 from datetime import datetime
-from sqlalchemy import Column, DateTime, ForeignKey, String
+from sqlalchemy import Column, DateTime, ForeignKey, String, event
 from sqlalchemy.orm import relationship
+from sqlalchemy.sql import and_
 from sqlalchemy.schema import Index, UniqueConstraint
 
 from changes.config import db
+from changes.constants import Status
 from changes.db.types.guid import GUID
 from changes.db.types.json import JSONEncodedDict
 
@@ -45,3 +47,19 @@ class FailureReason(db.Model):
         super(FailureReason, self).__init__(**kwargs)
         if self.id is None:
             self.id = uuid4()
+
+
+@event.listens_for(FailureReason, 'after_insert')
+def touch_finished_items(mapper, connection, target):
+    """
+    Bumps date_modified of the build and job of a new FailureReason if they
+    have already finished, as their serialized form (which includes their
+    failures) is cached by it.
+    """
+    now = datetime.utcnow()
+    for table_name, item_id in (('build', target.build_id), ('job', target.job_id)):
+        table = db.metadata.tables[table_name]
+        connection.execute(table.update().where(and_(
+            table.c.id == item_id,
+            table.c.status == Status.finished,
+        )).values(date_modified=now))
@@ -1,11 +1,12 @@
 from uuid import uuid4
 
 from sqlalchemy import Column, String, Integer
+from sqlalchemy.exc import IntegrityError
 from sqlalchemy.schema import UniqueConstraint
 
 from changes.config import db
 from changes.db.types.guid import GUID
-from changes.db.utils import model_repr
+from changes.db.utils import model_repr, try_create
 
 
 class ItemStat(db.Model):
@@ -30,3 +31,62 @@ class ItemStat(db.Model):
         super(ItemStat, self).__init__(**kwargs)
         if self.id is None:
             self.id = uuid4()
+
+
+def create_item_stats(item_id, values):
+    """Create each of `values` (a dict of stat name to value) as a stat of an
+    item, unless the item already has a stat of that name.
+
+    The stats are inserted with a single multi-row INSERT; only if another
+    writer creates one of them concurrently are they retried one at a time.
+
+    Returns the set of names of the stats that were created.
+    """
+    existing = set(name for name, in db.session.query(ItemStat.name).filter(
+        ItemStat.item_id == item_id,
+        ItemStat.name.in_(values.keys()),
+    )) if values else set()
+    row_list = [
+        {'id': uuid4(), 'item_id': item_id, 'name': name, 'value': value}
+        for name, value in sorted(values.iteritems())
+        if name not in existing
+    ]
+    if not row_list:
+        return set()
+
+    try:
+        with db.session.begin_nested():
+            db.session.execute(ItemStat.__table__.insert().values(row_list))
+        return set(row['name'] for row in row_list)
+    except IntegrityError:
+        pass
+
+    return set(
+        row['name'] for row in row_list
+        if try_create(ItemStat, where=row) is not None
+    )
+
+
+def increment_item_stats(item_id, deltas):
+    """Add each of `deltas` (a dict of stat name to delta) to the stats of an
+    item, creating the stats that don't exist yet.
+
+    The increments happen in the database, so concurrent writers for the same
+    item don't lose each other's updates.
+    """
+    def increment(name, delta):
+        query = ItemStat.query.filter_by(item_id=item_id, name=name)
+        return query.update({ItemStat.value: ItemStat.value + delta},
+                            synchronize_session='evaluate')
+
+    # Update in a consistent order so concurrent writers lock rows in the same order.
+    missing = {}
+    for name, delta in sorted(deltas.iteritems()):
+        if not increment(name, delta):
+            missing[name] = delta
+
+    created = create_item_stats(item_id, missing)
+    for name, delta in sorted(missing.iteritems()):
+        if name not in created:
+            # Created concurrently since we tried to update it.
+            increment(name, delta)
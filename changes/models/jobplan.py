@@ -13,11 +13,12 @@ from sqlalchemy import Column, DateTime, ForeignKey
 from sqlalchemy.orm import relationship
 from sqlalchemy.schema import Index
 
-from changes.config import db
+from changes.config import db, statsreporter
 from changes.db.types.guid import GUID
 from changes.db.types.json import JSONEncodedDict
 from changes.db.utils import model_repr
 from changes.utils.bazel_setup import collect_bazel_targets, extra_setup_cmd, get_bazel_setup, sync_encap_pkgs
+from changes.utils.cache import LRUCache
 from changes.utils.imports import import_string
 
 
@@ -177,8 +178,27 @@ class JobPlan(db.Model):
     # the model file)
     @classmethod
     def get_build_step_for_job(cls, job_id):
-        from changes.models.project import ProjectConfigError
-        from changes.buildsteps.lxc import LXCBuildStep
+        """
+        Returns the jobplan for the given job and its BuildStep (or None if it
+        couldn't be loaded).
+
+        How to load the BuildStep is remembered per job for the life of the
+        process, as jobplans don't change once created. In particular the
+        BuildStep for an autogenerated plan, which involves reading the
+        project config from the repository, is only built once. Failures to
+        load it aren't remembered, as they may be transient (e.g. the
+        repository couldn't be read).
+        """
+        cached = _build_step_cache.get(job_id)
+        if cached is not None:
+            jobplan_id, load_build_step = cached
+            jobplan = cls.query.get(jobplan_id)
+            if jobplan is not None:
+                statsreporter.stats().incr('jobplan_build_step_cache_hit')
+                return jobplan, load_build_step()
+            _build_step_cache.pop(job_id)
+
+        statsreporter.stats().incr('jobplan_build_step_cache_miss')
 
         jobplan = cls.query.filter(
             cls.job_id == job_id,
@@ -186,18 +206,41 @@ class JobPlan(db.Model):
         if jobplan is None:
             return None, None
 
-        if jobplan.plan.autogenerated():
-            job = jobplan.job
+        load_build_step = jobplan._get_build_step_loader()
+        if load_build_step is not _no_build_step:
+            _build_step_cache[job_id] = (jobplan.id, load_build_step)
+        return jobplan, load_build_step()
+
+    @classmethod
+    def invalidate_build_step_cache(cls, job_id=None):
+        """
+        Forgets the BuildStep for the given job (or for every job), for
+        when a jobplan is rewritten or removed.
+        """
+        if job_id is None:
+            _build_step_cache.clear()
+        else:
+            _build_step_cache.pop(job_id)
+
+    def _get_build_step_loader(self):
+        """
+        Returns a function which returns the BuildStep for this jobplan.
+        """
+        from changes.models.project import ProjectConfigError
+        from changes.buildsteps.lxc import LXCBuildStep
+
+        if self.plan.autogenerated():
+            job = self.job
             try:
                 diff = job.source.patch.diff if job.source.patch else None
                 project_config = job.project.get_config(job.source.revision_sha, diff=diff)
             except ProjectConfigError:
                 logging.error('Project config for project %s is not in a valid format.', job.project.slug, exc_info=True)
-                return jobplan, None
+                return _no_build_step
 
             if 'bazel.targets' not in project_config:
                 logging.error('Project config for project %s is missing `bazel.targets`. job: %s, revision_sha: %s, config: %s', job.project.slug, job.id, job.source.revision_sha, str(project_config), exc_info=True)
-                return jobplan, None
+                return _no_build_step
 
             bazel_exclude_tags = project_config['bazel.exclude-tags']
             bazel_cpus = project_config['bazel.cpus']
@@ -207,7 +250,7 @@ class JobPlan(db.Model):
                             job.project.slug,
                             bazel_cpus,
                             current_app.config['MAX_CPUS_PER_EXECUTOR']))
-                return jobplan, None
+                return _no_build_step
 
             bazel_memory = project_config['bazel.mem']
             if bazel_memory < current_app.config['MIN_MEM_MB_PER_EXECUTOR'] or \
@@ -217,18 +260,18 @@ class JobPlan(db.Model):
                             current_app.config['MIN_MEM_MB_PER_EXECUTOR'],
                             bazel_memory,
                             current_app.config['MAX_MEM_MB_PER_EXECUTOR']))
-                return jobplan, None
+                return _no_build_step
 
             if bazel_max_executors < 1 or bazel_max_executors > current_app.config['MAX_EXECUTORS']:
                 logging.error('Project config for project %s requests invalid number of executors: constraint 1 <= %d <= %d', job.project.slug, bazel_max_executors, current_app.config['MAX_EXECUTORS'])
-                return jobplan, None
+                return _no_build_step
 
             additional_test_flags = project_config['bazel.additional-test-flags']
             for f in additional_test_flags:
                 patterns = current_app.config['BAZEL_ADDITIONAL_TEST_FLAGS_WHITELIST_REGEX']
                 if not any([re.match(p, f) for p in patterns]):
                     logging.error('Project config for project %s contains invalid additional-test-flags %s. Allowed patterns are %s.', job.project.slug, f, patterns)
-                    return jobplan, None
+                    return _no_build_step
             bazel_test_flags = current_app.config['BAZEL_MANDATORY_TEST_FLAGS'] + additional_test_flags
             bazel_test_flags = list(OrderedDict([(b, None) for b in bazel_test_flags]))  # ensure uniqueness, preserve order
 
@@ -273,12 +316,20 @@ class JobPlan(db.Model):
                 max_executors=bazel_max_executors,
                 debug_config=bazel_debug_config,
             )
-            return jobplan, implementation
+            return lambda: implementation
 
-        steps = jobplan.get_steps()
+        steps = self.get_steps()
         try:
             step = steps[0]
         except IndexError:
-            return jobplan, None
+            return _no_build_step
+
+        return step.get_implementation
+
+
+def _no_build_step():
+    return None
+
 
-        return jobplan, step.get_implementation()
+# job id -> (jobplan id, function returning the BuildStep)
+_build_step_cache = LRUCache(max_size=5000)
@@ -1,7 +1,8 @@
 import uuid
+import zlib
 
 from datetime import datetime
-from sqlalchemy import Boolean, Column, DateTime, ForeignKey, String, Text, Integer
+from sqlalchemy import Boolean, Column, DateTime, ForeignKey, Integer, LargeBinary, String, Text
 from sqlalchemy.orm import backref, relationship
 from sqlalchemy.schema import Index, UniqueConstraint
 
@@ -12,6 +13,9 @@ from changes.db.types.guid import GUID
 # and final chunks can certainly be smaller.
 LOG_CHUNK_SIZE = 4096 * 2
 
+# The (uncompressed) size of the segments logs are compacted into.
+LOG_SEGMENT_SIZE = 1024 * 1024
+
 
 class LogSource(db.Model):
     """
@@ -20,6 +24,9 @@ class LogSource(db.Model):
 
     If we're using artifact store to store/host the log file, in_artifact_store will be set to true.
     No logchunk entries will be associated with such logsources.
+
+    Once a log is complete its logchunks are compacted into logsegments, and
+    date_compacted is set. Use changes.lib.log_reader to read either.
     """
     __tablename__ = 'logsource'
     __table_args__ = (
@@ -36,6 +43,7 @@ class LogSource(db.Model):
     name = Column(String(64), nullable=False)
     date_created = Column(DateTime, default=datetime.utcnow)
     in_artifact_store = Column(Boolean, default=False)
+    date_compacted = Column(DateTime)
 
     job = relationship('Job')
     project = relationship('Project')
@@ -107,3 +115,42 @@ class LogChunk(db.Model):
             self.id = uuid.uuid4()
         if self.date_created is None:
             self.date_created = datetime.utcnow()
+
+
+class LogSegment(db.Model):
+    """
+    A compressed run of text from a compacted log. The segments of a
+    logsource cover its text without gaps, in the same offsets as the
+    logchunks they replaced, so their offsets and sizes are an index into
+    the log: reading any range only needs the segments overlapping it.
+    """
+    __tablename__ = 'logsegment'
+    __table_args__ = (
+        UniqueConstraint('source_id', 'offset', name='unq_logsegment_source_offset'),
+    )
+
+    id = Column(GUID, primary_key=True, default=uuid.uuid4)
+    source_id = Column(GUID, ForeignKey('logsource.id', ondelete="CASCADE"), nullable=False)
+    offset = Column(Integer, nullable=False)
+    # size is the length of the (decompressed) text
+    size = Column(Integer, nullable=False)
+    # zlib compressed, utf-8 encoded text
+    data = Column(LargeBinary, nullable=False)
+    date_created = Column(DateTime, default=datetime.utcnow)
+
+    source = relationship('LogSource')
+
+    def __init__(self, **kwargs):
+        text = kwargs.pop('text', None)
+        super(LogSegment, self).__init__(**kwargs)
+        if self.id is None:
+            self.id = uuid.uuid4()
+        if self.date_created is None:
+            self.date_created = datetime.utcnow()
+        if text is not None:
+            self.data = zlib.compress(text.encode('utf-8'))
+            self.size = len(text)
+
+    @property
+    def text(self):
+        return zlib.decompress(self.data).decode('utf-8')
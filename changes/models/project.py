@@ -1,5 +1,6 @@
 import yaml
 import logging
+import time
 
 from datetime import datetime
 from uuid import uuid4
@@ -107,12 +108,19 @@ class Project(db.Model):
         # changes.vcs.base imports some models, which may lead to circular
         # imports, so let's import on-demand
         from changes.vcs.base import CommandError, ContentReadError, MissingFileError, ConcurrentUpdateError, UnknownRevision
+        from changes.lib import project_config_cache
         if config_path is None:
             config_path = self.get_config_path()
         vcs = self.repository.get_vcs()
         if vcs is None:
             raise NotImplementedError
-        else:
+
+        cache_key = project_config_cache.get_cache_key(self.repository_id, revision_sha, config_path, diff=diff)
+        config = project_config_cache.get_config(cache_key) if cache_key else None
+        if config is None:
+            start_time = time.time()
+            # whether the content we read depends only on the cache key
+            cacheable = True
             try:
                 # repo might not be updated on this machine yet
                 try:
@@ -129,11 +137,13 @@ class Project(db.Model):
             except CommandError as err:
                 logging.warning('Git invocation failed for project %s: %s', self.slug, str(err), exc_info=True)
                 config_content = '{}'
+                cacheable = False
             except MissingFileError:
                 config_content = '{}'
             except ContentReadError as err:
                 logging.warning('Config for project %s cannot be read: %s', self.slug, str(err), exc_info=True)
                 config_content = '{}'
+            vcs_ms = (time.time() - start_time) * 1000
             try:
                 config = yaml.safe_load(config_content)
                 if not isinstance(config, dict):
@@ -147,6 +157,8 @@ class Project(db.Model):
             except yaml.YAMLError:
                 raise ProjectConfigError(
                     'Invalid project config file {}'.format(config_path))
+            if cache_key and cacheable:
+                project_config_cache.set_config(cache_key, config, vcs_ms)
         for k, v in self._default_config.iteritems():
             config.setdefault(k, v)
         return config
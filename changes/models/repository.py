@@ -87,6 +87,7 @@ class Repository(db.Model):
             'path': os.path.join(os.path.expanduser(current_app.config['REPO_ROOT']), self.id.hex),
             'url': self.url,
             'username': options.get('auth.username'),
+            'command_server': current_app.config['VCS_COMMAND_SERVER_ENABLED'],
         }
 
         if self.backend == RepositoryBackend.git:
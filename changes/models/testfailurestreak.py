@@ -0,0 +1,214 @@
+from __future__ import absolute_import
+
+from datetime import datetime
+
+from sqlalchemy import Column, DateTime, ForeignKey, Integer, String
+from sqlalchemy.orm import relationship
+from sqlalchemy.sql import and_, case, exists, insert, literal, select, update
+
+from changes.config import db
+from changes.db.types.guid import GUID
+from changes.db.utils import create_or_update, try_create
+from changes.models.build import Build
+from changes.models.option import ItemOption
+
+# The ItemOption of a project holding the date of the oldest commit build its
+# failure streaks were computed from; streaks know nothing of older builds.
+STREAKS_SINCE_OPTION = 'failure_streaks.since'
+
+# The ItemOption of a project holding the date of the newest commit build its
+# failure streaks were computed from; older builds recorded since are late.
+STREAKS_UNTIL_OPTION = 'failure_streaks.until'
+
+_DATE_FORMAT = '%Y-%m-%d %H:%M:%S.%f'
+
+
+class TestFailureStreak(db.Model):
+    """
+    The current run of consecutive commit builds of a project that a test
+    has failed in, used to find where a failure originated without scanning
+    previous builds.
+
+    Streaks are updated from each finished commit build of the project, see
+    `record_build_failures`. A streak ends (and its length goes back to 0)
+    with the first build the test doesn't fail in, which is then its last
+    pass. A streak with no first build (e.g. as a build older than it turned
+    out to pass the test) is failing since a build that isn't known.
+    """
+    __tablename__ = 'testfailurestreak'
+
+    project_id = Column(GUID, ForeignKey('project.id', ondelete="CASCADE"), primary_key=True)
+    name_sha = Column(String(40), primary_key=True)
+    # the first build of the current streak, if the test is failing and it's known
+    first_build_id = Column(GUID, ForeignKey('build.id', ondelete="SET NULL"), nullable=True)
+    streak_length = Column(Integer, nullable=False, default=0)
+    last_pass_build_id = Column(GUID, ForeignKey('build.id', ondelete="SET NULL"), nullable=True)
+    # date_created of the last build that changed the streak
+    last_build_date = Column(DateTime, nullable=False)
+
+    first_build = relationship('Build', foreign_keys=[first_build_id])
+    last_pass_build = relationship('Build', foreign_keys=[last_pass_build_id])
+
+    def __init__(self, **kwargs):
+        super(TestFailureStreak, self).__init__(**kwargs)
+        if self.streak_length is None:
+            self.streak_length = 0
+
+
+def get_streaks_since(project_id):
+    """
+    Returns the date of the oldest commit build the failure streaks of the
+    project cover, or None if they haven't been computed.
+    """
+    return _get_date_option(project_id, STREAKS_SINCE_OPTION)
+
+
+def _get_date_option(project_id, name):
+    value = db.session.query(ItemOption.value).filter(
+        ItemOption.item_id == project_id,
+        ItemOption.name == name,
+    ).scalar()
+    if value is None:
+        return None
+    return datetime.strptime(value, _DATE_FORMAT)
+
+
+def clear_streaks(project_id):
+    """Removes the failure streaks of a project, so they can be recomputed."""
+    TestFailureStreak.query.filter(
+        TestFailureStreak.project_id == project_id,
+    ).delete(synchronize_session=False)
+    ItemOption.query.filter(
+        ItemOption.item_id == project_id,
+        ItemOption.name.in_([STREAKS_SINCE_OPTION, STREAKS_UNTIL_OPTION]),
+    ).delete(synchronize_session=False)
+
+
+def record_build_failures(build, failures):
+    """Advance the failure streaks of a project by one of its commit builds.
+
+    Args:
+        build (Build): The finished commit build.
+        failures (Select): A query of (name_sha,) rows of the tests that
+            failed in the build, with a row for each test at most once.
+
+    Builds should be recorded in the order they were created, but builds
+    that finish late can't always be. A build older than the newest one
+    recorded only fixes up the current streaks it falls within, see
+    `_record_late_build`.
+
+    The update happens entirely in the database, but concurrent calls for
+    the same project should be serialized by the caller.
+    """
+    project_id = build.project_id
+    table = TestFailureStreak.__table__
+    failing = failures.alias('failing')
+
+    until = _get_date_option(project_id, STREAKS_UNTIL_OPTION)
+    if until is not None and build.date_created <= until:
+        _record_late_build(build, failing)
+        return
+
+    date_value = build.date_created.strftime(_DATE_FORMAT)
+    try_create(ItemOption, where={
+        'item_id': project_id,
+        'name': STREAKS_SINCE_OPTION,
+        'value': date_value,
+    })
+    create_or_update(ItemOption, where={
+        'item_id': project_id,
+        'name': STREAKS_UNTIL_OPTION,
+    }, values={
+        'value': date_value,
+    })
+
+    in_project = table.c.project_id == project_id
+    is_failing = table.c.name_sha.in_(select([failing.c.name_sha]))
+
+    # streaks that end with this build
+    db.session.execute(update(table).values(
+        first_build_id=None,
+        streak_length=0,
+        last_pass_build_id=build.id,
+        last_build_date=build.date_created,
+    ).where(and_(
+        in_project,
+        table.c.streak_length > 0,
+        ~is_failing,
+    )))
+
+    # streaks that continue or start again with this build
+    db.session.execute(update(table).values(
+        first_build_id=case(
+            [(table.c.streak_length > 0, table.c.first_build_id)],
+            else_=build.id,
+        ),
+        streak_length=table.c.streak_length + 1,
+        last_build_date=build.date_created,
+    ).where(and_(
+        in_project,
+        is_failing,
+    )))
+
+    # tests failing for the first time
+    db.session.execute(insert(table).from_select(
+        ['project_id', 'name_sha', 'first_build_id', 'streak_length', 'last_build_date'],
+        select([
+            literal(project_id, type_=table.c.project_id.type),
+            failing.c.name_sha,
+            literal(build.id, type_=table.c.first_build_id.type),
+            literal(1),
+            literal(build.date_created),
+        ]).where(~exists().where(and_(
+            table.c.project_id == project_id,
+            table.c.name_sha == failing.c.name_sha,
+        ))),
+    ))
+
+
+def _record_late_build(build, failing):
+    """
+    Records a build older than the newest one the streaks were computed from.
+
+    Only the current streaks of tests can be fixed up: a streak which the
+    build failed right before (with no pass in between) starts with it
+    instead, and a streak which the build passed in the middle of starts
+    with a build that isn't known. What happened before the current streaks
+    isn't kept, so it can't be changed.
+    """
+    table = TestFailureStreak.__table__
+    first_build = Build.__table__.alias('first_build')
+    last_pass_build = Build.__table__.alias('last_pass_build')
+    current = and_(
+        table.c.project_id == build.project_id,
+        table.c.streak_length > 0,
+    )
+    is_failing = table.c.name_sha.in_(select([failing.c.name_sha]))
+
+    db.session.execute(update(table).values(
+        first_build_id=build.id,
+        streak_length=table.c.streak_length + 1,
+    ).where(and_(
+        current,
+        is_failing,
+        exists().where(and_(
+            first_build.c.id == table.c.first_build_id,
+            first_build.c.date_created > build.date_created,
+        )),
+        ~exists().where(and_(
+            last_pass_build.c.id == table.c.last_pass_build_id,
+            last_pass_build.c.date_created >= build.date_created,
+        )),
+    )))
+
+    db.session.execute(update(table).values(
+        first_build_id=None,
+        last_pass_build_id=build.id,
+    ).where(and_(
+        current,
+        ~is_failing,
+        exists().where(and_(
+            first_build.c.id == table.c.first_build_id,
+            first_build.c.date_created < build.date_created,
+        )),
+    )))
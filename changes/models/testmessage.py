@@ -1,5 +1,7 @@
 import uuid
 
+from collections import defaultdict
+
 from sqlalchemy import Column, ForeignKey, Integer, Text
 from sqlalchemy.orm import relationship
 from sqlalchemy.schema import Index
@@ -7,6 +9,15 @@ from sqlalchemy.schema import Index
 from changes.config import db
 from changes.db.types.guid import GUID
 
+# Messages of the same artifact that are at most this many bytes apart are
+# read together, as reading the bytes between them is cheaper than another
+# request.
+MAX_RANGE_GAP = 64 * 1024
+
+# The most bytes to read from an artifact at once when reading messages
+# together.
+MAX_RANGE_READ = 4 * 1024 * 1024
+
 
 class TestMessage(db.Model):
     """
@@ -38,3 +49,53 @@ class TestMessage(db.Model):
 
     def get_message(self):
         return self.artifact.file.get_file(self.start_offset, self.length).read()
+
+
+def _group_by_range(messages):
+    """
+    Groups `messages` (of one artifact, sorted by start_offset) into runs
+    that can be read together, yielding (start, end, messages) for each.
+    """
+    group = []
+    start = end = 0
+    for message in messages:
+        message_end = message.start_offset + message.length
+        if group and message.start_offset <= end + MAX_RANGE_GAP \
+                and max(end, message_end) - start <= MAX_RANGE_READ:
+            group.append(message)
+            end = max(end, message_end)
+            continue
+        if group:
+            yield start, end, group
+        group = [message]
+        start, end = message.start_offset, message_end
+    if group:
+        yield start, end, group
+
+
+def get_messages(messages):
+    """
+    Returns a dict of id to body for each of `messages` (TestMessages), with
+    as few reads from their artifacts as possible.
+
+    Messages are grouped by artifact, and messages that are close together
+    in their artifact are read with a single ranged read and sliced out of
+    it.
+    """
+    bodies = {}
+    by_artifact = defaultdict(list)
+    for message in messages:
+        if message.length:
+            by_artifact[message.artifact_id].append(message)
+        else:
+            bodies[message.id] = ''
+
+    for artifact_messages in by_artifact.itervalues():
+        artifact_messages.sort(key=lambda m: (m.start_offset, m.length))
+        artifact_file = artifact_messages[0].artifact.file
+        for start, end, group in _group_by_range(artifact_messages):
+            data = artifact_file.get_file(start, end - start).read()
+            for message in group:
+                offset = message.start_offset - start
+                bodies[message.id] = data[offset:offset + message.length]
+    return bodies
@@ -4,24 +4,46 @@ import hashlib
 import logging
 import random as insecure_random
 import re
+import uuid
 
+from collections import Counter, defaultdict
 from datetime import datetime
+from operator import add
 from flask import current_app
 from sqlalchemy.exc import IntegrityError
-from sqlalchemy.sql import func
+from sqlalchemy.sql import case, func
 
-from changes.config import db
+from changes.config import db, statsreporter
 from changes.constants import Result
 from changes.db.utils import create_or_update
 from changes.lib.artifact_store_lib import ArtifactStoreClient
 from changes.models.failurereason import FailureReason
-from changes.models.itemstat import ItemStat
+from changes.models.itemstat import ItemStat, increment_item_stats
 from changes.models.test import TestCase
 from changes.models.testartifact import TestArtifact
 from changes.models.testmessage import TestMessage
+from changes.utils.agg import aggregate_result, safe_agg
 
 logger = logging.getLogger('changes.testresult')
 
+# Number of rows written per multi-row INSERT when saving test results. Keeps
+# the statement well below Postgres' limit on bind parameters.
+TESTCASE_INSERT_CHUNK_SIZE = 1000
+
+# The per-step ItemStats maintained as test results are saved.
+TEST_STAT_NAMES = ('test_count', 'test_failures', 'test_duration', 'test_rerun_count')
+
+
+def get_result_stat_name(result):
+    """Returns the name of the ItemStat counting the tests with `result`."""
+    return 'test_result_{}'.format(result.name)
+
+
+# The per-step ItemStats counting tests by result, also maintained as test
+# results are saved. Unlike TEST_STAT_NAMES, only the results that tests
+# have had are stored.
+TEST_RESULT_STAT_NAMES = tuple(get_result_stat_name(result) for result in Result)
+
 
 class TestResult(object):
     """
@@ -104,8 +126,9 @@ class TestResultManager(object):
         job = step.job
         project = job.project
 
-        # Create all test cases.
-        testcase_list = []
+        # Build the rows for all test cases up front so they can be written
+        # with multi-row INSERTs instead of one ORM flush per object.
+        row_list = []
 
         # For tracking the name of any test we see with a bad
         # duration, typically the first one if we see multiple.
@@ -114,8 +137,7 @@ class TestResultManager(object):
 
         for test in test_list:
             duration = test.duration
-            # Maximum value for the Integer column type
-            if duration is not None and (duration > 2147483647 or duration < 0):
+            if not _is_valid_duration(duration):
                 # If it is very large (>~25 days) or negative set it to 0
                 # since it is almost certainly wrong, and keeping it or truncating
                 # to max will give misleading total values.
@@ -123,62 +145,93 @@ class TestResultManager(object):
                     bad_duration_test_name = test.name
                     bad_duration_value = duration
                 duration = 0
-            testcase = TestCase(
-                job=job,
-                step=step,
-                name_sha=test.name_sha,
-                project=project,
-                name=test.name,
-                duration=duration,
-                message=test.message,
-                result=test.result,
-                date_created=test.date_created,
-                reruns=test.reruns,
-                owner=test.owner,
-            )
-            testcase_list.append(testcase)
+            elif duration is None:
+                # the ORM would have applied the column default here
+                duration = 0
+            row_list.append({
+                'id': uuid.uuid4(),
+                'job_id': job.id,
+                'step_id': step.id,
+                'project_id': project.id,
+                'label_sha': test.name_sha,
+                'name': test.name,
+                'duration': duration,
+                'message': test.message,
+                'result': test.result,
+                'date_created': test.date_created,
+                'reruns': test.reruns,
+                'owner': test.owner,
+            })
 
         if bad_duration_test_name:
             # Include the project slug in the warning so project warnings aren't bucketed together.
             logger.warning("Got bad test duration for " + project.slug + "; %s: %s",
                            bad_duration_test_name, bad_duration_value)
 
-        # Try an optimistic commit of all cases at once.
-        for testcase in testcase_list:
-            db.session.add(testcase)
+        stat_deltas = self._new_stat_deltas()
+        with statsreporter.stats().timer('testresult_save_testcases'):
+            testcase_ids = self._save_testcases(row_list, stat_deltas)
 
-        try:
-            db.session.commit()
-        except IntegrityError:
-            db.session.rollback()
+        self._save_artifacts_and_messages(test_list, testcase_ids)
+        self._record_stats(stat_deltas)
 
-            create_or_update(FailureReason, where={
-                'step_id': step.id,
-                'reason': 'duplicate_test_name',
-            }, values={
-                'project_id': step.project_id,
-                'build_id': step.job.build_id,
-                'job_id': step.job_id,
-            })
-            db.session.commit()
+    def merge(self, test_list):
+        """Combine results into the TestCases already saved for the same tests.
 
-            # Slowly make separate commits, to uncover duplicate test cases:
-            for i, testcase in enumerate(testcase_list):
-                db.session.add(testcase)
-                try:
-                    db.session.commit()
-                except IntegrityError:
-                    db.session.rollback()
-                    original = _record_duplicate_testcase(testcase)
-                    db.session.commit()
-                    testcase_list[i] = original  # so artifacts get stored
-                    _record_test_failures(original.step)  # so count is right
+        This is used when results for one test arrive in separate batches of
+        the same artifact, which would otherwise be reported as duplicates.
+        Results are combined the same way repeated <testcase> elements of a
+        single file are.  Tests that this step has no TestCase for, because
+        another step of the job saved them first, are saved as in `save`,
+        which reports them as duplicates.
+        """
+        if not test_list:
+            return
 
+        step = self.step
+        stat_deltas = self._new_stat_deltas()
+        merged_tests = []
+        unmerged_tests = []
+        testcase_ids = []
+        for test in test_list:
+            testcase = TestCase.query.filter_by(
+                job_id=step.job_id,
+                step_id=step.id,
+                name_sha=test.name_sha,
+            ).with_for_update().first()
+            if testcase is None:
+                unmerged_tests.append(test)
+                continue
+
+            stat_deltas[testcase.step_id].subtract(_test_stat_values(
+                testcase.result, testcase.duration, testcase.reruns))
+            if _is_valid_duration(test.duration):
+                testcase.duration = safe_agg(add, (testcase.duration, test.duration))
+            testcase.result = aggregate_result((testcase.result, test.result))
+            if testcase.message and test.message:
+                testcase.message += '\n\n' + test.message
+            elif not testcase.message:
+                testcase.message = test.message or ''
+            testcase.reruns = safe_agg(max, (testcase.reruns, test.reruns))
+            stat_deltas[testcase.step_id].update(_test_stat_values(
+                testcase.result, testcase.duration, testcase.reruns))
+            db.session.add(testcase)
+            merged_tests.append(test)
+            testcase_ids.append(testcase.id)
+        db.session.commit()
+
+        self._save_artifacts_and_messages(merged_tests, testcase_ids)
+        self._record_stats(stat_deltas)
+        self.save(unmerged_tests)
+
+    def _save_artifacts_and_messages(self, test_list, testcase_ids):
         # Test artifacts and messages do not operate under a unique constraint, so
         # they should insert cleanly without an integrity error.
+        step = self.step
 
         as_client = ArtifactStoreClient(current_app.config['ARTIFACTS_SERVER'])
-        for test, testcase in zip(test_list, testcase_list):
+        message_rows = []
+        for test, testcase_id in zip(test_list, testcase_ids):
             if test.artifacts:
                 m = hashlib.md5()
                 m.update(test.id)
@@ -198,6 +251,7 @@ class TestResultManager(object):
                         if num_attempts == max_duplicate_attempts:
                             raise e
 
+                testcase = TestCase.query.get(testcase_id)
                 for ta in test.artifacts:
                     testartifact = TestArtifact(
                         name=ta['name'],
@@ -208,81 +262,229 @@ class TestResultManager(object):
                 as_client.close_bucket(bucket_name)
 
             for (label, start, length) in test.message_offsets:
-                testmessage = TestMessage(
-                    label=label,
-                    start_offset=start,
-                    length=length,
-                    test=testcase,
-                    artifact=self.artifact,
-                )
-                db.session.add(testmessage)
+                message_rows.append({
+                    'id': uuid.uuid4(),
+                    'test_id': testcase_id,
+                    'artifact_id': self.artifact.id,
+                    'label': label,
+                    'start_offset': start,
+                    'length': length,
+                })
 
         try:
+            for chunk in _chunked(message_rows, TESTCASE_INSERT_CHUNK_SIZE):
+                db.session.execute(TestMessage.__table__.insert().values(chunk))
             db.session.commit()
         except Exception:
             db.session.rollback()
             logger.exception('Failed to save artifacts and messages'
                              ' for step {}'.format(step.id.hex))
 
+    def _new_stat_deltas(self):
+        """Returns an accumulator of changes to the test stats of each step,
+        which always records (possibly zero) changes for this step so that
+        its stats exist once results have been saved."""
+        stat_deltas = defaultdict(Counter)
+        stat_deltas[self.step.id].update(dict.fromkeys(TEST_STAT_NAMES, 0))
+        return stat_deltas
+
+    def _record_stats(self, stat_deltas):
+        """Apply the changes to test stats made by the results just saved.
+
+        Only the changes are applied, instead of recounting every TestCase of
+        the step, so saving many artifacts for a step does not get slower with
+        each artifact. `recount_test_stats` recomputes the stats from scratch.
+        """
         try:
-            _record_test_counts(self.step)
-            _record_test_failures(self.step)
-            _record_test_duration(self.step)
-            _record_test_rerun_counts(self.step)
+            for step_id, deltas in sorted(stat_deltas.iteritems()):
+                increment_item_stats(step_id, deltas)
+            db.session.commit()
         except Exception:
             db.session.rollback()
             logger.exception('Failed to record aggregate test statistics'
-                             ' for step {}'.format(step.id.hex))
+                             ' for step {}'.format(self.step.id.hex))
 
+    def _save_testcases(self, row_list, stat_deltas):
+        """Insert TestCase rows in chunks, returning the id stored for each row.
 
-def _record_test_counts(step):
-    create_or_update(ItemStat, where={
-        'item_id': step.id,
-        'name': 'test_count',
-    }, values={
-        'value': db.session.query(func.count(TestCase.id)).filter(
-            TestCase.step_id == step.id,
-        ).as_scalar(),
-    })
-    db.session.commit()
+        Duplicate names within `row_list` are detected in memory, and names
+        already stored for this job are detected with one lookup per chunk,
+        so the only rows that can still conflict are those written by a
+        concurrent save for another step of the same job.  Every duplicate
+        resolves to the id of the TestCase that was stored first, so that
+        artifacts and messages are attached to it.
 
+        The changes this makes to test stats are added to `stat_deltas`.
+        """
+        step = self.step
 
-def _record_test_failures(step):
-    create_or_update(ItemStat, where={
-        'item_id': step.id,
-        'name': 'test_failures',
-    }, values={
-        'value': db.session.query(func.count(TestCase.id)).filter(
-            TestCase.step_id == step.id,
-            TestCase.result == Result.failed,
-        ).as_scalar(),
-    })
-    db.session.commit()
+        # name_sha -> id of the row that will be (or already is) stored
+        stored_ids = {}
+        duplicate_rows = []
+        unique_rows = []
+        for row in row_list:
+            if row['label_sha'] in stored_ids:
+                duplicate_rows.append(row)
+            else:
+                stored_ids[row['label_sha']] = row['id']
+                unique_rows.append(row)
+
+        for chunk in _chunked(unique_rows, TESTCASE_INSERT_CHUNK_SIZE):
+            existing = _get_existing_testcase_ids(
+                step.job_id, [row['label_sha'] for row in chunk])
+
+            new_rows = []
+            for row in chunk:
+                if row['label_sha'] in existing:
+                    stored_ids[row['label_sha']] = existing[row['label_sha']]
+                    duplicate_rows.append(row)
+                else:
+                    new_rows.append(row)
+
+            conflicting_rows = _insert_testcase_rows(new_rows)
+            duplicate_rows.extend(conflicting_rows)
+            conflicting_ids = set(row['id'] for row in conflicting_rows)
+            for row in new_rows:
+                if row['id'] not in conflicting_ids:
+                    stat_deltas[step.id].update(_test_stat_values(
+                        row['result'], row['duration'], row['reruns']))
+        db.session.commit()
+
+        if duplicate_rows:
+            create_or_update(FailureReason, where={
+                'step_id': step.id,
+                'reason': 'duplicate_test_name',
+            }, values={
+                'project_id': step.project_id,
+                'build_id': step.job.build_id,
+                'job_id': step.job_id,
+            })
 
+            for row in duplicate_rows:
+                original = _record_duplicate_testcase(TestCase(
+                    job_id=step.job_id,
+                    step=step,
+                    name_sha=row['label_sha'],
+                ), stat_deltas)
+                stored_ids[row['label_sha']] = original.id
+            db.session.commit()
+
+        return [stored_ids[row['label_sha']] for row in row_list]
+
+
+def _is_valid_duration(duration):
+    # Maximum value for the Integer column type
+    return duration is None or 0 <= duration <= 2147483647
+
+
+def _chunked(rows, size):
+    for i in xrange(0, len(rows), size):
+        yield rows[i:i + size]
+
+
+def _get_existing_testcase_ids(job_id, name_shas):
+    """Returns a dict mapping each of `name_shas` already stored for the job
+    to the id of its TestCase."""
+    return dict(db.session.query(
+        TestCase.name_sha, TestCase.id,
+    ).filter(
+        TestCase.job_id == job_id,
+        TestCase.name_sha.in_(name_shas),
+    ))
 
-def _record_test_duration(step):
-    create_or_update(ItemStat, where={
-        'item_id': step.id,
-        'name': 'test_duration',
-    }, values={
-        'value': db.session.query(func.coalesce(func.sum(TestCase.duration), 0)).filter(
-            TestCase.step_id == step.id,
-        ).as_scalar(),
-    })
 
+def _insert_testcase_rows(row_list):
+    """Insert TestCase rows with a single multi-row INSERT.
 
-def _record_test_rerun_counts(step):
-    create_or_update(ItemStat, where={
-        'item_id': step.id,
-        'name': 'test_rerun_count',
-    }, values={
-        'value': db.session.query(func.count(TestCase.id)).filter(
-            TestCase.step_id == step.id,
-            TestCase.reruns > 0,
-        ).as_scalar(),
+    If the batch hits the unique constraint, which only happens when another
+    step of the same job saved the same test concurrently, the rows are
+    retried one at a time.
+
+    Returns:
+        list: the rows that could not be inserted because they are duplicates.
+    """
+    if not row_list:
+        return []
+
+    table = TestCase.__table__
+    try:
+        with db.session.begin_nested():
+            db.session.execute(table.insert().values(row_list))
+        return []
+    except IntegrityError:
+        pass
+
+    duplicate_rows = []
+    for row in row_list:
+        try:
+            with db.session.begin_nested():
+                db.session.execute(table.insert().values(row))
+        except IntegrityError:
+            duplicate_rows.append(row)
+    return duplicate_rows
+
+
+def _test_stat_values(result, duration, reruns):
+    """Returns what a single TestCase contributes to each of TEST_STAT_NAMES
+    and to the count of its result."""
+    return Counter({
+        'test_count': 1,
+        'test_failures': int(result == Result.failed),
+        'test_duration': duration or 0,
+        'test_rerun_count': int(bool(reruns)),
+        get_result_stat_name(result): 1,
     })
 
 
+def count_test_stats(step):
+    """Returns the value of each of TEST_STAT_NAMES, and of the result counts
+    of the results its tests have, computed from all of the TestCases of
+    `step`."""
+    values = db.session.query(
+        func.count(TestCase.id),
+        func.coalesce(func.sum(case([(TestCase.result == Result.failed, 1)], else_=0)), 0),
+        func.coalesce(func.sum(TestCase.duration), 0),
+        func.coalesce(func.sum(case([(TestCase.reruns > 0, 1)], else_=0)), 0),
+    ).filter(
+        TestCase.step_id == step.id,
+    ).one()
+    stats = dict(zip(TEST_STAT_NAMES, (int(v) for v in values)))
+
+    result_counts = db.session.query(
+        TestCase.result, func.count(TestCase.id),
+    ).filter(
+        TestCase.step_id == step.id,
+    ).group_by(
+        TestCase.result,
+    )
+    for result, count in result_counts:
+        stats[get_result_stat_name(result)] = count
+    return stats
+
+
+def recount_test_stats(step):
+    """Recompute the test stats of `step` from all of its TestCases.
+
+    Saving results keeps these stats up to date incrementally, so this is
+    only needed to verify or repair them.
+    """
+    stats = count_test_stats(step)
+    for name, value in stats.iteritems():
+        create_or_update(ItemStat, where={
+            'item_id': step.id,
+            'name': name,
+        }, values={
+            'value': value,
+        })
+    ItemStat.query.filter(
+        ItemStat.item_id == step.id,
+        ItemStat.name.in_(set(TEST_RESULT_STAT_NAMES) - set(stats)),
+    ).update({
+        ItemStat.value: 0,
+    }, synchronize_session=False)
+    db.session.commit()
+
+
 _DUPLICATE_TEST_COMPLAINT = """Error: Duplicate Test
 
 Your test suite is reporting multiple results for this test, but Changes
@@ -305,13 +507,14 @@ Here are the job steps that reported a result for this test:
 """
 
 
-def _record_duplicate_testcase(duplicate):
+def _record_duplicate_testcase(duplicate, stat_deltas):
     """Find the TestCase that already exists for `duplicate` and update it.
 
     Because of the unique constraint on TestCase, we cannot record the
     `duplicate`.  Instead, we go back and mark the first instance as
     having failed because of the duplication, but discard all of the
-    other data delivered with the `duplicate`.
+    other data delivered with the `duplicate`.  The resulting change to the
+    test stats of the original's step is added to `stat_deltas`.
 
     """
     original = (
@@ -322,8 +525,12 @@ def _record_duplicate_testcase(duplicate):
 
     prefix = _DUPLICATE_TEST_COMPLAINT
     if (original.message is None) or not original.message.startswith(prefix):
+        stat_deltas[original.step_id].subtract(_test_stat_values(
+            original.result, original.duration, original.reruns))
         original.message = '{}{}\n'.format(prefix, original.step.label)
         original.result = Result.failed
+        stat_deltas[original.step_id].update(_test_stat_values(
+            original.result, original.duration, original.reruns))
 
     if duplicate.step.label not in original.message:
         original.message += '{}\n'.format(duplicate.step.label)
@@ -5,13 +5,16 @@ import logging
 from datetime import datetime, timedelta
 from functools import wraps
 from threading import local, Lock
-from uuid import uuid4
-from collections import Counter
+from uuid import UUID, uuid4
+from collections import Counter, OrderedDict, defaultdict
+
+from sqlalchemy.exc import IntegrityError
 
 from changes.config import db, queue, statsreporter
 from changes.constants import Result, Status
 from changes.db.utils import get_or_create
 from changes.models.task import Task
+from changes.queue import task_state
 from changes.utils.locking import lock
 
 
@@ -31,6 +34,13 @@ class NotFinished(Exception):
         self.retry_after = retry_after or CONTINUE_COUNTDOWN
 
 
+class Superseded(Exception):
+    """
+    Raised by a task when another run has taken over from this one, so it
+    should neither finish nor be requeued.
+    """
+
+
 class TooManyRetries(Exception):
     pass
 
@@ -56,6 +66,7 @@ class TrackedTask(local):
     >>> foo.delay(foo='bar', task_id='bar')
     """
     NotFinished = NotFinished
+    Superseded = Superseded
 
     def __init__(self, func, max_retries=MAX_RETRIES, on_abort=None):
         self.func = lock(func)
@@ -97,13 +108,9 @@ class TrackedTask(local):
 
         now = datetime.utcnow()
 
-        self._report_lag(now)
-
         date_started = now
 
-        updated = self._update({
-            Task.date_modified: now,
-        })
+        updated = self._start(now)
         if not updated and not self.allow_absent_from_db:
             self.logger.error("Tried to update a Task that doesn't exist in the database; %s, %s",
                               self.task_name, kwargs)
@@ -117,11 +124,18 @@ class TrackedTask(local):
 
             self._continue(kwargs, e.retry_after)
 
+        except Superseded:
+            self.logger.info(
+                'Task run superseded: %s %s', self.task_name, self.task_id)
+            db.session.commit()
+            statsreporter.stats().incr('task_superseded_' + self.task_name)
+
         except Exception as exc:
             db.session.rollback()
 
             self.logger.exception(unicode(exc))
 
+            self._forget_state()
             try:
                 self._retry()
             except TooManyRetries as exc:
@@ -144,6 +158,7 @@ class TrackedTask(local):
         else:
             date_finished = datetime.utcnow()
 
+            self._forget_state()
             try:
                 self._update({
                     Task.date_started: date_started,
@@ -164,6 +179,40 @@ class TrackedTask(local):
             self.parent_id = None
             self.kwargs = kwargs
 
+    def _start(self, now):
+        """
+        Records that this Task is being run.
+
+        Returns:
+           bool: Whether the Task exists.
+        """
+        if task_state.is_enabled():
+            state = task_state.get(self.task_name, self.task_id)
+            if state is not None and state.parent_id == self._get_parent_uuid():
+                task_state.touch(self.task_name, self.task_id, now)
+                return True
+
+        self._report_lag(now)
+
+        updated = self._update({
+            Task.date_modified: now,
+        })
+        if updated and task_state.is_enabled():
+            task_state.prime(Task.query.filter(
+                Task.task_name == self.task_name,
+                Task.task_id == self.task_id,
+            ).first())
+        return updated
+
+    def _get_parent_uuid(self):
+        if self.parent_id is None or isinstance(self.parent_id, UUID):
+            return self.parent_id
+        return UUID(self.parent_id)
+
+    def _forget_state(self):
+        if task_state.is_enabled():
+            task_state.forget(self.task_name, self.task_id)
+
     def _update(self, kwargs):
         """
         Update's the state of this Task.
@@ -186,11 +235,20 @@ class TrackedTask(local):
         kwargs['task_id'] = self.task_id
         kwargs['parent_task_id'] = self.parent_id
 
-        self._update({
-            Task.date_modified: datetime.utcnow(),
-            Task.status: Status.in_progress,
-        })
+        now = datetime.utcnow()
+        state = task_state.get(self.task_name, self.task_id) if task_state.is_enabled() else None
+        if state is not None and state.status == Status.in_progress:
+            task_state.touch(self.task_name, self.task_id, now)
+        else:
+            # the first time it's continued, so make that visible right away
+            self._update({
+                Task.date_modified: now,
+                Task.status: Status.in_progress,
+            })
+            if state is not None:
+                task_state.touch(self.task_name, self.task_id, now, Status.in_progress)
 
+        # commits whatever the task did before raising NotFinished
         db.session.commit()
 
         queue.delay(
@@ -293,6 +351,19 @@ class TrackedTask(local):
         """
         kwargs.setdefault('task_id', uuid4().hex)
 
+        if task_state.is_enabled():
+            state = task_state.get(self.task_name, kwargs['task_id'])
+            if state is not None:
+                # it has been run, so it exists
+                if self.needs_requeued(state):
+                    task_state.touch(self.task_name, kwargs['task_id'], datetime.utcnow())
+                    db.session.commit()
+                    queue.delay(
+                        self.task_name,
+                        kwargs=kwargs,
+                    )
+                return
+
         fn_kwargs = dict(
             (k, v) for k, v in kwargs.iteritems()
             if k not in ('task_id', 'parent_task_id')
@@ -335,6 +406,15 @@ class TrackedTask(local):
         """
         kwargs.setdefault('task_id', uuid4().hex)
 
+        if task_state.is_enabled() and task_state.get(self.task_name, kwargs['task_id']) is not None:
+            task_state.touch(self.task_name, kwargs['task_id'], datetime.utcnow())
+            db.session.commit()
+            queue.delay(
+                self.task_name,
+                kwargs=kwargs,
+            )
+            return
+
         fn_kwargs = dict(
             (k, v) for k, v in kwargs.iteritems()
             if k not in ('task_id', 'parent_task_id')
@@ -365,11 +445,142 @@ class TrackedTask(local):
             kwargs=kwargs,
         )
 
+    def delay_many(self, kwargs_list):
+        """
+        Enqueue this task once for each of `kwargs_list`, as `delay` would,
+        but with one insert for the new Tasks, one commit and one publish.
+
+        >>> task.delay_many([
+        >>>     {'task_id': '33846695b2774b29a71795a009e8168a', 'foo': 'bar'},
+        >>>     {'task_id': '659974858dcf4aa08e73a940e1066328', 'foo': 'baz'},
+        >>> ])
+        """
+        self._delay_many(kwargs_list, only_if_needed=False)
+
+    def delay_if_needed_many(self, kwargs_list):
+        """
+        Enqueue this task for each of `kwargs_list` that is new or hasn't
+        checked in in a reasonable amount of time, as `delay_if_needed` would,
+        but with one insert for the new Tasks, one commit and one publish.
+        """
+        self._delay_many(kwargs_list, only_if_needed=True)
+
+    def _delay_many(self, kwargs_list, only_if_needed):
+        # a task is only queued once, however often it is asked for
+        unique = OrderedDict()
+        for kwargs in kwargs_list:
+            kwargs = dict(kwargs)
+            kwargs.setdefault('task_id', uuid4().hex)
+            unique.setdefault(UUID(kwargs['task_id']), kwargs)
+        if not unique:
+            return
+
+        now = datetime.utcnow()
+        to_queue = []
+
+        if task_state.is_enabled():
+            for task_id, kwargs in unique.items():
+                state = task_state.get(self.task_name, task_id)
+                if state is None:
+                    continue
+                # it has been run, so it exists
+                del unique[task_id]
+                if not only_if_needed or self.needs_requeued(state):
+                    task_state.touch(self.task_name, task_id, now)
+                    to_queue.append(kwargs)
+
+        if unique:
+            tasks, created = self._get_or_create_many(unique)
+            touched = []
+            for task_id, kwargs in unique.iteritems():
+                if task_id in created:
+                    to_queue.append(kwargs)
+                elif not only_if_needed or self.needs_requeued(tasks[task_id]):
+                    touched.append(tasks[task_id].id)
+                    to_queue.append(kwargs)
+
+            if touched:
+                Task.query.filter(
+                    Task.id.in_(touched),
+                ).update({
+                    Task.date_modified: now,
+                }, synchronize_session=False)
+            if created:
+                self._report_created(len(created))
+
+        db.session.commit()
+
+        if to_queue:
+            queue.delay_many(self.task_name, to_queue)
+
+    def _get_or_create_many(self, kwargs_by_id):
+        """
+        Returns a dict of task id to Task for those of `kwargs_by_id` (a dict
+        of task id to the kwargs it is queued with) that already exist, and
+        the set of ids of those that had to be created.
+
+        The missing Tasks are created with one insert, unless some of them
+        were created concurrently.
+        """
+        tasks = {task.task_id: task for task in Task.query.filter(
+            Task.task_name == self.task_name,
+            Task.task_id.in_(kwargs_by_id.keys()),
+        )}
+
+        missing = [task_id for task_id in kwargs_by_id if task_id not in tasks]
+        if not missing:
+            return tasks, set()
+
+        now = datetime.utcnow()
+        rows = []
+        for task_id in missing:
+            kwargs = kwargs_by_id[task_id]
+            rows.append({
+                'id': uuid4(),
+                'task_name': self.task_name,
+                'child_id': task_id,
+                'parent_id': kwargs.get('parent_task_id'),
+                'status': Status.queued,
+                'result': Result.unknown,
+                'num_retries': 0,
+                'data': {
+                    'kwargs': dict(
+                        (k, v) for k, v in kwargs.iteritems()
+                        if k not in ('task_id', 'parent_task_id')
+                    ),
+                },
+                'date_created': now,
+                'date_modified': now,
+            })
+
+        try:
+            with db.session.begin_nested():
+                db.session.execute(Task.__table__.insert(), rows)
+        except IntegrityError:
+            created = set()
+            for task_id, row in zip(missing, rows):
+                task, was_created = get_or_create(Task, where={
+                    'task_name': self.task_name,
+                    'task_id': task_id,
+                }, defaults={
+                    'parent_id': row['parent_id'],
+                    'data': row['data'],
+                    'status': Status.queued,
+                })
+                tasks[task_id] = task
+                if was_created:
+                    created.add(task_id)
+            return tasks, created
+
+        return tasks, set(missing)
+
     def verify_all_children(self):
         task_list = list(Task.query.filter(
             Task.parent_id == self.task_id,
             Task.status != Status.finished,
         ))
+        if task_state.is_enabled():
+            task_state.merge(task_list)
 
         if not task_list:
             return Status.finished
@@ -403,11 +614,14 @@ class TrackedTask(local):
             db.session.commit()
 
         if need_run:
+            kwargs_by_name = defaultdict(list)
             for task in need_run:
                 child_kwargs = task.data['kwargs'].copy()
                 child_kwargs['parent_task_id'] = task.parent_id.hex
                 child_kwargs['task_id'] = task.task_id.hex
-                queue.delay(task.task_name, kwargs=child_kwargs)
+                kwargs_by_name[task.task_name].append(child_kwargs)
+            for name, kwargs_list in kwargs_by_name.iteritems():
+                queue.delay_many(name, kwargs_list)
 
             Task.query.filter(
                 Task.id.in_([n.id for n in need_run]),
@@ -426,9 +640,9 @@ class TrackedTask(local):
 
         return status
 
-    def _report_created(self):
-        """Reports to monitoring that a new Task was created."""
-        statsreporter.stats().incr('new_task_created_' + self.task_name)
+    def _report_created(self, count=1):
+        """Reports to monitoring that new Tasks were created."""
+        statsreporter.stats().incr('new_task_created_' + self.task_name, count)
 
     def _report_lag(self, first_run_time):
         # type: (datetime) -> None
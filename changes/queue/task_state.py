@@ -0,0 +1,188 @@
+"""
+A Redis cache of the state of TrackedTasks, so that the transitions a task
+goes through on every run (starting, continuing after NotFinished, being
+delayed again) don't each need a write to the task table.
+
+Once a task's row has been read, its state is cached in a Redis hash. While
+the hash exists those transitions only update it and mark the task dirty,
+and `flush` (run periodically) writes the dirty states back to the task table
+in one batch. Other transitions (creation, first becoming in progress,
+retries and finishing) still go to the database, and retries and finishing
+drop the cached state. Code that
+judges tasks by their state, like verify_all_children and cleanup_tasks,
+reads the rows with the cached state merged over them (see `merge`).
+"""
+
+from __future__ import absolute_import
+
+from calendar import timegm
+from collections import namedtuple
+from datetime import datetime
+from uuid import UUID
+
+from flask import current_app
+from sqlalchemy.orm.attributes import set_committed_value
+from sqlalchemy.sql import and_, bindparam, func
+
+from changes.config import db, redis, statsreporter
+from changes.constants import Status
+from changes.models.task import Task
+
+STATE_KEY = 'task_state:{}'
+DIRTY_KEY = 'task_state:dirty'
+FLUSHING_KEY = 'task_state:flushing'
+
+# Long enough to outlive any task that is still being run; a task that isn't
+# touched for this long will be re-read from the database.
+STATE_TTL = 60 * 60 * 3
+
+TaskState = namedtuple('TaskState', [
+    'parent_id', 'status', 'num_retries', 'date_created', 'date_modified',
+])
+
+
+def is_enabled():
+    return current_app.config['TASK_STATE_REDIS_ENABLED']
+
+
+def _get_member(task_name, task_id):
+    if not isinstance(task_id, UUID):
+        task_id = UUID(task_id)
+    return '{}:{}'.format(task_name, task_id.hex)
+
+
+def _encode_date(value):
+    return '%d.%06d' % (timegm(value.utctimetuple()), value.microsecond)
+
+
+def _decode_date(value):
+    seconds, microseconds = value.split('.')
+    return datetime.utcfromtimestamp(int(seconds)).replace(microsecond=int(microseconds))
+
+
+def get(task_name, task_id):
+    """
+    Returns the cached TaskState of a task, or None if it isn't cached.
+    """
+    values = redis.hgetall(STATE_KEY.format(_get_member(task_name, task_id)))
+    if 'num_retries' not in values:
+        # not cached, or only partially written after being forgotten
+        return None
+    return TaskState(
+        parent_id=UUID(values['parent_id']) if values['parent_id'] else None,
+        status=Status[values['status']],
+        num_retries=int(values['num_retries']),
+        date_created=_decode_date(values['date_created']),
+        date_modified=_decode_date(values['date_modified']),
+    )
+
+
+def prime(task):
+    """
+    Caches the state of `task` (a Task) as it is in the database.
+    """
+    pipe = redis.pipeline()
+    key = STATE_KEY.format(_get_member(task.task_name, task.task_id))
+    pipe.hmset(key, {
+        'parent_id': task.parent_id.hex if task.parent_id else '',
+        'status': task.status.name,
+        'num_retries': task.num_retries,
+        'date_created': _encode_date(task.date_created),
+        'date_modified': _encode_date(task.date_modified),
+    })
+    pipe.expire(key, STATE_TTL)
+    pipe.execute()
+
+
+def touch(task_name, task_id, date_modified, status=None):
+    """
+    Records a transition of a cached task, to be written back by `flush`.
+    """
+    member = _get_member(task_name, task_id)
+    key = STATE_KEY.format(member)
+    values = {'date_modified': _encode_date(date_modified)}
+    if status is not None:
+        values['status'] = status.name
+    pipe = redis.pipeline()
+    pipe.hmset(key, values)
+    pipe.expire(key, STATE_TTL)
+    pipe.sadd(DIRTY_KEY, member)
+    pipe.execute()
+
+
+def forget(task_name, task_id):
+    """
+    Drops the cached state of a task, once its row has been updated directly.
+    """
+    redis.delete(STATE_KEY.format(_get_member(task_name, task_id)))
+
+
+def merge(tasks):
+    """
+    Updates `tasks` (a list of Task) with their cached state, without marking
+    them as modified.
+    """
+    if not tasks:
+        return
+    pipe = redis.pipeline(transaction=False)
+    for task in tasks:
+        pipe.hmget(STATE_KEY.format(_get_member(task.task_name, task.task_id)),
+                   'date_modified', 'status')
+    for task, (date_modified, status) in zip(tasks, pipe.execute()):
+        if task.status == Status.finished or date_modified is None:
+            continue
+        date_modified = _decode_date(date_modified)
+        if date_modified > task.date_modified:
+            set_committed_value(task, 'date_modified', date_modified)
+        if status is not None:
+            set_committed_value(task, 'status', Status[status])
+
+
+def flush():
+    """
+    Writes the state of every task touched since the last flush back to the
+    task table. Returns the number of tasks written.
+    """
+    # Take the dirty set over atomically, keeping whatever a failed flush
+    # left behind.
+    pipe = redis.pipeline()
+    pipe.sunionstore(FLUSHING_KEY, FLUSHING_KEY, DIRTY_KEY)
+    pipe.delete(DIRTY_KEY)
+    pipe.execute()
+
+    members = list(redis.smembers(FLUSHING_KEY))
+    if not members:
+        return 0
+
+    pipe = redis.pipeline(transaction=False)
+    for member in members:
+        pipe.hmget(STATE_KEY.format(member), 'date_modified', 'status')
+
+    params = []
+    for member, (date_modified, status) in zip(members, pipe.execute()):
+        if date_modified is None:
+            # forgotten, so the row is up to date
+            continue
+        task_name, task_id = member.split(':')
+        params.append({
+            '_task_name': task_name,
+            '_task_id': UUID(task_id),
+            '_date_modified': _decode_date(date_modified),
+            '_status': Status[status] if status else None,
+        })
+
+    if params:
+        table = Task.__table__
+        db.session.execute(table.update().where(and_(
+            table.c.task_name == bindparam('_task_name'),
+            table.c.child_id == bindparam('_task_id'),
+            table.c.status != Status.finished,
+        )).values(
+            date_modified=func.greatest(table.c.date_modified, bindparam('_date_modified')),
+            status=func.coalesce(bindparam('_status', type_=table.c.status.type), table.c.status),
+        ), params)
+        db.session.commit()
+
+    redis.delete(FLUSHING_KEY)
+    statsreporter.stats().incr('task_state_flushed', len(params))
+    return len(params)
@@ -1,20 +1,65 @@
 from __future__ import absolute_import
 
-import requests
+import threading
 
-from changes.lib.artifact_store_lib import ArtifactStoreClient
+from changes.lib.artifact_store_lib import ArtifactState, ArtifactStoreClient
 from flask import current_app
 
 from changes.storage.base import FileStorage
+from changes.storage.content_cache import ContentCache
 
 ARTIFACTSTORE_PREFIX = 'artifactstore/'
 
+# Clients (and so their connection pools) are shared by every storage in the
+# process, as storages are created for each file access.
+_clients = {}
+_caches = {}
+_lock = threading.Lock()
+
+# Artifacts whose sizes were just fetched, by cache key, so that reading one
+# whole right after can decide whether to cache it without fetching it again.
+_sized_artifacts = {}
+MAX_SIZED_ARTIFACTS = 1000
+
+
+def _get_client(base_url):
+    key = (ArtifactStoreClient, base_url)
+    with _lock:
+        client = _clients.get(key)
+        if client is None:
+            client = _clients[key] = ArtifactStoreClient(base_url)
+    return client
+
+
+def _get_cache():
+    directory = current_app.config['ARTIFACT_CONTENT_CACHE_DIR']
+    if not directory:
+        return None
+    with _lock:
+        cache = _caches.get(directory)
+        if cache is None:
+            cache = _caches[directory] = ContentCache(
+                directory, current_app.config['ARTIFACT_CONTENT_CACHE_MAX_BYTES'],
+                current_app.config['ARTIFACT_CONTENT_CACHE_MAX_ENTRY_BYTES'])
+    return cache
+
+
+def _remember_sized(key, artifact):
+    with _lock:
+        if len(_sized_artifacts) >= MAX_SIZED_ARTIFACTS:
+            _sized_artifacts.popitem()
+        _sized_artifacts[key] = artifact
+
+
+def _pop_sized(key):
+    with _lock:
+        return _sized_artifacts.pop(key, None)
+
 
 class ArtifactStoreFileStorage(FileStorage):
     def __init__(self, base_url=None, path=''):
         self.base_url = base_url or current_app.config.get('ARTIFACTS_SERVER')
         self.path = path
-        self.session = requests.Session()
 
     @staticmethod
     def get_filename_from_artifact_name(bucket_name, artifact_name):
@@ -31,7 +76,7 @@ class ArtifactStoreFileStorage(FileStorage):
 
     def save(self, filename, fp, content_type=None, path=None):
         bucket_name, artifact_name = ArtifactStoreFileStorage.get_artifact_name_from_filename(filename)
-        artifact_name = ArtifactStoreClient(self.base_url)\
+        artifact_name = _get_client(self.base_url)\
             .write_streamed_artifact(bucket_name, artifact_name, fp.read(), path=path).name
         # Update the name to account for de-duplication
         return ArtifactStoreFileStorage.get_filename_from_artifact_name(bucket_name, artifact_name)
@@ -42,11 +87,52 @@ class ArtifactStoreFileStorage(FileStorage):
             filename=filename
         )
 
+    def _get_cache_key(self, filename):
+        return '{}/{}'.format(self.base_url, filename)
+
+    def _cache_content(self, cache, filename, artifact):
+        """
+        Fetches the content of `artifact` into `cache`, if it won't change
+        anymore. Returns whether it was cached.
+        """
+        if artifact.state != ArtifactState.UPLOADED or artifact.size > cache.max_entry_bytes:
+            return False
+        bucket_name, artifact_name = ArtifactStoreFileStorage.get_artifact_name_from_filename(filename)
+        content = _get_client(self.base_url).iter_artifact_content(bucket_name, artifact_name)
+        return cache.put(self._get_cache_key(filename), content)
+
     def get_size(self, filename):
+        cache = _get_cache()
+        if cache is not None:
+            size = cache.get_size(self._get_cache_key(filename))
+            if size is not None:
+                return size
+
         bucket_name, artifact_name = ArtifactStoreFileStorage.get_artifact_name_from_filename(filename)
-        return ArtifactStoreClient(self.base_url).get_artifact(bucket_name, artifact_name).size
+        artifact = _get_client(self.base_url).get_artifact(bucket_name, artifact_name)
+        if cache is not None:
+            _remember_sized(self._get_cache_key(filename), artifact)
+        return artifact.size
 
     def get_file(self, filename, offset=None, length=None):
+        """
+        With the content cache enabled, whole reads of finished artifacts
+        whose sizes were just fetched fill the cache; other misses (ranged
+        reads in particular) are fetched directly, without waiting for the
+        whole artifact.
+        """
         bucket_name, artifact_name = ArtifactStoreFileStorage.get_artifact_name_from_filename(filename)
-        return ArtifactStoreClient(self.base_url) \
+        cache = _get_cache()
+        if cache is not None:
+            key = self._get_cache_key(filename)
+            fp = cache.open(key, offset, length)
+            if fp is not None:
+                return fp
+            artifact = _pop_sized(key) if offset is None else None
+            if artifact is not None and self._cache_content(cache, filename, artifact):
+                fp = cache.open(key)
+                if fp is not None:
+                    return fp
+
+        return _get_client(self.base_url) \
             .get_artifact_content(bucket_name, artifact_name, offset, length)
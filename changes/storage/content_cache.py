@@ -0,0 +1,202 @@
+"""
+A bounded cache of file contents in a local directory, shared by every
+process on the host that uses the same directory.
+
+Entries are evicted least recently used first (by modification time, which
+is bumped whenever an entry is read) once the total size of the directory
+goes over its limit. Each process tracks the size of the directory from what
+it has added since it last listed it, and lists it again (which also picks
+up what other processes have added) only when that goes over the limit, or
+every EVICT_SCAN_INTERVAL additions.
+"""
+
+from __future__ import absolute_import
+
+import errno
+import mmap
+import os
+import tempfile
+import threading
+
+from cStringIO import StringIO
+from hashlib import sha1
+
+# The most additions between listings of the cache directory.
+EVICT_SCAN_INTERVAL = 100
+
+# Evictions free up space down to this fraction of the limit, so that they
+# aren't needed again right away.
+EVICT_TARGET_RATIO = 0.9
+
+
+class MappedFile(object):
+    """
+    A read-only file object over a memory map.
+    """
+    def __init__(self, mapped):
+        self.mapped = mapped
+
+    def read(self, size=-1):
+        if size is None or size < 0:
+            size = self.mapped.size() - self.mapped.tell()
+        return self.mapped.read(size)
+
+    def readline(self, size=-1):
+        line = self.mapped.readline()
+        if size is not None and 0 <= size < len(line):
+            self.mapped.seek(size - len(line), os.SEEK_CUR)
+            line = line[:size]
+        return line
+
+    def __iter__(self):
+        return iter(self.readline, '')
+
+    def seek(self, offset, whence=os.SEEK_SET):
+        self.mapped.seek(offset, whence)
+
+    def tell(self):
+        return self.mapped.tell()
+
+    def close(self):
+        self.mapped.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+
+class ContentCache(object):
+    def __init__(self, directory, max_bytes, max_entry_bytes=None):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        # the most bytes of a single entry; defaults to the whole limit
+        self.max_entry_bytes = min(max_bytes, max_entry_bytes or max_bytes)
+        self._lock = threading.Lock()
+        # size of the directory as of the last listing, plus what was added since
+        self._total = None
+        self._puts_since_scan = 0
+        if not os.path.isdir(directory):
+            try:
+                os.makedirs(directory)
+            except OSError as e:
+                if e.errno != errno.EEXIST:
+                    raise
+
+    def _get_path(self, key):
+        return os.path.join(self.directory, sha1(key).hexdigest())
+
+    def get_size(self, key):
+        """
+        Returns the size of the content cached for `key`, or None if there is
+        none.
+        """
+        try:
+            return os.path.getsize(self._get_path(key))
+        except OSError:
+            return None
+
+    def open(self, key, offset=None, length=None):
+        """
+        Returns the content cached for `key` as a read-only file object (from
+        `offset` and up to `length` bytes long, if given), or None if there
+        is none.
+
+        Whole contents are returned memory-mapped; ranges are copied out of
+        the mapping.
+        """
+        path = self._get_path(key)
+        try:
+            with open(path, 'rb') as fp:
+                size = os.fstat(fp.fileno()).st_size
+                mapped = mmap.mmap(fp.fileno(), 0, access=mmap.ACCESS_READ) if size else None
+            os.utime(path, None)
+        except (IOError, OSError, ValueError):
+            # not cached, or evicted just now
+            return None
+
+        if mapped is None:
+            return StringIO('')
+        if offset is None:
+            return MappedFile(mapped)
+
+        end = offset + length if length is not None and length >= 1 else size
+        try:
+            return StringIO(mapped[offset:end])
+        finally:
+            mapped.close()
+
+    def put(self, key, data):
+        """
+        Caches `data` (a string, or an iterator of strings) for `key`,
+        evicting other entries as needed to stay within the size limit. Data
+        larger than `max_entry_bytes` isn't cached.
+
+        Returns whether the data was cached.
+        """
+        if isinstance(data, basestring):
+            data = [data]
+
+        fd, tmp_path = tempfile.mkstemp(dir=self.directory, prefix='.tmp')
+        try:
+            size = 0
+            with os.fdopen(fd, 'wb') as fp:
+                for chunk in data:
+                    size += len(chunk)
+                    if size > self.max_entry_bytes:
+                        os.unlink(tmp_path)
+                        return False
+                    fp.write(chunk)
+            os.rename(tmp_path, self._get_path(key))
+        except Exception:
+            if os.path.exists(tmp_path):
+                os.unlink(tmp_path)
+            raise
+
+        self._added(size)
+        return True
+
+    def _added(self, size):
+        with self._lock:
+            self._puts_since_scan += 1
+            if self._total is not None:
+                self._total += size
+            needs_scan = (self._total is None or self._total > self.max_bytes or
+                          self._puts_since_scan >= EVICT_SCAN_INTERVAL)
+            if needs_scan:
+                self._puts_since_scan = 0
+                self._total = self._evict()
+
+    def _evict(self):
+        """
+        Evicts entries until the directory is within the size limit (down to
+        EVICT_TARGET_RATIO of it), and returns its size.
+        """
+        entries = []
+        total = 0
+        for name in os.listdir(self.directory):
+            if name.startswith('.tmp'):
+                continue
+            try:
+                stat = os.stat(os.path.join(self.directory, name))
+            except OSError:
+                continue
+            entries.append((stat.st_mtime, stat.st_size, name))
+            total += stat.st_size
+
+        if total <= self.max_bytes:
+            return total
+
+        entries.sort()
+        target = self.max_bytes * EVICT_TARGET_RATIO
+        for _, size, name in entries:
+            if total <= target:
+                break
+            try:
+                os.unlink(os.path.join(self.directory, name))
+            except OSError:
+                # evicted concurrently
+                pass
+            total -= size
+        return total
@@ -1,3 +1,9 @@
+import time
+
+from collections import OrderedDict
+from threading import Lock
+
+
 class memoize(object):
     """
     Memoize the result of a property call.
@@ -22,3 +28,68 @@ class memoize(object):
             value = self.func(obj)
             d[n] = value
         return value
+
+
+class LRUCache(object):
+    """
+    A mapping which holds at most `max_size` items, discarding the least
+    recently used item to make room for new ones. If `ttl` is given, items
+    are also discarded `ttl` seconds after they were set.
+
+    >>> cache = LRUCache(max_size=2)
+    >>> cache['a'] = 1
+    >>> cache.get('a')
+    1
+    """
+
+    def __init__(self, max_size, ttl=None):
+        self.max_size = max_size
+        self.ttl = ttl
+        self._data = OrderedDict()
+        self._lock = Lock()
+
+    def __len__(self):
+        return len(self._data)
+
+    def __contains__(self, key):
+        with self._lock:
+            entry = self._data.get(key)
+        return entry is not None and not self._is_expired(entry)
+
+    @staticmethod
+    def _is_expired(entry):
+        _, expires = entry
+        return expires is not None and expires <= time.time()
+
+    def get(self, key, default=None):
+        with self._lock:
+            try:
+                entry = self._data.pop(key)
+            except KeyError:
+                return default
+            if self._is_expired(entry):
+                return default
+            self._data[key] = entry
+            return entry[0]
+
+    def __setitem__(self, key, value):
+        expires = time.time() + self.ttl if self.ttl is not None else None
+        with self._lock:
+            self._data.pop(key, None)
+            self._data[key] = (value, expires)
+            while len(self._data) > self.max_size:
+                self._data.popitem(last=False)
+
+    def pop(self, key, default=None):
+        with self._lock:
+            try:
+                entry = self._data.pop(key)
+            except KeyError:
+                return default
+            if self._is_expired(entry):
+                return default
+            return entry[0]
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
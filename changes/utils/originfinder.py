@@ -2,11 +2,14 @@ from __future__ import absolute_import
 
 from collections import defaultdict
 
+from sqlalchemy.orm import joinedload
+
 from changes.config import db
 from changes.constants import Result, Status
 from changes.models.build import Build
 from changes.models.job import Job
 from changes.models.test import TestCase
+from changes.models.testfailurestreak import TestFailureStreak, get_streaks_since
 from changes.models.source import Source
 
 
@@ -21,13 +24,50 @@ def find_failure_origins(build, test_failures):
     """
     Attempt to find originating causes of failures.
 
-    Returns a mapping of {TestCase.name_sha: Job}.
-    """
-    project = build.project
+    Origins are read from the failure streaks of the project where they
+    cover `build`, and otherwise found by scanning the builds since the last
+    passing one.
 
+    Returns a mapping of {TestCase: Build}.
+    """
     if not test_failures:
         return {}
 
+    since = get_streaks_since(build.project_id)
+    if since is None or build.date_created < since:
+        return _scan_failure_origins(build, test_failures)
+
+    streaks = {s.name_sha: s for s in TestFailureStreak.query.options(
+        joinedload('first_build'),
+    ).filter(
+        TestFailureStreak.project_id == build.project_id,
+        TestFailureStreak.name_sha.in_(set(t.name_sha for t in test_failures)),
+    )}
+
+    failures_at_build = {}
+    unknown = []
+    for f_test in test_failures:
+        streak = streaks.get(f_test.name_sha)
+        if streak is None:
+            # the test hasn't failed in any commit build since `since`
+            failures_at_build[f_test] = build
+        elif streak.first_build and streak.first_build.date_created <= build.date_created:
+            failures_at_build[f_test] = streak.first_build
+        elif not streak.streak_length and streak.last_build_date < build.date_created:
+            # the streak has ended before this build
+            failures_at_build[f_test] = build
+        else:
+            # the failure is part of a streak that has since ended
+            unknown.append(f_test)
+
+    if unknown:
+        failures_at_build.update(_scan_failure_origins(build, unknown))
+    return failures_at_build
+
+
+def _scan_failure_origins(build, test_failures):
+    project = build.project
+
     # find any existing failures in the previous runs
     # to do this we first need to find the last passing job
     last_pass = Build.query.join(
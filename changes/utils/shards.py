@@ -1,50 +1,246 @@
 import heapq
+import math
 
+from bisect import bisect_left
 from flask import current_app
 from typing import Any, Callable, cast, Dict, List, Tuple, TypeVar  # NOQA
 
 
 Normalized = TypeVar('Normalized')
 
+# When shards have an overhead, use the fewest shards whose expected makespan
+# is within this fraction of the best one, as each extra shard costs its
+# overhead in machine time.
+SHARD_COUNT_TOLERANCE = 0.01
 
-def shard(objects, max_shards, object_stats, avg_time, normalize_object_name=cast(Callable[[str], Normalized], lambda x: x)):
-    # type: (List[str], int, Dict[Normalized, int], int, Callable[[str], Normalized]) -> List[Tuple[int, List[str]]]
+# Upper bound on the number of moves made to improve the greedy assignment.
+MAX_IMPROVEMENT_STEPS = 1000
+
+
+class _Shard(object):
+    __slots__ = ('mean', 'variance', 'objects')
+
+    def __init__(self):
+        self.mean = 0
+        self.variance = 0
+        # list of (mean, variance, name)
+        self.objects = []  # type: List[Tuple[float, float, str]]
+
+    def add(self, obj):
+        self.mean += obj[0]
+        self.variance += obj[1]
+        self.objects.append(obj)
+
+    def remove(self, obj):
+        self.mean -= obj[0]
+        self.variance -= obj[1]
+        self.objects.remove(obj)
+
+
+def _spread(num_shards):
+    # type: (int) -> float
+    """
+    The number of standard deviations above its mean that the slowest of
+    `num_shards` similar shards is expected to take (the usual upper bound on
+    the expected maximum of that many standard normal variables).
+    """
+    if num_shards < 2:
+        return 0.0
+    return math.sqrt(2 * math.log(num_shards))
+
+
+def _duration(mean, variance, spread, overhead):
+    # type: (float, float, float, float) -> float
+    return overhead + mean + spread * math.sqrt(max(variance, 0))
+
+
+def _assign(objects, num_shards, spread, overhead):
+    # type: (List[Tuple[float, float, str]], int, float, float) -> List[_Shard]
+    """
+    Assigns objects (longest first) to whichever shard is expected to finish
+    first.
+    """
+    shards = [_Shard() for _ in range(num_shards)]
+    heap = [(0.0, i) for i in range(num_shards)]
+    for obj in objects:
+        _, i = heapq.heappop(heap)
+        shards[i].add(obj)
+        heapq.heappush(heap, (_duration(shards[i].mean, shards[i].variance, spread, overhead), i))
+    return shards
+
+
+def _makespan(shards, spread, overhead):
+    # type: (List[_Shard], float, float) -> float
+    return max(_duration(s.mean, s.variance, spread, overhead) for s in shards)
+
+
+def _improve(shards, spread, overhead, max_steps=MAX_IMPROVEMENT_STEPS):
+    # type: (List[_Shard], float, float, int) -> None
+    """
+    Refines an assignment by repeatedly moving an object off the slowest
+    shard, or swapping it for a shorter one, as long as that shortens the
+    slowest shard without making another one slower than it was.
+    """
+    def duration(shard, add=None, remove=None):
+        mean, variance = shard.mean, shard.variance
+        if add is not None:
+            mean, variance = mean + add[0], variance + add[1]
+        if remove is not None:
+            mean, variance = mean - remove[0], variance - remove[1]
+        return _duration(mean, variance, spread, overhead)
+
+    for _ in xrange(max_steps):
+        durations = [duration(s) for s in shards]
+        worst = max(xrange(len(shards)), key=durations.__getitem__)
+        slowest = shards[worst]
+        target = durations[worst] * (1 - 1e-9)
+
+        best = None
+        for other in sorted(xrange(len(shards)), key=durations.__getitem__):
+            if other == worst:
+                continue
+            shard = shards[other]
+            # the gap we'd like to close by moving duration from the slowest
+            # shard to this one
+            gap = (durations[worst] - durations[other]) / 2
+            candidates = sorted(shard.objects)
+            candidate_means = [c[0] for c in candidates]
+            for obj in slowest.objects:
+                # move it
+                cost = max(duration(slowest, remove=obj), duration(shard, add=obj))
+                if cost < target and (best is None or cost < best[0]):
+                    best = (cost, obj, other, None)
+                # or swap it for the objects in this shard closest to the
+                # right size
+                i = bisect_left(candidate_means, obj[0] - gap)
+                for swap in candidates[max(i - 1, 0):i + 1]:
+                    if swap[0] >= obj[0]:
+                        continue
+                    cost = max(duration(slowest, add=swap, remove=obj),
+                               duration(shard, add=obj, remove=swap))
+                    if cost < target and (best is None or cost < best[0]):
+                        best = (cost, obj, other, swap)
+            if best is not None:
+                break
+
+        if best is None:
+            return
+
+        _, obj, other, swap = best
+        slowest.remove(obj)
+        shards[other].add(obj)
+        if swap is not None:
+            shards[other].remove(swap)
+            slowest.add(swap)
+
+
+def shard(objects, max_shards, object_stats, avg_time, normalize_object_name=cast(Callable[[str], Normalized], lambda x: x),
+          object_variances=None, shard_overhead=0):
+    # type: (List[str], int, Dict[Normalized, int], int, Callable[[str], Normalized], Dict[Normalized, float], int) -> List[Tuple[int, List[str]]]
     """
     Breaks a set of objects into shards.
 
+    The duration of each shard is modelled as the sum of the durations of its
+    objects (taken to be independent) plus a fixed overhead, and shards are
+    planned to minimize the expected makespan, i.e. the duration of the
+    slowest shard. Objects are first assigned greedily, longest first, and the
+    assignment is then improved by moving objects off the slowest shard.
+
     Args:
         objects (list): A list of object names.
         max_shards (int): Maximum amount of shards over which to distribute the objects.
-        test_stats (dict): A mapping from normalized object name to duration.
-        avg_test_time (int): Average duration of a single object.
+        object_stats (dict): A mapping from normalized object name to duration.
+        avg_time (int): Average duration of a single object.
         normalize_object_name (str -> Tuple[str, ...]): a function that normalizes object names.
-            This function can return anything, as long as it is consistent with `test_stats`.
+            This function can return anything, as long as it is consistent with `object_stats`.
+        object_variances (dict): A mapping from normalized object name to the
+            variance of its duration. Objects without one are given the
+            average variance.
+        shard_overhead (int): The time it takes to set up a shard. If given,
+            fewer than `max_shards` shards are used when more wouldn't
+            shorten the expected makespan.
 
     Returns:
         list: Shards. Each element is a pair containing the weight for that
             shard and the object names assigned to that shard.
     """
+    if not objects or max_shards < 1:
+        return []
+
+    object_variances = object_variances or {}
+    if object_variances:
+        avg_variance = sum(object_variances.itervalues()) / len(object_variances)
+    else:
+        avg_variance = 0
+
     def get_object_duration(test_name):
-        # type: (str) -> int
+        # type: (str) -> Tuple[int, float]
         normalized = normalize_object_name(test_name)
         result = object_stats.get(normalized)
         if result is None:
             if object_stats:
                 current_app.logger.info('No existing duration found for test %r', test_name)
             result = avg_time
-        return result
+        return result, object_variances.get(normalized, avg_variance)
+
+    weighted_objects = []
+    for name in objects:
+        duration, variance = get_object_duration(name)
+        weighted_objects.append((1 + duration, variance, name))
+    weighted_objects.sort(key=lambda x: (x[0], x[2]), reverse=True)
 
     # don't use more shards than there are objects
     num_shards = min(len(objects), max_shards)
-    # Each element is a pair (weight, objects).
-    groups = [(0, []) for _ in range(num_shards)]  # type: List[Tuple[int, List[str]]]
-    # Groups is already a proper heap, but we'll call this to guarantee it.
-    heapq.heapify(groups)
-    weighted_tests = [(get_object_duration(t), t) for t in objects]
-    for weight, test in sorted(weighted_tests, reverse=True):
-        group_weight, group_tests = heapq.heappop(groups)
-        group_weight += 1 + weight
-        group_tests.append(test)
-        heapq.heappush(groups, (group_weight, group_tests))
-
-    return groups
+    if num_shards and shard_overhead:
+        num_shards = _choose_shard_count(weighted_objects, num_shards, shard_overhead)
+
+    spread = _spread(num_shards)
+    shards = _assign(weighted_objects, num_shards, spread, shard_overhead)
+    _improve(shards, spread, shard_overhead)
+
+    return [
+        (int(round(s.mean)), [name for _, _, name in s.objects])
+        for s in shards
+    ]
+
+
+def _choose_shard_count(objects, max_shards, overhead):
+    # type: (List[Tuple[float, float, str]], int, float) -> int
+    """
+    Returns the fewest shards whose (greedy) expected makespan is within
+    SHARD_COUNT_TOLERANCE of the best one found with up to `max_shards`.
+
+    Rather than assigning the objects to every number of shards, the best
+    number is estimated from the total duration and variance of the objects,
+    and the fewest shards within tolerance of it are found by bisection, as
+    makespans only shrink with more shards up to the best number.
+    """
+    total = sum(obj[0] for obj in objects)
+    total_variance = max(sum(obj[1] for obj in objects), 0)
+    longest = objects[0][0]
+
+    def estimate(num_shards):
+        # as if the objects could be split evenly
+        return _duration(max(longest, total / float(num_shards)), total_variance / num_shards,
+                         _spread(num_shards), overhead)
+
+    makespans = {}  # type: Dict[int, float]
+
+    def makespan(num_shards):
+        if num_shards not in makespans:
+            spread = _spread(num_shards)
+            makespans[num_shards] = _makespan(_assign(objects, num_shards, spread, overhead), spread, overhead)
+        return makespans[num_shards]
+
+    estimated_best = min(xrange(1, max_shards + 1), key=estimate)
+    best = min((estimated_best, max_shards), key=lambda n: (makespan(n), n))
+    limit = makespan(best) * (1 + SHARD_COUNT_TOLERANCE)
+
+    low, high = 1, best
+    while low < high:
+        mid = (low + high) // 2
+        if makespan(mid) <= limit:
+            high = mid
+        else:
+            low = mid + 1
+    return high
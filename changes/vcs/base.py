@@ -7,7 +7,7 @@ import shutil
 import tempfile
 
 from subprocess import Popen, PIPE, check_call, CalledProcessError
-from typing import Any, List, Optional, Set, Union  # NOQA
+from typing import Any, Dict, List, Optional, Set, Tuple, Union  # NOQA
 
 from changes.constants import PROJECT_ROOT
 from changes.db.utils import create_or_update, get_or_create, try_create
@@ -16,6 +16,7 @@ from changes.models.revision import Revision
 from changes.models.source import Source
 from changes.config import statsreporter
 from changes.utils.diff_parser import DiffParser
+from changes.vcs.server import get_server
 
 from time import time
 
@@ -105,10 +106,13 @@ class BufferParser(object):
 class Vcs(object):
     ssh_connect_path = os.path.join(PROJECT_ROOT, 'bin', 'ssh-connect')
 
-    def __init__(self, path, url, username=None):
+    def __init__(self, path, url, username=None, command_server=False):
         self.path = path
         self.url = url
         self.username = username
+        # Whether reads should go through a pooled command server rather
+        # than a new process each (see changes.vcs.server).
+        self.command_server = command_server
 
         self._path_exists = None
 
@@ -155,6 +159,17 @@ class Vcs(object):
             raise CommandError(args[0], proc.returncode, stdout, stderr)
         return stdout
 
+    def _get_server(self, server_cls):
+        """Returns a context manager yielding a `server_cls` serving this repository."""
+        def start(args):
+            # Servers outlive the reads they're used for, so nothing would
+            # drain their error output, which could block them once a pipe
+            # buffer of it piled up.
+            with open(os.devnull, 'wb') as devnull:
+                return self._construct_subprocess([self.binary_path] + args, cwd=self.path,
+                                                  stderr=devnull)
+        return get_server(server_cls, self.path, start)
+
     @classmethod
     def get_repository_name(cls, repository_url):
         """
@@ -295,6 +310,14 @@ class Vcs(object):
         """Return the patch id for a given revision if git, else return None"""
         raise NotImplementedError
 
+    def get_patch_hashes(self, rev_shas):
+        # type: (List[str]) -> Dict[str, Union[str, None]]
+        """Return a dict of revision to patch id for the given revisions.
+
+        Backends that can compute many patch ids at once should override this.
+        """
+        return {rev_sha: self.get_patch_hash(rev_sha) for rev_sha in rev_shas}
+
     def _selectively_apply_diff(self, file_path, file_content, diff):
         """A helper function that takes a diff, extract the parts of the diff
         relating to `file_path`, and apply it to `file_content`.
@@ -361,6 +384,17 @@ class Vcs(object):
         return patched_content
 
 
+def parse_author(value):
+    # type: (str) -> Tuple[str, str]
+    """Return the name and email of an author string like 'Name <email>'."""
+    match = re.match(r'^(.+) <([^>]+)>$', value)
+    if not match:
+        if '@' in value:
+            return value, value
+        return value, '{0}@localhost'.format(value)
+    return match.group(1), match.group(2)
+
+
 class RevisionResult(object):
     parents = None  # type: List[str]
     branches = None  # type: List[str]
@@ -383,14 +417,7 @@ class RevisionResult(object):
             type(self).__name__, self.id, self.author, self.subject)
 
     def _get_author(self, value):
-        match = re.match(r'^(.+) <([^>]+)>$', value)
-        if not match:
-            if '@' in value:
-                name, email = value, value
-            else:
-                name, email = value, '{0}@localhost'.format(value)
-        else:
-            name, email = match.group(1), match.group(2)
+        name, email = parse_author(value)
 
         author, _ = get_or_create(Author, where={
             'email': email,
@@ -2,7 +2,7 @@ from __future__ import absolute_import, division, print_function
 
 from datetime import datetime
 from urlparse import urlparse
-from typing import Any, Optional  # NOQA
+from typing import Any, Dict, List, Optional, Tuple  # NOQA
 
 from changes.utils.cache import memoize
 from changes.utils.http import build_patch_uri
@@ -11,6 +11,7 @@ from .base import (
     Vcs, RevisionResult, BufferParser, ConcurrentUpdateError, CommandError,
     ContentReadError, MissingFileError, UnknownChildRevision, UnknownParentRevision, UnknownRevision,
 )
+from .server import GitCatFileServer
 
 import re
 from time import time
@@ -373,21 +374,11 @@ class GitVcs(Vcs):
                 links to something outside the tree, links to an absent file, or links to itself.
             UnknownRevision - if revision doesn't seem to exist
         """
-        cmd = ['cat-file', '--batch', '--follow-symlinks']
         obj_key = '{revision}:{file_path}'.format(revision=sha, file_path=file_path)
-        content = self.run(cmd, input=obj_key)
-        info, content = content.split('\n', 1)
+        info, content = self._cat_file(obj_key)
         if info.endswith('missing'):
             # either revision is missing or file is missing
-            try:
-                # will raise CommandError if revision is missing
-                self.run(['cat-file', 'commit', sha])
-            except CommandError as e:
-                raise UnknownRevision(
-                    cmd=e.cmd,
-                    retcode=e.retcode,
-                    stdout=e.stdout,
-                    stderr=e.stderr)
+            self._check_commit_exists(sha)
             # file could have been added in the patch
             if diff is not None:
                 content = self._selectively_apply_diff(file_path, '', diff)
@@ -407,6 +398,43 @@ class GitVcs(Vcs):
 
         return self._selectively_apply_diff(file_path, content, diff)
 
+    def _cat_file(self, obj_key):
+        # type: (str) -> Tuple[str, str]
+        """Returns the info line and the content (with its trailing newline)
+        that `git cat-file --batch --follow-symlinks` prints for `obj_key`."""
+        if not self.command_server:
+            output = self.run(['cat-file', '--batch', '--follow-symlinks'], input=obj_key)
+            info, content = output.split('\n', 1)
+            return info, content
+
+        start_time = time()
+        with self._get_server(GitCatFileServer) as server:
+            result = server.read(obj_key)
+        self.log_timing('cat_file', start_time)
+        return result
+
+    def _check_commit_exists(self, sha):
+        """Raises UnknownRevision if `sha` isn't a commit in this repository."""
+        if not self.command_server:
+            try:
+                # will raise CommandError if revision is missing
+                self.run(['cat-file', 'commit', sha])
+            except CommandError as e:
+                raise UnknownRevision(
+                    cmd=e.cmd,
+                    retcode=e.retcode,
+                    stdout=e.stdout,
+                    stderr=e.stderr)
+            return
+
+        info, _ = self._cat_file('{}^{{commit}}'.format(sha))
+        if info.endswith(('missing', 'ambiguous')):
+            raise UnknownRevision(
+                cmd=GitCatFileServer.args,
+                retcode=128,
+                stdout=info,
+                stderr='')
+
     def get_patch_hash(self, rev_sha):
         # type: (str) -> str
         """Get the patch id for the revision"""
@@ -419,3 +447,35 @@ class GitVcs(Vcs):
 
         # There is also a commit id string that follows the patch id, which we want to throw away.
         return self._execute_subproccess(p_patch, patch_cmd).split(' ')[0]
+
+    def get_patch_hashes(self, rev_shas):
+        # type: (List[str]) -> Dict[str, str]
+        """Get the patch ids of many revisions with a single log piped to patch-id.
+
+        Unlike get_patch_hash, root revisions get the patch id of their whole
+        tree, and revisions with an empty diff are left out.
+        """
+        start_time = time()
+
+        # Diffs merges against their first parent, as get_patch_hash does. The
+        # shas go through stdin as there may be too many for the command line.
+        log_cmd = [self.binary_path, 'log', '--stdin', '--no-walk=unsorted', '-p', '-m',
+                   '--first-parent', '--format=commit %H']
+        p_log = self._construct_subprocess(log_cmd, cwd=self.path)
+        patch_cmd = [self.binary_path, 'patch-id', '--stable']
+        p_patch = self._construct_subprocess(patch_cmd, stdin=p_log.stdout, cwd=self.path)
+
+        p_log.stdout.close()
+        p_log.stdin.write(''.join(rev_sha + '\n' for rev_sha in rev_shas))
+        p_log.stdin.close()
+
+        output = self._execute_subproccess(p_patch, patch_cmd)
+        p_log.wait()
+
+        results = {}
+        for line in output.splitlines():
+            patch_hash, rev_sha = line.split(' ')
+            results[rev_sha] = patch_hash
+
+        self.log_timing('get_patch_hashes', start_time)
+        return results
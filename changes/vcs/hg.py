@@ -9,10 +9,15 @@ from typing import Any, Optional  # NOQA
 from changes.utils.http import build_patch_uri
 
 from .base import Vcs, RevisionResult, BufferParser, CommandError, UnknownRevision
+from .server import HgCommandServer
 
 import logging
 
 
+# Commands that only read from the repository, and so can be run by a
+# command server.
+READ_COMMANDS = frozenset(['branches', 'cat', 'debugancestor', 'diff', 'log', 'status'])
+
 LOG_FORMAT = '{node}\x01{author}\x01{date|rfc822date}\x01{p1node} {p2node}\x01{branches}\x01{desc}\x02'
 
 BASH_CLONE_STEP = """
@@ -81,12 +86,14 @@ class MercurialVcs(Vcs):
         return url
 
     def run(self, cmd, **kwargs):
-        cmd = [
-            self.binary_path,
-            '--config',
-            'ui.ssh={0}'.format(self.ssh_connect_path)
-        ] + cmd
         try:
+            if self.command_server and cmd[0] in READ_COMMANDS and not kwargs:
+                return self._run_on_server(cmd)
+            cmd = [
+                self.binary_path,
+                '--config',
+                'ui.ssh={0}'.format(self.ssh_connect_path)
+            ] + cmd
             return super(MercurialVcs, self).run(cmd, **kwargs)
         except CommandError as e:
             if "abort: unknown revision '" in e.stderr:
@@ -98,6 +105,15 @@ class MercurialVcs(Vcs):
                 )
             raise
 
+    def _run_on_server(self, cmd):
+        start_time = time()
+        with self._get_server(HgCommandServer) as server:
+            retcode, stdout, stderr = server.runcommand(cmd)
+        self.log_timing(cmd[0], start_time)
+        if retcode != 0:
+            raise CommandError([self.binary_path] + cmd, retcode, stdout, stderr)
+        return stdout
+
     def clone(self):
         self.run(['clone', self.remote_url, self.path], cwd='/')
 
@@ -0,0 +1,193 @@
+"""
+Long-lived processes that serve reads from a local repository, so that those
+reads don't each fork a new git or hg process.
+
+Servers are pooled per process and per repository path (see `get_server`),
+and each is used by one thread at a time. A server that fails to speak its
+protocol is closed and dropped from the pool, and a fresh one is started the
+next time it's needed.
+"""
+
+from __future__ import absolute_import
+
+import atexit
+import os
+import struct
+import threading
+
+from collections import defaultdict
+from contextlib import contextmanager
+
+# Number of idle servers to keep for each repository.
+MAX_IDLE_SERVERS = 4
+
+_pool_lock = threading.Lock()
+_idle_servers = defaultdict(list)
+
+
+class CommandServerError(Exception):
+    """Indicates that a command server stopped speaking its protocol."""
+    pass
+
+
+class CommandServer(object):
+    def __init__(self, proc):
+        self.proc = proc
+        self.closed = False
+        # Servers can only be used by the process that started them, and not
+        # by processes forked from it.
+        self.owner_pid = os.getpid()
+
+    def close(self):
+        if self.closed:
+            return
+        self.closed = True
+        if self.owner_pid != os.getpid():
+            return
+        try:
+            self.proc.stdin.close()
+        except IOError:
+            pass
+        self.proc.wait()
+
+    def _read(self, size):
+        data = self.proc.stdout.read(size)
+        if len(data) != size:
+            raise CommandServerError('Unexpected end of output')
+        return data
+
+    def _readline(self):
+        line = self.proc.stdout.readline()
+        if not line.endswith('\n'):
+            raise CommandServerError('Unexpected end of output')
+        return line[:-1]
+
+
+class GitCatFileServer(CommandServer):
+    """
+    `git cat-file --batch --follow-symlinks`, which prints the objects named
+    on its input.
+    """
+    args = ['cat-file', '--batch', '--follow-symlinks']
+
+    def read(self, obj_key):
+        """
+        Returns the info line printed for `obj_key` (like "<sha> blob <size>"
+        or "<obj_key> missing") and the content that follows it, including
+        its trailing newline, as `git cat-file --batch` prints them.
+        """
+        assert '\n' not in obj_key
+        self.proc.stdin.write(obj_key + '\n')
+        self.proc.stdin.flush()
+
+        info = self._readline()
+        parts = info.split(' ')
+        if parts[-1] in ('missing', 'ambiguous'):
+            return info, ''
+        try:
+            size = int(parts[-1])
+        except ValueError:
+            raise CommandServerError('Unrecognized output: {!r}'.format(info))
+        return info, self._read(size + 1)
+
+
+class HgCommandServer(CommandServer):
+    """
+    `hg serve --cmdserver pipe`, which runs hg commands sent to it and
+    multiplexes their output over channels.
+    """
+    args = ['serve', '--cmdserver', 'pipe']
+
+    def __init__(self, proc):
+        super(HgCommandServer, self).__init__(proc)
+        channel, hello = self._read_channel()
+        if channel != 'o' or 'runcommand' not in hello:
+            raise CommandServerError('Unexpected hello: {!r}'.format(hello))
+
+    def _read_channel(self):
+        channel, length = struct.unpack('>cI', self._read(5))
+        if channel in ('I', 'L'):
+            # a request for input, whose length is the most it wants
+            return channel, length
+        return channel, self._read(length)
+
+    def runcommand(self, args):
+        """
+        Runs the hg command `args` and returns its return code, output and
+        error output.
+        """
+        data = '\0'.join(args)
+        self.proc.stdin.write('runcommand\n' + struct.pack('>I', len(data)) + data)
+        self.proc.stdin.flush()
+
+        stdout = []
+        stderr = []
+        while True:
+            channel, data = self._read_channel()
+            if channel == 'o':
+                stdout.append(data)
+            elif channel == 'e':
+                stderr.append(data)
+            elif channel == 'r':
+                retcode, = struct.unpack('>i', data)
+                return retcode, ''.join(stdout), ''.join(stderr)
+            elif channel in ('I', 'L'):
+                # reads shouldn't need input; give it none
+                self.proc.stdin.write(struct.pack('>I', 0))
+                self.proc.stdin.flush()
+            elif channel.isupper():
+                raise CommandServerError('Unsupported channel {!r}'.format(channel))
+
+
+@contextmanager
+def get_server(server_cls, path, start):
+    """
+    Yields an idle `server_cls` for the repository at `path`, starting one
+    with `start(args)` (which returns a Popen running the server's `args`)
+    if there are none, and puts it back in the pool afterwards.
+    """
+    key = (server_cls, path)
+    pid = os.getpid()
+    with _pool_lock:
+        servers = _idle_servers[key]
+        while servers and servers[-1].owner_pid != pid:
+            servers.pop()
+        server = servers.pop() if servers else None
+    if server is None:
+        proc = start(server_cls.args)
+        try:
+            server = server_cls(proc)
+        except Exception:
+            proc.kill()
+            proc.wait()
+            raise
+
+    try:
+        yield server
+    except (CommandServerError, IOError):
+        server.close()
+        raise
+    finally:
+        if not server.closed:
+            with _pool_lock:
+                servers = _idle_servers[key]
+                if len(servers) < MAX_IDLE_SERVERS:
+                    servers.append(server)
+                    server = None
+            if server is not None:
+                server.close()
+
+
+def close_servers():
+    """
+    Closes all the idle servers, e.g. when exiting. Servers inherited from a
+    parent process are only dropped, as they're still the parent's.
+    """
+    with _pool_lock:
+        servers = [s for ss in _idle_servers.itervalues() for s in ss]
+        _idle_servers.clear()
+    for server in servers:
+        server.close()
+
+
+atexit.register(close_servers)
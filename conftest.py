@@ -14,6 +14,8 @@ from sqlalchemy.orm import Session
 alembic_cfg = Config(os.path.join(root, 'alembic.ini'))
 
 from changes.config import create_app, db
+from changes.lib import project_config_cache
+from changes.models.jobplan import JobPlan
 from changes.storage.mock import FileStorageCache
 
 
@@ -100,3 +102,5 @@ def redis_session(request, app):
 
 def pytest_runtest_setup(item):
     FileStorageCache.clear()
+    JobPlan.invalidate_build_step_cache()
+    project_config_cache.clear_local_cache()
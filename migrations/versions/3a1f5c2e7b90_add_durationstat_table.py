@@ -0,0 +1,33 @@
+"""add durationstat table
+
+Revision ID: 3a1f5c2e7b90
+Revises: 1164433ae5c9
+Create Date: 2016-10-12 14:02:31.419552
+
+"""
+
+# revision identifiers, used by Alembic.
+revision = '3a1f5c2e7b90'
+down_revision = '1164433ae5c9'
+
+from alembic import op
+import sqlalchemy as sa
+
+
+def upgrade():
+    op.create_table('durationstat',
+        sa.Column('project_id', sa.GUID(), nullable=False),
+        sa.Column('type', sa.Enum(), nullable=False),
+        sa.Column('name_md5', sa.String(length=32), nullable=False),
+        sa.Column('name', sa.Text(), nullable=False),
+        sa.Column('mean', sa.Float(), nullable=False),
+        sa.Column('variance', sa.Float(), nullable=False),
+        sa.Column('sample_count', sa.Integer(), nullable=False),
+        sa.Column('date_modified', sa.DateTime(), nullable=False),
+        sa.ForeignKeyConstraint(['project_id'], ['project.id'], ondelete='CASCADE'),
+        sa.PrimaryKeyConstraint('project_id', 'type', 'name_md5')
+    )
+
+
+def downgrade():
+    op.drop_table('durationstat')
@@ -0,0 +1,34 @@
+"""add logsegment table
+
+Revision ID: 4d2b6e1c8a31
+Revises: 3a1f5c2e7b90
+Create Date: 2016-10-13 11:24:05.218734
+
+"""
+
+# revision identifiers, used by Alembic.
+revision = '4d2b6e1c8a31'
+down_revision = '3a1f5c2e7b90'
+
+from alembic import op
+import sqlalchemy as sa
+
+
+def upgrade():
+    op.add_column('logsource', sa.Column('date_compacted', sa.DateTime(), nullable=True))
+    op.create_table('logsegment',
+        sa.Column('id', sa.GUID(), nullable=False),
+        sa.Column('source_id', sa.GUID(), nullable=False),
+        sa.Column('offset', sa.Integer(), nullable=False),
+        sa.Column('size', sa.Integer(), nullable=False),
+        sa.Column('data', sa.LargeBinary(), nullable=False),
+        sa.Column('date_created', sa.DateTime(), nullable=True),
+        sa.ForeignKeyConstraint(['source_id'], ['logsource.id'], ondelete='CASCADE'),
+        sa.PrimaryKeyConstraint('id'),
+        sa.UniqueConstraint('source_id', 'offset', name='unq_logsegment_source_offset')
+    )
+
+
+def downgrade():
+    op.drop_table('logsegment')
+    op.drop_column('logsource', 'date_compacted')
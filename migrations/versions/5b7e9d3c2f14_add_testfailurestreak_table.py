@@ -0,0 +1,33 @@
+"""add testfailurestreak table
+
+Revision ID: 5b7e9d3c2f14
+Revises: 4d2b6e1c8a31
+Create Date: 2016-10-14 10:37:52.614103
+
+"""
+
+# revision identifiers, used by Alembic.
+revision = '5b7e9d3c2f14'
+down_revision = '4d2b6e1c8a31'
+
+from alembic import op
+import sqlalchemy as sa
+
+
+def upgrade():
+    op.create_table('testfailurestreak',
+        sa.Column('project_id', sa.GUID(), nullable=False),
+        sa.Column('name_sha', sa.String(length=40), nullable=False),
+        sa.Column('first_build_id', sa.GUID(), nullable=True),
+        sa.Column('streak_length', sa.Integer(), nullable=False),
+        sa.Column('last_pass_build_id', sa.GUID(), nullable=True),
+        sa.Column('last_build_date', sa.DateTime(), nullable=False),
+        sa.ForeignKeyConstraint(['project_id'], ['project.id'], ondelete='CASCADE'),
+        sa.ForeignKeyConstraint(['first_build_id'], ['build.id'], ondelete='SET NULL'),
+        sa.ForeignKeyConstraint(['last_pass_build_id'], ['build.id'], ondelete='SET NULL'),
+        sa.PrimaryKeyConstraint('project_id', 'name_sha')
+    )
+
+
+def downgrade():
+    op.drop_table('testfailurestreak')
@@ -1,6 +1,14 @@
 import mock
 
+from datetime import datetime
+from flask import current_app
+
 from changes.api.serializer import Crumbler, serialize
+from changes.api.serializer import cache as crumble_cache
+from changes.api.serializer.models.build import BuildCrumbler
+from changes.config import db
+from changes.constants import Status
+from changes.models.failurereason import FailureReason
 from changes.testutils import TestCase
 
 
@@ -152,3 +160,77 @@ class SerializeTest(TestCase):
         # crumble() will actually get called twice here. The assumption is that
         # crumble() itself is cheap, while get_extra_attrs_from_db() is not.
         self._assert_crumble_called_for(bar_crumbler, [item1, item1])
+
+
+class CrumbleCacheTest(TestCase):
+    def setUp(self):
+        super(CrumbleCacheTest, self).setUp()
+        crumble_cache.clear_local_cache()
+        patcher = mock.patch.dict(current_app.config, {'SERIALIZER_CACHE_ENABLED': True})
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        self.addCleanup(crumble_cache.clear_local_cache)
+
+    def test_finished_build(self):
+        project = self.create_project()
+        build = self.create_build(
+            project, status=Status.finished, date_modified=datetime(2016, 1, 1))
+
+        expected = serialize(build)
+
+        with mock.patch.object(BuildCrumbler, 'crumble') as crumble:
+            # from the in-process cache
+            assert serialize([build]) == [expected]
+            # and from redis
+            crumble_cache.clear_local_cache()
+            assert serialize(build) == expected
+            assert not crumble.called
+
+            build.date_modified = datetime(2016, 1, 2)
+            crumble.return_value = {'id': build.id.hex}
+            assert serialize(build) == {'id': build.id.hex}
+            assert crumble.call_count == 1
+
+    def test_subclass_not_cached(self):
+        class _BuildCrumbler(BuildCrumbler):
+            pass
+
+        project = self.create_project()
+        build = self.create_build(
+            project, status=Status.finished, date_modified=datetime(2016, 1, 1))
+
+        assert crumble_cache.get_cache_key(BuildCrumbler(), build) is not None
+        assert crumble_cache.get_cache_key(_BuildCrumbler(), build) is None
+
+    def test_failure_reason_of_finished_build(self):
+        project = self.create_project()
+        build = self.create_build(
+            project, status=Status.finished, date_modified=datetime(2016, 1, 1))
+        job = self.create_job(build, status=Status.finished)
+        jobstep = self.create_jobstep(self.create_jobphase(job))
+
+        assert serialize(build)['failures'] == []
+
+        db.session.add(FailureReason(
+            step_id=jobstep.id,
+            job_id=job.id,
+            build_id=build.id,
+            project_id=project.id,
+            reason='missing_artifact',
+        ))
+        db.session.commit()
+
+        db.session.expire(build)
+        assert build.date_modified > datetime(2016, 1, 1)
+        assert [f['id'] for f in serialize(build)['failures']] == ['missing_artifact']
+
+    def test_unfinished_build(self):
+        project = self.create_project()
+        build = self.create_build(project, status=Status.in_progress)
+
+        serialize(build)
+
+        with mock.patch.object(BuildCrumbler, 'crumble') as crumble:
+            crumble.return_value = {'id': build.id.hex}
+            assert serialize(build) == {'id': build.id.hex}
+            assert crumble.call_count == 1
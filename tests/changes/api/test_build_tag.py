@@ -1,5 +1,9 @@
 import json
 
+from datetime import datetime
+
+from changes.config import db
+from changes.constants import Status
 from changes.testutils import APITestCase
 
 NONE = None
@@ -45,6 +49,16 @@ class BuildTagTest(APITestCase):
                 else:
                     assert data['tags'] == tag_list_update
 
+    def test_set_tags_updates_modified(self):
+        project = self.create_project()
+        build = self.create_build(project, status=Status.finished, date_modified=datetime(2016, 1, 1))
+
+        self.client.post(PATH.format(build.id.hex), data={'tags': json.dumps(ONE_TAG)})
+
+        db.session.expire(build)
+        # so that cached serialized forms of the build aren't used
+        assert build.date_modified > datetime(2016, 1, 1)
+
     def test_bad_tag_format(self):
         project = self.create_project()
 
@@ -0,0 +1,78 @@
+from uuid import uuid4
+
+from changes.constants import Result
+from changes.jobs.sync_build import aggregate_build_stats
+from changes.jobs.sync_job import aggregate_job_stats
+from changes.models.testresult import TestResult, TestResultManager
+from changes.testutils import APITestCase
+
+
+class BuildTestIndexCountsTest(APITestCase):
+    def test_missing(self):
+        path = '/api/0/builds/{0}/tests/counts'.format(uuid4().hex)
+
+        resp = self.client.get(path)
+        assert resp.status_code == 404
+
+    def test_counted_from_tests(self):
+        project = self.create_project()
+        build = self.create_build(project)
+        job = self.create_job(build)
+        self.create_test(job, result=Result.passed)
+        self.create_test(job, result=Result.passed)
+        self.create_test(job, result=Result.failed)
+
+        path = '/api/0/builds/{0}/tests/counts'.format(build.id.hex)
+
+        resp = self.client.get(path)
+        assert resp.status_code == 200
+        data = self.unserialize(resp)
+        assert data['passed'] == 2
+        assert data['failed'] == 1
+        assert data['skipped'] == 0
+        assert sorted(data) == sorted(result.name for result in Result)
+
+    def test_from_stats(self):
+        project = self.create_project()
+        build = self.create_build(project)
+        job = self.create_job(build)
+        jobphase = self.create_jobphase(job)
+        jobstep = self.create_jobstep(jobphase)
+        artifact = self.create_artifact(jobstep, 'junit.xml')
+
+        TestResultManager(jobstep, artifact).save([
+            TestResult(step=jobstep, name='test_a', result=Result.passed),
+            TestResult(step=jobstep, name='test_b', result=Result.skipped),
+            TestResult(step=jobstep, name='test_c', result=Result.skipped),
+        ])
+        aggregate_job_stats(job)
+        aggregate_build_stats(build)
+
+        # stats are used as-is, without counting tests
+        self.create_test(job, result=Result.failed)
+
+        path = '/api/0/builds/{0}/tests/counts'.format(build.id.hex)
+
+        resp = self.client.get(path)
+        assert resp.status_code == 200
+        data = self.unserialize(resp)
+        assert data['passed'] == 1
+        assert data['skipped'] == 2
+        assert data['failed'] == 0
+        assert sorted(data) == sorted(result.name for result in Result)
+
+    def test_stats_without_result_counts(self):
+        project = self.create_project()
+        build = self.create_build(project)
+        job = self.create_job(build)
+        self.create_test(job, result=Result.failed)
+        # stats recorded before result counts were
+        self.create_itemstat(build.id, 'test_count', 1)
+
+        path = '/api/0/builds/{0}/tests/counts'.format(build.id.hex)
+
+        resp = self.client.get(path)
+        assert resp.status_code == 200
+        data = self.unserialize(resp)
+        assert data['failed'] == 1
+        assert data['passed'] == 0
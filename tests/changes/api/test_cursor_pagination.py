@@ -1,9 +1,13 @@
 import json
 import re
 
+from base64 import urlsafe_b64encode
+from datetime import datetime, timedelta
+
 from changes.testutils import TestCase
 
 from changes.api.base import APIView
+from changes.models.build import Build
 
 
 class FakePaginationAPIView(APIView):
@@ -16,6 +20,15 @@ class FakePaginationAPIView(APIView):
             fake_request=fake_request)
 
 
+class FakeKeysetPaginationAPIView(APIView):
+
+    def get(self, project, fake_request=None):
+        return self.cursor_paginate(
+            Build.query.filter(Build.project_id == project.id),
+            sort_keys=[Build.date_created, Build.id],
+            fake_request=fake_request or {})
+
+
 class APIClientTest(TestCase):
     """
     Tests for cursor pagination. Things we want to verify:
@@ -43,6 +56,9 @@ class APIClientTest(TestCase):
       - Verify return code 400
     """
 
+    def encode_cursor(self, values):
+        return urlsafe_b64encode(json.dumps(values))
+
     def decode_response(self, response):
         assert int(response.status_code) == 200
 
@@ -131,3 +147,78 @@ class APIClientTest(TestCase):
 
         response = fake_api.get(80, fake_request={'after': 'BLAHBLAH'})
         assert int(response[1]) == 400
+
+    def test_keyset_navigation(self):
+        project = self.create_project()
+        now = datetime(2014, 1, 1)
+        builds = [
+            self.create_build(project, date_created=now - timedelta(minutes=i))
+            for i in range(60)
+        ]
+        # two builds created at the same time are told apart by their id
+        builds.append(self.create_build(project, date_created=builds[30].date_created))
+        builds.sort(key=lambda b: (b.date_created, b.id), reverse=True)
+        build_ids = [b.id.hex for b in builds]
+
+        fake_api = FakeKeysetPaginationAPIView()
+
+        def get_ids(**fake_request):
+            data, nav, _ = self.decode_response(fake_api.get(project, fake_request))
+            return [b['id'] for b in data], nav
+
+        page1, page1_nav = get_ids()
+        assert page1 == build_ids[:25]
+        assert 'before' not in page1_nav
+        assert 'after' in page1_nav
+
+        page2, page2_nav = get_ids(after=page1_nav['after'])
+        assert page2 == build_ids[25:50]
+        assert 'before' in page2_nav
+        assert 'after' in page2_nav
+
+        page3, page3_nav = get_ids(after=page2_nav['after'])
+        assert page3 == build_ids[50:]
+        assert 'before' in page3_nav
+        assert 'after' not in page3_nav
+
+        page2_v2, page2_v2_nav = get_ids(before=page3_nav['before'])
+        assert page2_v2 == page2
+        assert page2_v2_nav == page2_nav
+
+        page1_v2, page1_v2_nav = get_ids(before=page2_nav['before'])
+        assert page1_v2 == page1
+        assert page1_v2_nav == page1_nav
+
+        # smaller pages seek back from the cursor too
+        page1_v3, page1_v3_nav = get_ids(per_page=10, before=page2_nav['before'])
+        assert page1_v3 == build_ids[15:25]
+
+        # paging back past the start returns a full first page
+        page1_v4, page1_v4_nav = get_ids(per_page=30, before=page2_nav['before'])
+        assert page1_v4 == build_ids[:30]
+        assert 'before' not in page1_v4_nav
+
+        everything, _ = get_ids(per_page=0)
+        assert everything == build_ids
+
+    def test_keyset_bad_param(self):
+        project = self.create_project()
+        self.create_build(project)
+
+        fake_api = FakeKeysetPaginationAPIView()
+
+        for token in ('BLAHBLAH', self.encode_cursor(['2014-01-01T00:00:00', 'nothex']),
+                      self.encode_cursor([1, 2]), self.encode_cursor(['2014-01-01T00:00:00'])):
+            response = fake_api.get(project, fake_request={'after': token})
+            assert int(response[1]) == 400
+
+    def test_keyset_past_end(self):
+        project = self.create_project()
+        build = self.create_build(project)
+
+        fake_api = FakeKeysetPaginationAPIView()
+
+        cursor = self.encode_cursor([build.date_created.isoformat(), build.id.hex])
+        data, nav, _ = self.decode_response(fake_api.get(project, fake_request={'after': cursor}))
+        assert data == []
+        assert nav == {}
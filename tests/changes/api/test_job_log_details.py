@@ -1,5 +1,6 @@
 from changes.config import db
-from changes.models.log import LogSource, LogChunk
+from changes.jobs.compact_logs import compact_log
+from changes.models.log import LOG_CHUNK_SIZE, LogSource, LogChunk
 from changes.testutils import APITestCase
 
 
@@ -61,3 +62,40 @@ class JobLogDetailsTest(APITestCase):
         assert resp.status_code == 200
         assert resp.headers['Content-Type'] == 'text/plain; charset=utf-8'
         assert resp.data == lc1.text + lc2.text
+
+    def test_compacted(self):
+        project = self.create_project()
+        build = self.create_build(project)
+        job = self.create_job(build)
+        source = LogSource(job=job, project=project, name='test')
+        db.session.add(source)
+        text = ''.join(chr(ord('a') + i % 26) * 1000 for i in xrange(40))
+        for offset in xrange(0, len(text), LOG_CHUNK_SIZE):
+            db.session.add(LogChunk(
+                job=job, project=project, source=source, offset=offset,
+                size=len(text[offset:offset + LOG_CHUNK_SIZE]),
+                text=text[offset:offset + LOG_CHUNK_SIZE],
+            ))
+        db.session.commit()
+
+        path = '/api/0/jobs/{0}/logs/{1}/'.format(job.id.hex, source.id.hex)
+        params = ['', '?limit=10000', '?offset=100&limit=10000', '?offset=0', '?raw=1', '?raw=1&offset=9000']
+
+        def get_all():
+            results = []
+            for query in params:
+                resp = self.client.get(path + query)
+                assert resp.status_code == 200
+                if 'raw' in query:
+                    results.append(resp.data)
+                else:
+                    data = self.unserialize(resp)
+                    results.append((data['nextOffset'], [
+                        (c['offset'], c['size'], c['text']) for c in data['chunks']
+                    ]))
+            return results
+
+        expected = get_all()
+        compact_log(source)
+        assert source.date_compacted is not None
+        assert get_all() == expected
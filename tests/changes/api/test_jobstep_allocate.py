@@ -4,12 +4,14 @@ import json
 
 import mock
 from datetime import datetime
+from flask import current_app
 from urllib import urlencode
 
 from changes.testutils import APITestCase
 from changes.buildsteps.base import BuildStep
 from changes.constants import Status
 from changes.ext.redis import UnableToGetLock
+from changes.models.build import BuildPriority
 
 
 class JobStepAllocateTest(APITestCase):
@@ -219,3 +221,42 @@ class JobStepAllocateTest(APITestCase):
         resp = self.get(cluster='foo')
         assert resp.status_code == 200
         assert self.unserialize(resp) == {'jobsteps': []}, resp.data
+
+
+class JobStepAllocateQueueTest(JobStepAllocateTest):
+    def setUp(self):
+        super(JobStepAllocateQueueTest, self).setUp()
+        patcher = mock.patch.dict(current_app.config, {'JOBSTEP_ALLOCATION_QUEUE_ENABLED': True})
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def test_project_limit(self):
+        project = self.create_project()
+        other_project = self.create_project()
+        for _ in xrange(10):
+            build = self.create_build(project)
+            self.create_job(build, status=Status.in_progress)
+
+        build = self.create_build(project, priority=BuildPriority.high)
+        job = self.create_job(build)
+        jobstep_capped = self.create_jobstep(
+            self.create_jobphase(job), status=Status.pending_allocation)
+        build = self.create_build(other_project)
+        job = self.create_job(build)
+        jobstep_other = self.create_jobstep(
+            self.create_jobphase(job), status=Status.pending_allocation)
+
+        with mock.patch('changes.api.jobstep_allocate.JobPlan.get_build_step_for_job') as get_build_step:
+            get_build_step.return_value = (None, mock.Mock(spec=BuildStep))
+            get_build_step.return_value[1].get_resource_limits.return_value = {}
+            get_build_step.return_value[1].get_allocation_command.return_value = 'echo'
+
+            resp = self.get(limit=1)
+            assert resp.status_code == 200
+            assert [j['id'] for j in self.unserialize(resp)['jobsteps']] == [jobstep_other.id.hex]
+
+            # burst once nothing else is available
+            resp = self.get(limit=2)
+            assert resp.status_code == 200
+            assert [j['id'] for j in self.unserialize(resp)['jobsteps']] == [
+                jobstep_other.id.hex, jobstep_capped.id.hex]
@@ -1,11 +1,23 @@
+import json
+
+from datetime import datetime
+from flask import current_app
+from mock import patch
 from uuid import uuid4
 
 from changes.config import db
 from changes.constants import Result, Status
-from changes.testutils import APITestCase
+from changes.lib import heartbeats
+from changes.models.jobstep import JobStep
+from changes.testutils import APITestCase, override_config
 
 
 class JobStepHeartbeatTest(APITestCase):
+    def enable_adaptive_polling(self):
+        patcher = patch.dict(current_app.config, {'SYNC_JOB_STEP_ADAPTIVE_POLLING': True})
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
     def test_invalid_id(self):
         path = '/api/0/jobsteps/{0}/heartbeat/'.format(uuid4().hex)
 
@@ -32,3 +44,92 @@ class JobStepHeartbeatTest(APITestCase):
 
         resp = self.client.post(path)
         assert resp.status_code == 410
+
+    @patch('changes.api.jobstep_heartbeat.wake_sync_job_step')
+    def test_wakes_on_first_heartbeat(self, wake_sync_job_step):
+        self.enable_adaptive_polling()
+        project = self.create_project()
+        build = self.create_build(project)
+        job = self.create_job(build)
+        jobphase = self.create_jobphase(job)
+        jobstep = self.create_jobstep(
+            jobphase, status=Status.queued, result=Result.unknown,
+            date_started=None, date_finished=None)
+
+        path = '/api/0/jobsteps/{0}/heartbeat/'.format(jobstep.id.hex)
+
+        resp = self.client.post(path)
+        assert resp.status_code == 200
+        assert wake_sync_job_step.call_count == 1
+
+        resp = self.client.post(path)
+        assert resp.status_code == 200
+        assert wake_sync_job_step.call_count == 1
+
+    @patch('changes.api.jobstep_heartbeat.wake_sync_job_step')
+    def test_wakes_on_first_heartbeat_after_allocation(self, wake_sync_job_step):
+        self.enable_adaptive_polling()
+        project = self.create_project()
+        build = self.create_build(project)
+        job = self.create_job(build)
+        jobphase = self.create_jobphase(job)
+        jobstep = self.create_jobstep(jobphase, status=Status.pending_allocation)
+
+        for _ in range(2):
+            resp = self.client.post('/api/0/jobsteps/allocate/', data=json.dumps({
+                'jobstep_ids': [jobstep.id.hex],
+            }), content_type='application/json')
+            assert resp.status_code == 200
+            assert jobstep.last_heartbeat is not None
+
+            path = '/api/0/jobsteps/{0}/heartbeat/'.format(jobstep.id.hex)
+            wake_sync_job_step.reset_mock()
+            resp = self.client.post(path)
+            assert resp.status_code == 200
+            assert wake_sync_job_step.call_count == 1
+
+            resp = self.client.post(path)
+            assert resp.status_code == 200
+            assert wake_sync_job_step.call_count == 1
+
+            # allocated again, e.g. after its client went away
+            jobstep.status = Status.pending_allocation
+            db.session.add(jobstep)
+            db.session.commit()
+
+    @patch('changes.api.jobstep_heartbeat.wake_sync_job_step')
+    @patch('changes.lib.heartbeats.mark_seen')
+    def test_not_polling_adaptively(self, mark_seen, wake_sync_job_step):
+        project = self.create_project()
+        build = self.create_build(project)
+        job = self.create_job(build)
+        jobphase = self.create_jobphase(job)
+        jobstep = self.create_jobstep(jobphase, status=Status.in_progress)
+
+        resp = self.client.post('/api/0/jobsteps/{0}/heartbeat/'.format(jobstep.id.hex))
+        assert resp.status_code == 200
+        assert not mark_seen.called
+        assert not wake_sync_job_step.called
+
+    def test_buffered(self):
+        project = self.create_project()
+        build = self.create_build(project)
+        job = self.create_job(build)
+        jobphase = self.create_jobphase(job)
+        jobstep = self.create_jobstep(
+            jobphase, status=Status.in_progress, result=Result.unknown)
+
+        path = '/api/0/jobsteps/{0}/heartbeat/'.format(jobstep.id.hex)
+
+        with override_config('JOBSTEP_HEARTBEAT_REDIS_ENABLED', True):
+            resp = self.client.post(path, data={
+                'date': '2016-09-13T23:56:14.000000Z',
+                'brief': 'true',
+            })
+            assert resp.status_code == 204
+            assert resp.data == ''
+
+            db.session.expire_all()
+            jobstep = JobStep.query.get(jobstep.id)
+            assert jobstep.last_heartbeat is None
+            assert heartbeats.get_last_heartbeat(jobstep) == datetime(2016, 9, 13, 23, 56, 14)
@@ -1,10 +1,12 @@
 import uuid
 import os.path
 
+from collections import defaultdict
 from cStringIO import StringIO
 from mock import patch
 
 from changes.artifacts.coverage import CoverageHandler
+from changes.config import db
 from changes.models.filecoverage import FileCoverage
 from changes.models.job import Job
 from changes.models.jobstep import JobStep
@@ -185,3 +187,59 @@ class CoverageHandlerTest(TestCase):
         assert file_cov[1].lines_uncovered == 1
         assert file_cov[1].diff_lines_covered == 1
         assert file_cov[1].diff_lines_uncovered == 1
+
+    @patch.object(CoverageHandler, 'get_coverage')
+    @patch.object(CoverageHandler, 'process_diff')
+    def test_process_merges_repeated_files(self, process_diff, get_coverage):
+        project = self.create_project()
+        build = self.create_build(project)
+        job = self.create_job(build)
+        jobphase = self.create_jobphase(job)
+        jobstep = self.create_jobstep(jobphase)
+        jobstep2 = self.create_jobstep(jobphase)
+        artifact = self.create_artifact(jobstep2, 'coverage.xml')
+
+        existing = FileCoverage(
+            job_id=job.id,
+            step_id=jobstep.id,
+            project_id=project.id,
+            filename='foo.py',
+            data='CUU',
+        )
+        db.session.add(existing)
+        db.session.commit()
+
+        process_diff.return_value = defaultdict(set, {'foo.py': {3}})
+
+        get_coverage.return_value = [FileCoverage(
+            job_id=job.id,
+            step_id=jobstep2.id,
+            project_id=project.id,
+            filename=filename,
+            data=data,
+        ) for filename, data in [('foo.py', 'NNUU'), ('bar.py', 'UN'), ('foo.py', 'UNNC'), ('bar.py', 'NC')]]
+
+        handler = CoverageHandler(jobstep2)
+        with patch('changes.artifacts.coverage.redis.lock') as lock:
+            results = handler.process(StringIO(), artifact)
+        lock.assert_called_once_with('coverage:{}'.format(job.id.hex), expire=300, blocking_timeout=120)
+
+        assert [(r.filename, r.data) for r in results] == [('foo.py', 'CUUC'), ('bar.py', 'UC')]
+
+        # Rows are written with Core statements, which don't refresh objects
+        # already loaded in the session.
+        db.session.expire_all()
+        file_cov = dict((c.filename, c) for c in FileCoverage.query.filter(
+            FileCoverage.job_id == job.id,
+        ))
+        assert len(file_cov) == 2
+        assert file_cov['foo.py'].id == existing.id
+        assert file_cov['foo.py'].data == 'CUUC'
+        assert file_cov['foo.py'].lines_covered == 2
+        assert file_cov['foo.py'].lines_uncovered == 2
+        assert file_cov['foo.py'].diff_lines_covered == 0
+        assert file_cov['foo.py'].diff_lines_uncovered == 1
+        assert file_cov['bar.py'].step_id == jobstep2.id
+        assert file_cov['bar.py'].data == 'UC'
+        assert file_cov['bar.py'].lines_covered == 1
+        assert file_cov['bar.py'].lines_uncovered == 1
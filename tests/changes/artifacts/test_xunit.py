@@ -6,11 +6,13 @@ import time
 import uuid
 
 from cStringIO import StringIO
+from flask import current_app
 
-from changes.artifacts.xunit import XunitHandler, truncate_message, _TRUNCATION_HEADER
+from changes.artifacts.xunit import XunitDelegate, XunitHandler, truncate_message, _TRUNCATION_HEADER
 from changes.constants import Result
 from changes.models.failurereason import FailureReason
 from changes.models.jobstep import JobStep
+from changes.models.test import TestCase as TestCaseModel
 from changes.models.testresult import TestResult
 from changes.testutils import (
     SAMPLE_XUNIT, SAMPLE_XUNIT_DOUBLE_CASES, SAMPLE_XUNIT_MULTIPLE_SUITES,
@@ -99,6 +101,34 @@ def test_get_test_suite_multiple():
     assert len(tests) == 7  # 10 test cases, 3 of which are duplicates
 
 
+@pytest.mark.parametrize('chunk_size', [1, 7, 4096])
+def test_iter_test_suites_matches_parse(chunk_size):
+    jobstep = JobStep(
+        id=uuid.uuid4(),
+        project_id=uuid.uuid4(),
+        job_id=uuid.uuid4(),
+    )
+    # needed for logging when a test suite has no duration
+    jobstep.job = mock.MagicMock()
+
+    expected = XunitDelegate(jobstep).parse(StringIO(SAMPLE_XUNIT_MULTIPLE_SUITES))
+
+    suites = []
+    for suite in XunitDelegate(jobstep).iter_test_suites(
+            StringIO(SAMPLE_XUNIT_MULTIPLE_SUITES), chunk_size=chunk_size):
+        suites.append((suite.name, suite.duration, suite.result, suite.test_results))
+
+    assert len(suites) == len(expected) == 3
+    for (name, duration, result, test_results), other in zip(suites, expected):
+        assert name == other.name
+        assert duration == other.duration
+        assert result == other.result
+        assert [t.name for t in test_results] == [t.name for t in other.test_results]
+        assert [t.result for t in test_results] == [t.result for t in other.test_results]
+        assert [t.message_offsets for t in test_results] == \
+            [t.message_offsets for t in other.test_results]
+
+
 @pytest.mark.parametrize('xml,result', [
     (SAMPLE_XUNIT_MULTIPLE_EMPTY_PASSED, Result.passed),
     (SAMPLE_XUNIT_MULTIPLE_EMPTY_FAILED_FAILURE, Result.failed),
@@ -395,3 +425,51 @@ class TestFromFileTestCase(TestCase):
         assert results[0].result == Result.skipped
         assert results[674].name == 'tests.changes.web.test_auth.LogoutViewTest.test_simple'
         assert results[674].result == Result.passed
+
+
+class IncrementalProcessTestCase(TestCase):
+    def test_matches_process(self):
+        project = self.create_project()
+        build = self.create_build(project)
+        job = self.create_job(build)
+        jobphase = self.create_jobphase(job)
+        jobstep = self.create_jobstep(jobphase)
+        artifact = self.create_artifact(jobstep, 'junit.xml')
+
+        handler = XunitHandler(jobstep)
+        with mock.patch.dict(current_app.config, {'XUNIT_STREAMING_BATCH_SIZE': 1}):
+            assert handler.process_incrementally(
+                StringIO(SAMPLE_XUNIT_MULTIPLE_SUITES), artifact) == 7
+
+        expected = handler.get_tests(StringIO(SAMPLE_XUNIT_MULTIPLE_SUITES))
+        testcases = {t.name: t for t in TestCaseModel.query.filter_by(step_id=jobstep.id)}
+
+        assert sorted(testcases) == sorted(t.name for t in expected)
+        for test in expected:
+            testcase = testcases[test.name]
+            assert testcase.result == test.result
+            assert testcase.duration == round(test.duration or 0)
+            assert testcase.reruns == test.reruns
+            assert len(testcase.messages) == len(test.message_offsets)
+
+        assert FailureReason.query.filter_by(step_id=jobstep.id).count() == 0
+
+    def test_process_large_artifact(self):
+        project = self.create_project()
+        build = self.create_build(project)
+        job = self.create_job(build)
+        jobphase = self.create_jobphase(job)
+        jobstep = self.create_jobstep(jobphase)
+        artifact = self.create_artifact(jobstep, 'junit.xml')
+        artifact.file.save(StringIO(SAMPLE_XUNIT_MULTIPLE_SUITES), artifact.name)
+
+        handler = XunitHandler(jobstep)
+        with mock.patch.dict(current_app.config, {'XUNIT_STREAMING_MIN_BYTES': 100}), \
+                mock.patch.object(type(artifact.file), 'get_size') as get_size:
+            # the size is known, so isn't looked up again
+            assert handler.process(
+                StringIO(SAMPLE_XUNIT_MULTIPLE_SUITES), artifact,
+                size=len(SAMPLE_XUNIT_MULTIPLE_SUITES)) is None
+        assert not get_size.called
+
+        assert TestCaseModel.query.filter_by(step_id=jobstep.id).count() == 7
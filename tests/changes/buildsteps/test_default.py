@@ -11,6 +11,7 @@ from changes.buildsteps.default import (
 )
 from changes.config import db
 from changes.constants import Result, ResultSource, Status, Cause
+from changes.lib import heartbeats
 from changes.models.command import CommandType, FutureCommand
 from changes.models.jobstep import FutureJobStep
 from changes.models.repository import Repository
@@ -88,6 +89,24 @@ class DefaultBuildStepTest(TestCase):
         # Timed out; back to pending allocation.
         assert jobstep.status == Status.pending_allocation
 
+    def test_update_step_allocated_buffered_heartbeat(self):
+        build = self.create_build(self.create_project())
+        job = self.create_job(build)
+        jobphase = self.create_jobphase(job, label='foo')
+        last_heart = datetime(2016, 9, 13, 23, 56, 14)
+        jobstep = self.create_jobstep(jobphase, status=Status.allocated, last_heartbeat=last_heart)
+        buildstep = self.get_buildstep()
+
+        with override_config('JOBSTEP_HEARTBEAT_REDIS_ENABLED', True):
+            heartbeats.record(jobstep, last_heart + timedelta(seconds=5))
+            with override_config('JOBSTEP_ALLOCATION_TIMEOUT_SECONDS', 10):
+                with mock.patch('changes.buildsteps.default.utcnow') as mock_utcnow:
+                    mock_utcnow.return_value = last_heart + timedelta(seconds=11)
+                    buildstep.update_step(jobstep)
+
+        # The buffered heartbeat is within the timeout.
+        assert jobstep.status == Status.allocated
+
     def test_execute(self):
         build = self.create_build(self.create_project(name='foo'), label='buildlabel')
         job = self.create_job(build)
@@ -9,6 +9,7 @@ from changes.constants import Status, Result, ResultSource, SelectiveTestingPoli
 from changes.expanders.bazel_targets import BazelTargetsExpander
 from changes.models.bazeltarget import BazelTarget
 from changes.models.buildmessage import BuildMessage
+from changes.models.durationstat import DurationStat, DurationStatType
 from changes.testutils import TestCase
 
 
@@ -82,6 +83,18 @@ class BazelTargetsExpanderTest(TestCase):
         assert results['//foo:test'] == 25
         assert '//foo/bar/baz:test' not in results
 
+    def test_get_target_stats_from_duration_stats(self):
+        for name, mean in [('//foo/bar:baz', 50.4), ('//foo:test', 24.8)]:
+            db.session.add(DurationStat(
+                project_id=self.project.id, type=DurationStatType.target, name=name, mean=mean))
+        db.session.commit()
+
+        expander = self.get_expander({})
+        results, avg_time = expander.get_target_stats(self.project.slug)
+
+        assert avg_time == 37
+        assert results == {'//foo/bar:baz': 50, '//foo:test': 25}
+
     @patch.object(BazelTargetsExpander, 'get_target_stats')
     def test_expand(self, mock_get_target_stats):
         project = self.create_project()
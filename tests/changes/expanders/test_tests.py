@@ -4,8 +4,10 @@ import pytest
 
 from mock import patch
 
+from changes.config import db
 from changes.constants import Status, Result
 from changes.expanders.tests import TestsExpander
+from changes.models.durationstat import DurationStat, DurationStatType, get_duration_stats
 from changes.testutils import TestCase
 
 
@@ -59,6 +61,57 @@ class TestsExpanderTest(TestCase):
         assert results[('foo', 'bar', 'test_baz')] == 50
         assert results[('foo', 'bar', 'test_bar')] == 25
 
+    def test_get_test_stats_from_duration_stats(self):
+        for name, mean in [('foo/bar.py', 50.4), ('foo/baz.py', 24.8)]:
+            db.session.add(DurationStat(
+                project_id=self.project.id, type=DurationStatType.test, name=name, mean=mean))
+        db.session.add(DurationStat(
+            project_id=self.project.id, type=DurationStatType.target, name='foo/biz.py', mean=10))
+        db.session.commit()
+
+        expander = self.get_expander({})
+        results, avg_time = expander.get_test_stats(self.project.slug)
+
+        assert avg_time == 37
+        assert results == {
+            ('foo',): 75,
+            ('foo', 'bar'): 50,
+            ('foo', 'baz'): 25,
+        }
+
+    def test_get_test_variances(self):
+        for name, variance in [('foo/bar.py', 100), ('foo/baz.py', 20)]:
+            db.session.add(DurationStat(
+                project_id=self.project.id, type=DurationStatType.test, name=name,
+                mean=10, variance=variance))
+        db.session.commit()
+
+        expander = self.get_expander({})
+        assert expander.get_test_variances(self.project.slug) == {
+            ('foo',): 120,
+            ('foo', 'bar'): 100,
+            ('foo', 'baz'): 20,
+        }
+
+    def test_expand_reads_duration_stats_once(self):
+        for name, mean, variance in [('foo/bar.py', 50, 100), ('foo/baz.py', 10, 4)]:
+            db.session.add(DurationStat(
+                project_id=self.project.id, type=DurationStatType.test, name=name,
+                mean=mean, variance=variance))
+        db.session.commit()
+        build = self.create_build(self.project)
+        job = self.create_job(build)
+
+        with patch('changes.expanders.tests.get_duration_stats',
+                   wraps=get_duration_stats) as duration_stats:
+            results = list(self.get_expander({
+                'cmd': 'py.test --junit=junit.xml {test_names}',
+                'tests': ['foo/bar.py', 'foo/baz.py'],
+            }).expand(job=job, max_executors=2))
+
+        duration_stats.assert_called_once_with(self.project.slug, DurationStatType.test)
+        assert sorted(r.data['weight'] for r in results) == [11, 51]
+
     @patch.object(TestsExpander, 'get_test_stats')
     def test_expand(self, mock_get_test_stats):
         project = self.create_project()
@@ -0,0 +1,88 @@
+# -*- coding: utf-8 -*-
+from __future__ import absolute_import
+
+from datetime import datetime, timedelta
+
+import mock
+
+from flask import current_app
+
+from changes.config import db
+from changes.constants import Status
+from changes.jobs.compact_logs import compact_log, compact_logs
+from changes.lib import log_reader
+from changes.models.log import LogChunk, LogSegment
+from changes.testutils import TestCase
+
+
+class CompactLogsTest(TestCase):
+    def create_log(self, step, texts, offset=0):
+        source = self.create_logsource(step=step, name='console')
+        for text in texts:
+            self.create_logchunk(source, text=text, offset=offset)
+            offset += len(text)
+        return source
+
+    def test_compact_log(self):
+        project = self.create_project()
+        build = self.create_build(project)
+        job = self.create_job(build)
+        step = self.create_jobstep(self.create_jobphase(job))
+        texts = [u'line %d\n' % i * 20 for i in xrange(10)] + [u'☃ done\n']
+        source = self.create_log(step, texts)
+
+        with mock.patch('changes.jobs.compact_logs.LOG_SEGMENT_SIZE', 400):
+            compact_log(source)
+
+        assert source.date_compacted is not None
+        assert LogChunk.query.filter_by(source_id=source.id).count() == 0
+        segments = LogSegment.query.filter_by(source_id=source.id).order_by(LogSegment.offset).all()
+        assert [(s.offset, s.size) for s in segments] == [(0, 420), (420, 420), (840, 420), (1260, 147)]
+
+        full_text = u''.join(texts)
+        assert log_reader.get_log_size(source) == len(full_text)
+        assert log_reader.read_log(source) == full_text
+        assert log_reader.read_log(source, 410, 20) == full_text[410:430]
+        assert log_reader.read_log_tail(source, 10) == (len(full_text) - 10, full_text[-10:])
+
+    def test_compact_log_with_gap(self):
+        project = self.create_project()
+        build = self.create_build(project)
+        job = self.create_job(build)
+        step = self.create_jobstep(self.create_jobphase(job))
+        source = self.create_log(step, [u'abc', u'def'])
+        self.create_logchunk(source, text=u'xyz', offset=10)
+
+        compact_log(source)
+
+        segments = LogSegment.query.filter_by(source_id=source.id).order_by(LogSegment.offset).all()
+        assert [(s.offset, s.text) for s in segments] == [(0, u'abcdef'), (10, u'xyz')]
+        assert log_reader.read_log(source, 4) == u'efxyz'
+
+    def test_compact_logs(self):
+        patcher = mock.patch.dict(current_app.config, {'LOG_COMPACTION_ENABLED': True})
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+        project = self.create_project()
+        build = self.create_build(project)
+        job = self.create_job(build)
+        phase = self.create_jobphase(job)
+        old_step = self.create_jobstep(
+            phase, status=Status.finished,
+            date_finished=datetime.utcnow() - timedelta(days=1))
+        recent_step = self.create_jobstep(
+            phase, status=Status.finished, date_finished=datetime.utcnow())
+        running_step = self.create_jobstep(phase, status=Status.in_progress)
+        old_source = self.create_log(old_step, [u'foo'])
+        recent_source = self.create_log(recent_step, [u'bar'])
+        running_source = self.create_log(running_step, [u'baz'])
+
+        compact_logs()
+
+        db.session.expire_all()
+        assert old_source.date_compacted is not None
+        assert recent_source.date_compacted is None
+        assert running_source.date_compacted is None
+        assert log_reader.read_log(old_source) == u'foo'
+        assert log_reader.read_log(recent_source) == u'bar'
@@ -5,8 +5,9 @@ import mock
 from datetime import datetime
 
 from changes.config import db
-from changes.jobs.import_repo import import_repo
+from changes.jobs.import_repo import import_repo, IMPORT_BATCH_SIZE
 from changes.models.repository import Repository, RepositoryBackend, RepositoryStatus
+from changes.models.revision import Revision
 from changes.testutils import TestCase
 from changes.vcs.base import Vcs, RevisionResult
 
@@ -17,7 +18,7 @@ class ImportRepoTest(TestCase):
     def test_simple(self, queue_delay, get_vcs_backend):
         vcs_backend = mock.MagicMock(spec=Vcs)
 
-        def log(parent):
+        def log(parent, limit):
             if parent is None:
                 yield RevisionResult(
                     id='a' * 40,
@@ -28,7 +29,7 @@ class ImportRepoTest(TestCase):
 
         get_vcs_backend.return_value = vcs_backend
         vcs_backend.log.side_effect = log
-        vcs_backend.get_patch_hash.return_value = 'a' * 40
+        vcs_backend.get_patch_hashes.return_value = {'a' * 40: 'a' * 40}
 
         repo = self.create_repo(
             backend=RepositoryBackend.git,
@@ -38,7 +39,7 @@ class ImportRepoTest(TestCase):
         with mock.patch.object(import_repo, 'allow_absent_from_db', True):
             import_repo(repo_id=repo.id.hex, task_id=repo.id.hex)
 
-        vcs_backend.log.assert_called_once_with(parent=None)
+        vcs_backend.log.assert_called_once_with(parent=None, limit=IMPORT_BATCH_SIZE)
 
         db.session.expire_all()
 
@@ -57,3 +58,37 @@ class ImportRepoTest(TestCase):
             'task_id': repo.id.hex,
             'parent': 'a' * 40,
         })
+
+    @mock.patch('changes.models.repository.Repository.get_vcs')
+    @mock.patch('changes.config.queue.delay')
+    def test_finished(self, queue_delay, get_vcs_backend):
+        vcs_backend = mock.MagicMock(spec=Vcs)
+
+        def log(parent, limit):
+            yield RevisionResult(
+                id=parent,
+                message='hello world!',
+                author='Example <foo@example.com>',
+                author_date=datetime(2013, 9, 19, 22, 15, 22),
+            )
+
+        get_vcs_backend.return_value = vcs_backend
+        vcs_backend.log.side_effect = log
+        vcs_backend.get_patch_hashes.return_value = {'a' * 40: 'a' * 40}
+
+        repo = self.create_repo(
+            backend=RepositoryBackend.git,
+            status=RepositoryStatus.importing,
+        )
+
+        with mock.patch.object(import_repo, 'allow_absent_from_db', True):
+            import_repo(repo_id=repo.id.hex, task_id=repo.id.hex, parent='a' * 40)
+
+        db.session.expire_all()
+
+        repo = Repository.query.get(repo.id)
+        assert repo.status == RepositoryStatus.active
+        assert Revision.query.filter(Revision.repository_id == repo.id).count() == 1
+
+        # only the parent is left, so there's nothing more to import
+        assert not queue_delay.called
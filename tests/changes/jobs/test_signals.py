@@ -1,8 +1,11 @@
 from mock import Mock, patch
 
 from flask import current_app
+from uuid import uuid4
 
-from changes.jobs.signals import fire_signal, run_event_listener
+from changes.config import db, redis
+from changes.jobs.signals import LISTENERS_DONE_KEY, fire_signal, run_event_listener
+from changes.models.build import Build
 from changes.testutils import TestCase
 
 
@@ -26,11 +29,11 @@ class FireSignalTest(SignalTestBase):
         with patch.object(fire_signal, 'allow_absent_from_db', True):
             fire_signal(signal='test.signal', kwargs={'foo': 'bar'})
 
-        mock_run_event_listener.delay.assert_called_once_with(
-            listener='mock.Mock',
-            signal='test.signal',
-            kwargs={'foo': 'bar'},
-        )
+        mock_run_event_listener.delay_many.assert_called_once_with([{
+            'listener': 'mock.Mock',
+            'signal': 'test.signal',
+            'kwargs': {'foo': 'bar'},
+        }])
 
 
 class RunEventListenerTest(SignalTestBase):
@@ -49,3 +52,96 @@ class RunEventListenerTest(SignalTestBase):
         mock_import_string.assert_called_once_with('mock.Mock')
 
         mock_listener.assert_called_once_with(foo='bar')
+
+
+class InProcessDispatchTest(SignalTestBase):
+    def setUp(self):
+        super(InProcessDispatchTest, self).setUp()
+        current_app.config['EVENT_LISTENERS'] = (
+            ('changes.listeners.a', 'test.signal'),
+            ('changes.listeners.b', 'test.signal'),
+            ('changes.listeners.c', 'test.signal'),
+            ('changes.listeners.d', 'test.signal2'),
+        )
+        patcher = patch.dict(current_app.config, {
+            'SIGNAL_DISPATCH_IN_PROCESS': True,
+        })
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+        self.listeners = {
+            name: Mock(name=name) for name in ('a', 'b', 'c', 'd')
+        }
+        patcher = patch('changes.jobs.signals.import_string',
+                        side_effect=lambda path: self.listeners[path.rsplit('.', 1)[1]])
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    @patch('changes.jobs.signals.run_event_listener')
+    def test_simple(self, mock_run_event_listener):
+        project = self.create_project()
+        build = self.create_build(project)
+        build_id = build.id
+
+        def get_build(**kwargs):
+            assert Build.query.get(kwargs['build_id']).project_id == project.id
+            db.session.commit()
+        self.listeners['a'].side_effect = get_build
+        self.listeners['b'].side_effect = get_build
+
+        with patch.object(fire_signal, 'allow_absent_from_db', True):
+            fire_signal(signal='test.signal', kwargs={'build_id': build_id.hex})
+
+        for name in ('a', 'b', 'c'):
+            self.listeners[name].assert_called_once_with(build_id=build_id.hex)
+        assert not self.listeners['d'].called
+        mock_run_event_listener.delay_many.assert_called_once_with([])
+
+    @patch('changes.jobs.signals.run_event_listener')
+    def test_listeners_see_changes(self, mock_run_event_listener):
+        project = self.create_project()
+        build = self.create_build(project, label='foo')
+        build_id = build.id
+
+        def relabel(**kwargs):
+            # bypasses the session, like a listener's own task or query would
+            db.session.execute(Build.__table__.update().values(label='bar').where(
+                Build.__table__.c.id == build_id))
+            db.session.commit()
+        labels = []
+        self.listeners['a'].side_effect = relabel
+        self.listeners['b'].side_effect = lambda **kwargs: labels.append(
+            Build.query.get(kwargs['build_id']).label)
+
+        with patch.object(fire_signal, 'allow_absent_from_db', True):
+            fire_signal(signal='test.signal', kwargs={'build_id': build_id.hex})
+
+        assert labels == ['bar']
+
+    @patch('changes.jobs.signals.run_event_listener')
+    def test_failed_listener(self, mock_run_event_listener):
+        self.listeners['b'].side_effect = Exception('boom')
+
+        with patch.object(fire_signal, 'allow_absent_from_db', True):
+            fire_signal(signal='test.signal', kwargs={'foo': 'bar'})
+
+        for name in ('a', 'b', 'c'):
+            self.listeners[name].assert_called_once_with(foo='bar')
+        mock_run_event_listener.delay_many.assert_called_once_with([{
+            'listener': 'changes.listeners.b',
+            'signal': 'test.signal',
+            'kwargs': {'foo': 'bar'},
+        }])
+
+    @patch('changes.jobs.signals.run_event_listener')
+    def test_retry_skips_done_listeners(self, mock_run_event_listener):
+        task_id = uuid4().hex
+        redis.sadd(LISTENERS_DONE_KEY.format(task_id), 'changes.listeners.a')
+
+        with patch.object(fire_signal, 'allow_absent_from_db', True):
+            fire_signal(signal='test.signal', kwargs={'foo': 'bar'}, task_id=task_id)
+
+        assert not self.listeners['a'].called
+        self.listeners['b'].assert_called_once_with(foo='bar')
+        self.listeners['c'].assert_called_once_with(foo='bar')
+        assert not redis.exists(LISTENERS_DONE_KEY.format(task_id))
@@ -82,6 +82,10 @@ class SyncBuildTest(TestCase):
         queue_delay.assert_any_call('update_project_stats', kwargs={
             'project_id': project.id.hex,
         }, countdown=1)
+        queue_delay.assert_any_call('update_test_failure_streaks', kwargs={
+            'project_id': project.id.hex,
+            'build_id': build.id.hex,
+        }, countdown=1)
 
         stat = ItemStat.query.filter(
             ItemStat.item_id == build.id,
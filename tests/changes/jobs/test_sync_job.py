@@ -134,6 +134,10 @@ class SyncJobTest(TestCase):
             'project_id': self.project.id.hex,
             'plan_id': self.plan.id.hex,
         }, countdown=1)
+        queue_delay.assert_any_call('update_project_duration_stats', kwargs={
+            'project_id': self.project.id.hex,
+            'job_id': job.id.hex,
+        }, countdown=1)
 
         mock_fire_signal.delay.assert_any_call(
             signal='job.finished',
@@ -4,16 +4,19 @@ import json
 import mock
 import re
 import responses
+import time
 
 from datetime import datetime, timedelta
 from flask import current_app
 from mock import patch
 
-from changes.config import db
+from changes.config import db, redis
 from changes.constants import Result, ResultSource, Status
 from changes.db.types.filestorage import FileData
 from changes.jobs.sync_job_step import (
     sync_job_step, is_missing_tests, has_timed_out,
+    get_poll_interval, wake_sync_job_step,
+    POLL_KEY,
     _SNAPSHOT_TIMEOUT_BONUS_MINUTES,
     _get_artifacts_to_sync,
     _sync_from_artifact_store,
@@ -867,3 +870,157 @@ class SyncJobStepTest(BaseTestCase):
         assert Task.query.filter(Task.task_id == artifact.id).first()
 
         implementation.verify_final_artifacts.assert_called_once_with(step, to_sync)
+
+
+class AdaptivePollingTest(BaseTestCase):
+    def setUp(self):
+        super(AdaptivePollingTest, self).setUp()
+        patcher = mock.patch.dict(current_app.config, {
+            'SYNC_JOB_STEP_ADAPTIVE_POLLING': True,
+            'SYNC_JOB_STEP_MAX_POLL_INTERVAL': 60,
+        })
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+        self.project = self.create_project()
+        self.build = self.create_build(project=self.project)
+        self.job = self.create_job(build=self.build)
+        plan = self.create_plan(self.project)
+        self.create_step(plan, implementation='test', order=0)
+        self.create_job_plan(self.job, plan)
+        self.phase = self.create_jobphase(self.job)
+
+    def create_polled_step(self, **kwargs):
+        step = self.create_jobstep(self.phase, **kwargs)
+        self.create_task(
+            parent_id=self.job.id,
+            task_id=step.id,
+            task_name='sync_job_step',
+            status=Status.in_progress,
+        )
+        db.session.commit()
+        return step
+
+    def test_get_poll_interval(self):
+        now = datetime.utcnow()
+        step = self.create_jobstep(
+            self.phase, status=Status.queued, date_started=None,
+            date_created=now - timedelta(seconds=20))
+        assert get_poll_interval(step) == 5
+
+        step.status = Status.in_progress
+        step.date_started = now - timedelta(seconds=300)
+        assert get_poll_interval(step) == 30
+
+        step.date_started = now - timedelta(hours=1)
+        assert get_poll_interval(step) == 60
+
+        step.status = Status.finished
+        assert get_poll_interval(step) == 5
+
+    @mock.patch('changes.config.queue.delay')
+    @mock.patch.object(HistoricalImmutableStep, 'get_implementation')
+    @mock.patch('changes.jobs.sync_job_step._sync_from_artifact_store')
+    def test_backs_off(self, sync_from_artifact_store, get_implementation, queue_delay):
+        step = self.create_polled_step(
+            status=Status.in_progress,
+            date_started=datetime.utcnow() - timedelta(seconds=300))
+
+        sync_job_step(
+            step_id=step.id.hex,
+            task_id=step.id.hex,
+            parent_task_id=self.job.id.hex,
+        )
+
+        queue_delay.assert_called_once_with('sync_job_step', kwargs={
+            'step_id': step.id.hex,
+            'task_id': step.id.hex,
+            'parent_task_id': self.job.id.hex,
+        }, countdown=30)
+        poll = redis.hgetall(POLL_KEY.format(step.id.hex))
+        assert poll['polls'] == '1'
+        assert 29 < float(poll['next_poll']) - time.time() <= 30
+
+    @mock.patch('changes.config.queue.delay')
+    @mock.patch.object(HistoricalImmutableStep, 'get_implementation')
+    def test_superseded(self, get_implementation, queue_delay):
+        step = self.create_polled_step(status=Status.in_progress)
+        # a wakeup ran and scheduled the next poll since this one was queued
+        redis.hset(POLL_KEY.format(step.id.hex), 'next_poll', time.time() + 30)
+
+        sync_job_step(
+            step_id=step.id.hex,
+            task_id=step.id.hex,
+            parent_task_id=self.job.id.hex,
+        )
+
+        assert not get_implementation.called
+        assert not queue_delay.called
+        assert Task.query.filter(
+            Task.task_id == step.id,
+            Task.task_name == 'sync_job_step',
+        ).first().status == Status.in_progress
+
+    @mock.patch('changes.config.queue.delay')
+    @mock.patch.object(HistoricalImmutableStep, 'get_implementation')
+    @mock.patch('changes.jobs.sync_job_step._sync_from_artifact_store')
+    @mock.patch('changes.jobs.sync_job_step.is_missing_tests')
+    def test_finishing_fails(self, is_missing_tests, sync_from_artifact_store,
+                             get_implementation, queue_delay):
+        step = self.create_polled_step(status=Status.finished, result=Result.passed)
+        is_missing_tests.side_effect = Exception('oops')
+
+        sync_job_step(
+            step_id=step.id.hex,
+            task_id=step.id.hex,
+            parent_task_id=self.job.id.hex,
+        )
+        # retried
+        assert queue_delay.call_count == 1
+
+        # the retry isn't taken as superseded, and finishes the step
+        assert redis.hget(POLL_KEY.format(step.id.hex), 'next_poll') is None
+        is_missing_tests.side_effect = None
+        is_missing_tests.return_value = False
+        sync_job_step(
+            step_id=step.id.hex,
+            task_id=step.id.hex,
+            parent_task_id=self.job.id.hex,
+        )
+        assert is_missing_tests.call_count == 2
+        assert float(redis.hget(POLL_KEY.format(step.id.hex), 'next_poll')) == float('inf')
+
+    @mock.patch('changes.config.queue.delay')
+    def test_wake(self, queue_delay):
+        step = self.create_polled_step(status=Status.in_progress)
+
+        # not being polled
+        wake_sync_job_step(step)
+        assert not queue_delay.called
+
+        # next poll is due soon anyway
+        redis.hset(POLL_KEY.format(step.id.hex), 'next_poll', time.time() + 3)
+        wake_sync_job_step(step)
+        assert not queue_delay.called
+
+        redis.hset(POLL_KEY.format(step.id.hex), 'next_poll', time.time() + 30)
+        wake_sync_job_step(step)
+        queue_delay.assert_called_once_with('sync_job_step', kwargs={
+            'step_id': step.id.hex,
+            'task_id': step.id.hex,
+            'parent_task_id': self.job.id.hex,
+        })
+        assert float(redis.hget(POLL_KEY.format(step.id.hex), 'next_poll')) <= time.time()
+
+        # debounced
+        redis.hset(POLL_KEY.format(step.id.hex), 'next_poll', time.time() + 30)
+        wake_sync_job_step(step)
+        assert queue_delay.call_count == 1
+
+    @mock.patch('changes.config.queue.delay')
+    def test_wake_finished(self, queue_delay):
+        step = self.create_polled_step(status=Status.finished)
+        redis.hset(POLL_KEY.format(step.id.hex), 'next_poll', float('inf'))
+
+        wake_sync_job_step(step)
+        assert not queue_delay.called
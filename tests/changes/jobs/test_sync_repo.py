@@ -30,7 +30,7 @@ class SyncRepoTest(TestCase):
 
         get_vcs_backend.return_value = vcs_backend
         vcs_backend.log.side_effect = log
-        vcs_backend.get_patch_hash.return_value = 'a' * 40
+        vcs_backend.get_patch_hashes.side_effect = lambda shas: {sha: 'a' * 40 for sha in shas}
 
         repo = self.create_repo(
             backend=RepositoryBackend.git)
@@ -57,13 +57,13 @@ class SyncRepoTest(TestCase):
             'parent_task_id': None,
         }, countdown=20)
 
-        mock_fire_signal.delay.assert_any_call(
-            signal='revision.created',
-            kwargs={
+        mock_fire_signal.delay_many.assert_called_once_with([{
+            'signal': 'revision.created',
+            'kwargs': {
                 'repository_id': repo.id.hex,
                 'revision_sha': 'a' * 40,
             },
-        )
+        }])
 
     @mock.patch('changes.jobs.sync_repo.fire_signal')
     @mock.patch('changes.models.repository.Repository.get_vcs')
@@ -75,6 +75,7 @@ class SyncRepoTest(TestCase):
         """
         vcs_backend = mock.MagicMock(spec=Vcs)
         vcs_backend.get_patch_hash.return_value = 'a' * 40
+        vcs_backend.get_patch_hashes.side_effect = lambda shas: {sha: 'a' * 40 for sha in shas}
         get_vcs_backend.return_value = vcs_backend
         repo = self.create_repo(backend=RepositoryBackend.git)
 
@@ -137,20 +138,17 @@ class SyncRepoTest(TestCase):
         assert repo.last_update_attempt is not None
         assert repo.last_update is not None
 
-        for i in range(4):
-            mock_fire_signal.delay.assert_any_call(
-                signal='revision.created',
-                kwargs={
-                    'repository_id': repo.id.hex,
-                    'revision_sha': str(i) * 40,
-                },
-            )
-
-        assert mock_fire_signal.delay.call_count == 4
+        mock_fire_signal.delay_many.assert_called_once_with([{
+            'signal': 'revision.created',
+            'kwargs': {
+                'repository_id': repo.id.hex,
+                'revision_sha': sha,
+            },
+        } for sha in (str(3) * 40, str(0) * 40, str(1) * 40, str(2) * 40)])
 
         # Now all the revisions have been handled.
         # Another call to sync_repo should do nothing.
-        mock_fire_signal.delay.call_count = 0
+        mock_fire_signal.delay_many.reset_mock()
         with mock.patch.object(sync_repo, 'allow_absent_from_db', True):
             sync_repo(repo_id=repo.id.hex, task_id=repo.id.hex)
-        assert mock_fire_signal.delay.call_count == 0
+        mock_fire_signal.delay_many.assert_called_once_with([])
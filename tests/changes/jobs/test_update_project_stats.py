@@ -1,11 +1,17 @@
 from __future__ import absolute_import
 
-from changes.constants import Status, Result
+from datetime import datetime, timedelta
+
+from changes.constants import Status, Result, ResultSource
 from changes.config import db
 from changes.jobs.update_project_stats import (
-    update_project_stats, update_project_plan_stats
+    update_project_stats, update_project_plan_stats,
+    update_project_duration_stats, update_test_failure_streaks
 )
+from changes.models.durationstat import DurationStat, DurationStatType
 from changes.models.project import Project
+from changes.models.test import TestCase as TestCaseModel
+from changes.models.testfailurestreak import TestFailureStreak, get_streaks_since
 from changes.testutils import TestCase
 
 
@@ -49,3 +55,192 @@ class UpdateProjectPlanStatsTest(TestCase):
         db.session.expire(plan)
 
         assert plan.avg_build_time == 5050
+
+
+class UpdateProjectDurationStatsTest(TestCase):
+    def create_finished_job(self, project, **kwargs):
+        build = self.create_build(project, status=Status.finished, **kwargs)
+        job = self.create_job(build, status=Status.finished)
+        jobstep = self.create_jobstep(self.create_jobphase(job))
+        return job, jobstep
+
+    def get_stats(self, project):
+        return {
+            (s.type, s.name): (s.mean, s.variance, s.sample_count)
+            for s in DurationStat.query.filter_by(project_id=project.id)
+        }
+
+    def test_simple(self):
+        project = self.create_project()
+
+        job, jobstep = self.create_finished_job(project)
+        self.create_test(job, name='foo.test_a', duration=100)
+        self.create_test(job, name='foo.test_b', duration=10)
+        self.create_target(job, jobstep, name='//foo:a', duration=1000)
+        self.create_target(job, jobstep, name='//foo:b', duration=0,
+                           result_source=ResultSource.from_parent)
+        update_project_duration_stats(project_id=project.id.hex, job_id=job.id.hex)
+
+        assert self.get_stats(project) == {
+            (DurationStatType.test, 'foo.test_a'): (100, 0, 1),
+            (DurationStatType.test, 'foo.test_b'): (10, 0, 1),
+            (DurationStatType.target, '//foo:a'): (1000, 0, 1),
+        }
+
+        job, jobstep = self.create_finished_job(project)
+        self.create_test(job, name='foo.test_a', duration=200)
+        self.create_test(job, name='foo.test_c', duration=5)
+        update_project_duration_stats(project_id=project.id.hex, job_id=job.id.hex)
+        db.session.expire_all()
+
+        stats = self.get_stats(project)
+        mean, variance, count = stats[(DurationStatType.test, 'foo.test_a')]
+        # with DURATION_STATS_ALPHA = 0.3
+        assert abs(mean - 130) < 1e-6
+        assert abs(variance - 2100) < 1e-6
+        assert count == 2
+        assert stats[(DurationStatType.test, 'foo.test_b')] == (10, 0, 1)
+        assert stats[(DurationStatType.test, 'foo.test_c')] == (5, 0, 1)
+
+    def test_prunes_stale(self):
+        project = self.create_project()
+        db.session.add(DurationStat(
+            project_id=project.id, type=DurationStatType.test, name='foo.test_old',
+            mean=50, date_modified=datetime.utcnow() - timedelta(days=30),
+        ))
+        db.session.add(DurationStat(
+            project_id=project.id, type=DurationStatType.target, name='//foo:old',
+            mean=50, date_modified=datetime.utcnow() - timedelta(days=30),
+        ))
+        db.session.add(DurationStat(
+            project_id=project.id, type=DurationStatType.test, name='foo.test_b',
+            mean=10, date_modified=datetime.utcnow() - timedelta(days=1),
+        ))
+        db.session.commit()
+
+        job, _ = self.create_finished_job(project)
+        self.create_test(job, name='foo.test_a', duration=100)
+        update_project_duration_stats(project_id=project.id.hex, job_id=job.id.hex)
+
+        assert self.get_stats(project) == {
+            (DurationStatType.test, 'foo.test_a'): (100, 0, 1),
+            (DurationStatType.test, 'foo.test_b'): (10, 0, 1),
+        }
+
+    def test_ignores_diffs(self):
+        project = self.create_project()
+        patch = self.create_patch(repository=project.repository)
+        source = self.create_source(project, patch=patch)
+
+        job, _ = self.create_finished_job(project, source=source)
+        self.create_test(job, name='foo.test_a', duration=100)
+        update_project_duration_stats(project_id=project.id.hex, job_id=job.id.hex)
+
+        assert self.get_stats(project) == {}
+
+
+class UpdateTestFailureStreaksTest(TestCase):
+    def create_finished_build(self, project, day, failing=(), passing=(), **kwargs):
+        build = self.create_build(
+            project, status=Status.finished,
+            result=Result.failed if failing else Result.passed,
+            date_created=datetime(2016, 10, day), **kwargs)
+        job = self.create_job(
+            build, status=Status.finished, result=build.result)
+        for name in failing:
+            self.create_test(job, name=name, result=Result.failed)
+        for name in passing:
+            self.create_test(job, name=name, result=Result.passed)
+        return build
+
+    def get_streaks(self, project):
+        db.session.expire_all()
+        return {
+            s.name_sha: (s.first_build_id, s.streak_length, s.last_pass_build_id)
+            for s in TestFailureStreak.query.filter_by(project_id=project.id)
+        }
+
+    def test_simple(self):
+        project = self.create_project()
+        foo = TestCaseModel.calculate_name_sha('foo')
+        bar = TestCaseModel.calculate_name_sha('bar')
+
+        build_1 = self.create_finished_build(project, 1, failing=['foo'], passing=['bar'])
+        update_test_failure_streaks(project_id=project.id.hex, build_id=build_1.id.hex)
+        assert get_streaks_since(project.id) == build_1.date_created
+        assert self.get_streaks(project) == {
+            foo: (build_1.id, 1, None),
+        }
+
+        build_2 = self.create_finished_build(project, 2, failing=['foo', 'bar'])
+        update_test_failure_streaks(project_id=project.id.hex, build_id=build_2.id.hex)
+        assert self.get_streaks(project) == {
+            foo: (build_1.id, 2, None),
+            bar: (build_2.id, 1, None),
+        }
+
+        build_3 = self.create_finished_build(project, 3, failing=['bar'], passing=['foo'])
+        update_test_failure_streaks(project_id=project.id.hex, build_id=build_3.id.hex)
+        assert self.get_streaks(project) == {
+            foo: (None, 0, build_3.id),
+            bar: (build_2.id, 2, None),
+        }
+
+        build_4 = self.create_finished_build(project, 4, failing=['foo'])
+        update_test_failure_streaks(project_id=project.id.hex, build_id=build_4.id.hex)
+        assert self.get_streaks(project) == {
+            foo: (build_4.id, 1, build_3.id),
+            bar: (None, 0, build_4.id),
+        }
+
+    def test_out_of_order(self):
+        project = self.create_project()
+        foo = TestCaseModel.calculate_name_sha('foo')
+        bar = TestCaseModel.calculate_name_sha('bar')
+
+        def record(build):
+            update_test_failure_streaks(project_id=project.id.hex, build_id=build.id.hex)
+
+        build_1 = self.create_finished_build(project, 1, passing=['foo', 'bar'])
+        build_3 = self.create_finished_build(project, 3, failing=['foo', 'bar'])
+        record(build_1)
+        record(build_3)
+
+        # finished after a newer build, and failed right before its streak
+        build_2 = self.create_finished_build(project, 2, failing=['foo'], passing=['bar'])
+        record(build_2)
+        assert self.get_streaks(project) == {
+            foo: (build_2.id, 2, None),
+            bar: (build_3.id, 1, None),
+        }
+
+        build_5 = self.create_finished_build(project, 5, failing=['foo', 'bar'])
+        record(build_5)
+
+        # passed in the middle of a streak, which leaves its start unknown
+        build_4 = self.create_finished_build(project, 4, failing=['bar'], passing=['foo'])
+        record(build_4)
+        assert self.get_streaks(project) == {
+            foo: (None, 3, build_4.id),
+            bar: (build_3.id, 2, None),
+        }
+
+        # recording them again changes nothing
+        record(build_2)
+        record(build_4)
+        record(build_5)
+        assert self.get_streaks(project) == {
+            foo: (None, 3, build_4.id),
+            bar: (build_3.id, 2, None),
+        }
+
+    def test_ignores_diffs(self):
+        project = self.create_project()
+        patch = self.create_patch(repository=project.repository)
+        source = self.create_source(project, patch=patch)
+
+        build = self.create_finished_build(project, 1, failing=['foo'], source=source)
+        update_test_failure_streaks(project_id=project.id.hex, build_id=build.id.hex)
+
+        assert self.get_streaks(project) == {}
+        assert get_streaks_since(project.id) is None
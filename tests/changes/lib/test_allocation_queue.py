@@ -0,0 +1,118 @@
+from __future__ import absolute_import
+
+import mock
+
+from datetime import datetime
+from flask import current_app
+
+from changes.config import db, redis
+from changes.constants import Status
+from changes.db.utils import try_create
+from changes.lib import allocation_queue
+from changes.models.build import BuildPriority
+from changes.models.option import ItemOption
+from changes.testutils import TestCase
+
+
+class AllocationQueueTest(TestCase):
+    def setUp(self):
+        super(AllocationQueueTest, self).setUp()
+        patcher = mock.patch.dict(current_app.config, {'JOBSTEP_ALLOCATION_QUEUE_ENABLED': True})
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def create_pending_jobstep(self, build, **kwargs):
+        job = self.create_job(build)
+        return self.create_jobstep(
+            self.create_jobphase(job), status=Status.pending_allocation, **kwargs)
+
+    def test_get_score(self):
+        date = datetime(2016, 1, 1, 0, 0, 0, 5000)
+        assert allocation_queue.get_score(BuildPriority.default, date) == 1451606400005
+        assert allocation_queue.get_score(BuildPriority.high, date) < \
+            allocation_queue.get_score(BuildPriority.default, datetime(2000, 1, 1))
+        assert allocation_queue.get_score(BuildPriority.low, date) > \
+            allocation_queue.get_score(BuildPriority.default, datetime(2030, 1, 1))
+
+    def test_maintained_on_commit(self):
+        project = self.create_project()
+        build = self.create_build(project)
+        jobstep_1 = self.create_pending_jobstep(build, date_created=datetime(2016, 1, 1))
+        jobstep_2 = self.create_pending_jobstep(build, date_created=datetime(2016, 1, 2))
+        jobstep_3 = self.create_pending_jobstep(
+            build, date_created=datetime(2016, 1, 3), cluster='foo')
+        self.create_jobstep(self.create_jobphase(self.create_job(build)), status=Status.in_progress)
+
+        assert allocation_queue.get_candidates(None, 10) == [jobstep_1.id.hex, jobstep_2.id.hex]
+        assert allocation_queue.get_candidates('foo', 10) == [jobstep_3.id.hex]
+
+        # uncommitted changes aren't visible
+        jobstep_1.status = Status.allocated
+        db.session.flush()
+        assert allocation_queue.get_candidates(None, 10) == [jobstep_1.id.hex, jobstep_2.id.hex]
+        db.session.commit()
+        assert allocation_queue.get_candidates(None, 10) == [jobstep_2.id.hex]
+
+        jobstep_3.cluster = None
+        db.session.commit()
+        assert allocation_queue.get_candidates(None, 10) == [jobstep_2.id.hex, jobstep_3.id.hex]
+        assert allocation_queue.get_candidates('foo', 10) == []
+
+        other_build = self.create_build(project)
+        jobstep_4 = self.create_pending_jobstep(other_build, date_created=datetime(2016, 1, 4))
+        assert allocation_queue.get_candidates(None, 10) == [
+            jobstep_2.id.hex, jobstep_3.id.hex, jobstep_4.id.hex]
+
+        other_build.priority = BuildPriority.high
+        db.session.commit()
+        assert allocation_queue.get_candidates(None, 10) == [
+            jobstep_4.id.hex, jobstep_2.id.hex, jobstep_3.id.hex]
+
+    def test_savepoint_rollback(self):
+        project = self.create_project()
+        build = self.create_build(project)
+        jobstep = self.create_pending_jobstep(build)
+        assert allocation_queue.get_candidates(None, 10) == [jobstep.id.hex]
+
+        where = {'item_id': project.id, 'name': 'foo', 'value': '1'}
+        assert try_create(ItemOption, where) is not None
+        db.session.commit()
+
+        jobstep.status = Status.allocated
+        db.session.flush()
+        # conflicts, rolling back to a savepoint
+        assert try_create(ItemOption, where) is None
+        db.session.commit()
+
+        assert allocation_queue.get_candidates(None, 10) == []
+
+    def test_rollback(self):
+        project = self.create_project()
+        build = self.create_build(project)
+        jobstep = self.create_pending_jobstep(build)
+
+        jobstep.status = Status.allocated
+        db.session.flush()
+        db.session.rollback()
+        db.session.commit()
+
+        assert allocation_queue.get_candidates(None, 10) == [jobstep.id.hex]
+
+    def test_reconcile(self):
+        project = self.create_project()
+        build = self.create_build(project)
+        jobstep_1 = self.create_pending_jobstep(build, date_created=datetime(2016, 1, 1))
+        jobstep_2 = self.create_pending_jobstep(build, date_created=datetime(2016, 1, 2))
+        jobstep_3 = self.create_pending_jobstep(build, date_created=datetime(2016, 1, 3))
+
+        redis.flushdb()
+        redis.zadd(allocation_queue.get_queue_key(None), **{'a' * 32: 0})
+        redis.zadd(allocation_queue.get_queue_key('foo'), **{jobstep_2.id.hex: 0})
+        redis.zadd(allocation_queue.get_queue_key(None), **{jobstep_3.id.hex: 0})
+
+        assert allocation_queue.reconcile() == (3, 2)
+        assert allocation_queue.get_candidates(None, 10) == [
+            jobstep_1.id.hex, jobstep_2.id.hex, jobstep_3.id.hex]
+        assert allocation_queue.get_candidates('foo', 10) == []
+
+        assert allocation_queue.reconcile() == (0, 0)
@@ -0,0 +1,49 @@
+from __future__ import absolute_import
+
+import mock
+
+from changes.lib.coverage import (
+    get_coverage_stats, merge_coverage, merge_coverages, merged_coverage_data
+)
+
+
+def test_merge_coverage():
+    assert merge_coverage('NUCNUCNUC', 'NNNUUUCCC') == 'NUCUUCCCC'
+    assert merge_coverage('CU', 'NNUC') == 'CUUC'
+    assert merge_coverage('NNUC', 'CU') == 'CUUC'
+    assert merge_coverage('', 'UC') == 'UC'
+    assert merge_coverage('', '') == ''
+
+
+def test_merge_coverage_unknown_characters():
+    assert merge_coverage('X?C', 'NNU') == 'NNC'
+    assert merge_coverage(u'UNC', u'CN\xe9') == 'CNC'
+
+
+def test_merge_coverages():
+    assert merge_coverages(['UNNN', 'NUN', 'NNC', 'C']) == 'CUCN'
+    assert merge_coverages(['NUC']) == 'NUC'
+    assert merge_coverages([]) == ''
+
+
+def test_merged_coverage_data():
+    coverages = [
+        mock.Mock(filename='foo.py', data='UUNN'),
+        mock.Mock(filename='bar.py', data='NC'),
+        mock.Mock(filename='foo.py', data='NCCU'),
+        mock.Mock(filename='foo.py', data='C'),
+    ]
+    assert merged_coverage_data(coverages) == {
+        'foo.py': 'CCCU',
+        'bar.py': 'NC',
+    }
+
+
+def test_get_coverage_stats():
+    stats = get_coverage_stats({1, 2, 3, 5, 100}, 'CUNCUC')
+    assert stats.lines_covered == 3
+    assert stats.lines_uncovered == 2
+    assert stats.diff_lines_covered == 1
+    assert stats.diff_lines_uncovered == 2
+
+    assert get_coverage_stats(set(), '') == (0, 0, 0, 0)
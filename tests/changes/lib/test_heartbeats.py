@@ -0,0 +1,88 @@
+from __future__ import absolute_import
+
+import mock
+
+from datetime import datetime
+from flask import current_app
+
+from changes.config import db, redis
+from changes.constants import Status
+from changes.lib import heartbeats
+from changes.models.jobstep import JobStep
+from changes.testutils import TestCase
+
+
+class HeartbeatsTest(TestCase):
+    def setUp(self):
+        super(HeartbeatsTest, self).setUp()
+        patcher = mock.patch.dict(current_app.config, {'JOBSTEP_HEARTBEAT_REDIS_ENABLED': True})
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+        project = self.create_project()
+        build = self.create_build(project)
+        job = self.create_job(build)
+        self.jobphase = self.create_jobphase(job)
+
+    def test_record(self):
+        jobstep = self.create_jobstep(self.jobphase, status=Status.in_progress)
+        assert heartbeats.get_last_heartbeat(jobstep) is None
+
+        date = datetime(2016, 9, 13, 23, 56, 14, 123)
+        heartbeats.record(jobstep, date)
+        db.session.commit()
+
+        db.session.expire_all()
+        assert JobStep.query.get(jobstep.id).last_heartbeat is None
+        assert heartbeats.get_last_heartbeat(jobstep) == date
+
+    def test_get_last_heartbeat_prefers_latest(self):
+        jobstep = self.create_jobstep(
+            self.jobphase, status=Status.allocated,
+            last_heartbeat=datetime(2016, 9, 13, 12, 0, 0))
+
+        heartbeats.record(jobstep, datetime(2016, 9, 13, 11, 0, 0))
+        assert heartbeats.get_last_heartbeat(jobstep) == datetime(2016, 9, 13, 12, 0, 0)
+
+        heartbeats.record(jobstep, datetime(2016, 9, 13, 13, 0, 0))
+        assert heartbeats.get_last_heartbeat(jobstep) == datetime(2016, 9, 13, 13, 0, 0)
+
+    def test_flush(self):
+        jobstep_1 = self.create_jobstep(self.jobphase, status=Status.in_progress)
+        # allocated again since its last recorded heartbeat
+        jobstep_2 = self.create_jobstep(
+            self.jobphase, status=Status.allocated,
+            last_heartbeat=datetime(2016, 9, 13, 12, 0, 0))
+        jobstep_3 = self.create_jobstep(self.jobphase, status=Status.in_progress)
+
+        heartbeats.record(jobstep_1, datetime(2016, 9, 13, 13, 0, 0))
+        heartbeats.record(jobstep_2, datetime(2016, 9, 13, 11, 0, 0))
+
+        assert heartbeats.flush() == 2
+        assert not redis.exists(heartbeats.HEARTBEATS_KEY)
+        assert not redis.exists(heartbeats.FLUSHING_KEY)
+
+        db.session.expire_all()
+        assert JobStep.query.get(jobstep_1.id).last_heartbeat == datetime(2016, 9, 13, 13, 0, 0)
+        assert JobStep.query.get(jobstep_2.id).last_heartbeat == datetime(2016, 9, 13, 12, 0, 0)
+        assert JobStep.query.get(jobstep_3.id).last_heartbeat is None
+
+        assert heartbeats.flush() == 0
+
+    def test_flush_left_behind(self):
+        jobstep_1 = self.create_jobstep(self.jobphase, status=Status.in_progress)
+        jobstep_2 = self.create_jobstep(self.jobphase, status=Status.in_progress)
+
+        # a flush failed after taking over these
+        heartbeats.record(jobstep_1, datetime(2016, 9, 13, 13, 0, 0))
+        redis.rename(heartbeats.HEARTBEATS_KEY, heartbeats.FLUSHING_KEY)
+        heartbeats.record(jobstep_2, datetime(2016, 9, 13, 14, 0, 0))
+
+        assert heartbeats.get_last_heartbeat(jobstep_1) == datetime(2016, 9, 13, 13, 0, 0)
+
+        assert heartbeats.flush() == 1
+        assert heartbeats.flush() == 1
+
+        db.session.expire_all()
+        assert JobStep.query.get(jobstep_1.id).last_heartbeat == datetime(2016, 9, 13, 13, 0, 0)
+        assert JobStep.query.get(jobstep_2.id).last_heartbeat == datetime(2016, 9, 13, 14, 0, 0)
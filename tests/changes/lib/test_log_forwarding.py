@@ -0,0 +1,61 @@
+from __future__ import absolute_import
+
+import pytest
+import threading
+
+from changes.lib.log_forwarding import coalesced_read_ahead
+
+
+def test_coalesces_chunks_read_ahead():
+    chunks = ['%04d' % i for i in range(100)]
+    read_all = threading.Event()
+
+    def source():
+        for chunk in chunks:
+            yield chunk
+        read_all.set()
+
+    writes = coalesced_read_ahead(source(), max_size=40, max_buffered=200)
+    result = [next(writes)]
+    # everything is read ahead while the consumer is busy
+    assert read_all.wait(5)
+    result.extend(writes)
+
+    assert ''.join(result) == ''.join(chunks)
+    assert all(len(w) <= 40 for w in result)
+    assert len(result) <= 1 + 10
+
+
+def test_oversized_chunk():
+    writes = coalesced_read_ahead(iter(['a' * 10, 'b']), max_size=4, max_buffered=2)
+    assert ''.join(writes) == 'a' * 10 + 'b'
+
+
+def test_empty():
+    assert list(coalesced_read_ahead(iter([]), max_size=4, max_buffered=2)) == []
+
+
+def test_source_error():
+    def source():
+        yield 'foo'
+        raise ValueError('boom')
+
+    writes = coalesced_read_ahead(source(), max_size=4, max_buffered=2)
+    with pytest.raises(ValueError):
+        list(writes)
+
+
+def test_close_stops_reader():
+    stopped = threading.Event()
+
+    def source():
+        try:
+            while True:
+                yield 'x'
+        finally:
+            stopped.set()
+
+    writes = coalesced_read_ahead(source(), max_size=4, max_buffered=2)
+    assert next(writes)
+    writes.close()
+    assert stopped.wait(5)
@@ -0,0 +1,117 @@
+from __future__ import absolute_import
+
+import mock
+
+from datetime import datetime
+
+from changes.config import db
+from changes.lib import revision_ingestion
+from changes.models.author import Author
+from changes.models.revision import Revision
+from changes.models.source import Source
+from changes.testutils import TestCase
+from changes.vcs.base import RevisionResult, Vcs
+
+
+class RevisionIngestionTest(TestCase):
+    def setUp(self):
+        super(RevisionIngestionTest, self).setUp()
+        self.repo = self.create_repo()
+
+        self.vcs = mock.MagicMock(spec=Vcs)
+        self.vcs.get_patch_hashes.side_effect = lambda shas: {sha: 'f' * 40 for sha in shas}
+        self.vcs.get_patch_hash.return_value = 'f' * 40
+        patcher = mock.patch('changes.models.repository.Repository.get_vcs', return_value=self.vcs)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def get_commit(self, i, branches=None, author='Foo Bar <foo@example.com>'):
+        return RevisionResult(
+            id=str(i) * 40,
+            message='commit %d' % (i,),
+            author=author,
+            committer='Committer <committer@example.com>',
+            author_date=datetime(2013, 9, 19, 22, 15, i),
+            parents=[str(i - 1) * 40] if i else [],
+            branches=branches,
+        )
+
+    def get_revisions(self):
+        db.session.expire_all()
+        return {r.sha: r for r in Revision.query.filter(Revision.repository_id == self.repo.id)}
+
+    def test_backfill(self):
+        existing_author = self.create_author(email='foo@example.com', name='Foo')
+        self.get_commit(3, branches=['master']).save(self.repo)
+        db.session.commit()
+
+        commits = [
+            self.get_commit(3, branches=['master']),
+            self.get_commit(2, branches=['master'], author='bar'),
+            self.get_commit(1, branches=['master']),
+        ]
+        assert revision_ingestion.backfill_revisions(self.repo, commits) == 2
+
+        revisions = self.get_revisions()
+        assert sorted(revisions) == ['1' * 40, '2' * 40, '3' * 40]
+
+        revision = revisions['1' * 40]
+        assert revision.author_id == existing_author.id
+        assert revision.committer.email == 'committer@example.com'
+        assert revision.message == 'commit 1'
+        assert revision.parents == ['0' * 40]
+        assert revision.patch_hash == 'f' * 40
+        assert revision.date_created == datetime(2013, 9, 19, 22, 15, 1)
+        assert revision.branches is None
+        assert revision.date_created_signal is None
+        assert revisions['2' * 40].author.email == 'bar@localhost'
+        assert revisions['3' * 40].branches == ['master']
+
+        assert Source.query.filter(
+            Source.repository_id == self.repo.id,
+            Source.patch_id.is_(None),
+        ).count() == 3
+        assert Author.query.filter(Author.email == 'foo@example.com').count() == 1
+
+        # everything is known now
+        assert revision_ingestion.backfill_revisions(self.repo, commits) == 0
+
+    def test_sync(self):
+        signalled = self.get_commit(4, branches=['master']).save(self.repo)[0]
+        signalled.date_created_signal = datetime(2013, 9, 20)
+        self.get_commit(3, branches=[]).save(self.repo)
+        db.session.commit()
+
+        commits = [
+            self.get_commit(4, branches=['master', 'other']),
+            # its branches were discovered since it was saved
+            self.get_commit(3, branches=['master']),
+            self.get_commit(2, branches=[]),
+            self.get_commit(1, branches=['master']),
+        ]
+        assert revision_ingestion.sync_revisions(self.repo, commits) == ['3' * 40, '1' * 40]
+        db.session.commit()
+
+        revisions = self.get_revisions()
+        assert revisions['4' * 40].branches == ['master']
+        assert revisions['4' * 40].date_created_signal == datetime(2013, 9, 20)
+        assert revisions['3' * 40].branches == ['master']
+        assert revisions['3' * 40].date_created_signal is not None
+        assert revisions['2' * 40].branches == []
+        assert revisions['2' * 40].date_created_signal is None
+        assert revisions['1' * 40].date_created_signal is not None
+
+        assert revision_ingestion.sync_revisions(self.repo, commits) == []
+
+    def test_sync_created_concurrently(self):
+        commits = [self.get_commit(2, branches=['master']), self.get_commit(1, branches=['master'])]
+        commits[1].save(self.repo)
+        db.session.commit()
+
+        # as if it was created after we looked for known revisions
+        with mock.patch.object(revision_ingestion, '_get_known_revisions', return_value={}):
+            shas = revision_ingestion.sync_revisions(self.repo, commits)
+        db.session.commit()
+
+        assert shas == ['2' * 40, '1' * 40]
+        assert sorted(self.get_revisions()) == ['1' * 40, '2' * 40]
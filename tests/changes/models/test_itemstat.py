@@ -0,0 +1,48 @@
+from __future__ import absolute_import
+
+import mock
+
+from changes.config import db
+from changes.models.itemstat import ItemStat, create_item_stats, increment_item_stats
+from changes.testutils.cases import TestCase
+
+
+def _stats(item_id):
+    return dict(db.session.query(ItemStat.name, ItemStat.value).filter(
+        ItemStat.item_id == item_id,
+    ))
+
+
+class CreateItemStatsTest(TestCase):
+    def test_creates_missing(self):
+        project = self.create_project()
+        self.create_itemstat(project.id, 'foo', 3)
+
+        with mock.patch('changes.models.itemstat.try_create') as try_create:
+            created = create_item_stats(project.id, {'foo': 1, 'bar': 2, 'baz': 0})
+
+        assert created == {'bar', 'baz'}
+        assert not try_create.called
+        assert _stats(project.id) == {'foo': 3, 'bar': 2, 'baz': 0}
+
+    def test_created_concurrently(self):
+        project = self.create_project()
+        self.create_itemstat(project.id, 'foo', 3)
+
+        # as if `foo` was created after the stats were looked up
+        with mock.patch('changes.models.itemstat.db.session.query') as query:
+            query.return_value.filter.return_value = []
+            created = create_item_stats(project.id, {'foo': 1, 'bar': 2})
+
+        assert created == {'bar'}
+        assert _stats(project.id) == {'foo': 3, 'bar': 2}
+
+
+class IncrementItemStatsTest(TestCase):
+    def test_simple(self):
+        project = self.create_project()
+        self.create_itemstat(project.id, 'foo', 3)
+
+        increment_item_stats(project.id, {'foo': 1, 'bar': 2, 'baz': -1})
+
+        assert _stats(project.id) == {'foo': 4, 'bar': 2, 'baz': -1}
@@ -311,3 +311,54 @@ sudo apt-get install -y --force-yes bazel python >/dev/null 2>&1
         _, implementation = JobPlan.get_build_step_for_job(self._create_job_and_jobplan().id)
 
         assert implementation is None
+
+    @mock.patch('changes.models.repository.Repository.get_vcs')
+    @mock.patch('changes.models.project.Project.get_config')
+    def test_build_step_is_cached(self, get_config, get_vcs):
+        get_vcs.return_value = mock.Mock(spec=Vcs)
+        get_config.return_value = {
+            'bazel.additional-test-flags': [],
+            'bazel.targets': [
+                '//aa/bb/cc/...',
+            ],
+            'bazel.exclude-tags': [],
+            'bazel.cpus': 1,
+            'bazel.mem': 1234,
+            'bazel.max-executors': 1,
+        }
+
+        job = self._create_job_and_jobplan()
+        jobplan, implementation = JobPlan.get_build_step_for_job(job.id)
+        assert implementation is not None
+        assert JobPlan.get_build_step_for_job(job.id) == (jobplan, implementation)
+        assert get_config.call_count == 1
+
+        JobPlan.invalidate_build_step_cache(job.id)
+        _, new_implementation = JobPlan.get_build_step_for_job(job.id)
+        assert new_implementation is not implementation
+        assert get_config.call_count == 2
+
+    @mock.patch('changes.models.repository.Repository.get_vcs')
+    @mock.patch('changes.models.project.Project.get_config')
+    def test_build_step_failure_not_cached(self, get_config, get_vcs):
+        get_vcs.return_value = mock.Mock(spec=Vcs)
+        # as if the config couldn't be read from the repository
+        get_config.return_value = {}
+
+        job = self._create_job_and_jobplan()
+        _, implementation = JobPlan.get_build_step_for_job(job.id)
+        assert implementation is None
+
+        get_config.return_value = {
+            'bazel.additional-test-flags': [],
+            'bazel.targets': [
+                '//aa/bb/cc/...',
+            ],
+            'bazel.exclude-tags': [],
+            'bazel.cpus': 1,
+            'bazel.mem': 1234,
+            'bazel.max-executors': 1,
+        }
+        _, implementation = JobPlan.get_build_step_for_job(job.id)
+        assert implementation is not None
+        assert get_config.call_count == 2
@@ -3,7 +3,10 @@ from __future__ import absolute_import
 import mock
 import pytest
 
+from flask import current_app
+
 from changes.config import db
+from changes.lib import project_config_cache
 from changes.models.project import ProjectConfigError
 from changes.vcs.base import Vcs, CommandError, InvalidDiffError
 from changes.testutils import TestCase
@@ -74,3 +77,41 @@ class GetConfigTest(TestCase):
             'default1': 1,
             'default2': 2,
         }
+
+    def test_cached(self):
+        fake_vcs = mock.Mock(spec=Vcs)
+        fake_vcs.read_file.return_value = '{"item": true}'
+        with mock.patch('changes.models.repository.Repository.get_vcs') as mocked:
+            mocked.return_value = fake_vcs
+            config = self.project.get_config('a' * 40)
+            config['item'] = False
+            assert self.project.get_config('a' * 40)['item'] is True
+            assert fake_vcs.read_file.call_count == 1
+
+            # different diffs and unresolved revisions are read separately
+            self.project.get_config('a' * 40, diff='diff')
+            self.project.get_config('a' * 40, diff='diff')
+            assert fake_vcs.read_file.call_count == 2
+            self.project.get_config('master')
+            self.project.get_config('master')
+            assert fake_vcs.read_file.call_count == 4
+
+    def test_cached_in_redis(self):
+        fake_vcs = mock.Mock(spec=Vcs)
+        fake_vcs.read_file.return_value = '{"item": true}'
+        with mock.patch('changes.models.repository.Repository.get_vcs') as mocked, \
+                mock.patch.dict(current_app.config, {'PROJECT_CONFIG_CACHE_REDIS_TTL': 60}):
+            mocked.return_value = fake_vcs
+            self.project.get_config('a' * 40)
+            project_config_cache.clear_local_cache()
+            assert self.project.get_config('a' * 40)['item'] is True
+        assert fake_vcs.read_file.call_count == 1
+
+    def test_read_errors_not_cached(self):
+        fake_vcs = mock.Mock(spec=Vcs)
+        fake_vcs.read_file.side_effect = CommandError('test command', 128)
+        with mock.patch('changes.models.repository.Repository.get_vcs') as mocked:
+            mocked.return_value = fake_vcs
+            self.project.get_config('a' * 40)
+            self.project.get_config('a' * 40)
+        assert fake_vcs.read_file.call_count == 2
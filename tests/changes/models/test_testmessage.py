@@ -0,0 +1,112 @@
+import mock
+
+from cStringIO import StringIO
+from uuid import uuid4
+
+from changes.config import db
+from changes.models.testmessage import TestMessage, get_messages
+from changes.storage.mock import FileStorageCache
+from changes.testutils.cases import TestCase
+
+
+class GetMessagesTestCase(TestCase):
+    def setUp(self):
+        super(GetMessagesTestCase, self).setUp()
+        project = self.create_project()
+        build = self.create_build(project)
+        self.job = self.create_job(build)
+        jobphase = self.create_jobphase(self.job)
+        self.jobstep = self.create_jobstep(jobphase)
+        self.test = self.create_test(self.job)
+
+    def _create_artifact(self, content):
+        artifact = self.create_artifact(self.jobstep, uuid4().hex + '.xml')
+        artifact.file.save(StringIO(content), uuid4().hex)
+        db.session.add(artifact)
+        db.session.commit()
+        return artifact
+
+    def _create_message(self, artifact, start_offset, length):
+        message = TestMessage(
+            test=self.test,
+            artifact=artifact,
+            label='system-out',
+            start_offset=start_offset,
+            length=length,
+        )
+        db.session.add(message)
+        db.session.commit()
+        return message
+
+    def test_simple(self):
+        content = ''.join('%04d' % i for i in range(1000))
+        artifact = self._create_artifact(content)
+        other_artifact = self._create_artifact('other content')
+
+        messages = [
+            self._create_message(artifact, 40, 8),
+            self._create_message(artifact, 0, 4),
+            self._create_message(artifact, 3000, 12),
+            self._create_message(artifact, 4, 4),
+            self._create_message(other_artifact, 6, 7),
+        ]
+
+        with mock.patch.object(FileStorageCache, 'get_file',
+                               autospec=True, side_effect=FileStorageCache.get_file) as get_file:
+            bodies = get_messages(messages)
+
+        assert bodies == {m.id: m.get_message() for m in messages}
+        assert bodies[messages[0].id] == '00100011'
+        assert bodies[messages[4].id] == 'content'
+        # one read for each artifact
+        assert get_file.call_count == 2
+
+    def test_far_apart(self):
+        content = ''.join('%04d' % i for i in range(1000))
+        artifact = self._create_artifact(content)
+        messages = [
+            self._create_message(artifact, 0, 4),
+            self._create_message(artifact, 100, 4),
+            self._create_message(artifact, 3996, 4),
+        ]
+
+        with mock.patch('changes.models.testmessage.MAX_RANGE_GAP', 1000), \
+                mock.patch.object(FileStorageCache, 'get_file',
+                                  autospec=True, side_effect=FileStorageCache.get_file) as get_file:
+            bodies = get_messages(messages)
+
+        assert bodies == {
+            messages[0].id: '0000',
+            messages[1].id: '0025',
+            messages[2].id: '0999',
+        }
+        assert get_file.call_count == 2
+
+    def test_read_size_limit(self):
+        content = ''.join('%04d' % i for i in range(1000))
+        artifact = self._create_artifact(content)
+        messages = [self._create_message(artifact, i * 4, 4) for i in range(10)]
+
+        with mock.patch('changes.models.testmessage.MAX_RANGE_READ', 12), \
+                mock.patch.object(FileStorageCache, 'get_file',
+                                  autospec=True, side_effect=FileStorageCache.get_file) as get_file:
+            bodies = get_messages(messages)
+
+        assert [bodies[m.id] for m in messages] == ['%04d' % i for i in range(10)]
+        assert get_file.call_count == 4
+
+    def test_empty_messages(self):
+        artifact = self._create_artifact('foo')
+        messages = [
+            self._create_message(artifact, 0, 0),
+            self._create_message(artifact, 3, 0),
+        ]
+
+        with mock.patch.object(FileStorageCache, 'get_file') as get_file:
+            bodies = get_messages(messages)
+
+        assert bodies == {messages[0].id: '', messages[1].id: ''}
+        assert not get_file.called
+
+    def test_no_messages(self):
+        assert get_messages([]) == {}
@@ -6,7 +6,9 @@ from changes.constants import Result
 from changes.lib.artifact_store_mock import ArtifactStoreMock
 from changes.models.failurereason import FailureReason
 from changes.models.itemstat import ItemStat
-from changes.models.testresult import TestResult, TestResultManager, logger
+from changes.models.testresult import (
+    TestResult, TestResultManager, count_test_stats, logger, recount_test_stats
+)
 from changes.testutils.cases import TestCase
 
 
@@ -385,3 +387,216 @@ class TestResultManagerTestCase(TestCase):
         failures = FailureReason.query.filter_by(step_id=jobstep2.id).all()
         assert len(failures) == 1
         assert failures[0].reason == 'duplicate_test_name'
+
+    @mock.patch('changes.models.testresult.ArtifactStoreClient', ArtifactStoreMock)
+    @mock.patch('changes.storage.artifactstore.ArtifactStoreClient', ArtifactStoreMock)
+    @mock.patch('changes.models.testresult.TESTCASE_INSERT_CHUNK_SIZE', 2)
+    def test_duplicate_tests_across_chunks(self):
+        from changes.models.test import TestCase
+
+        project = self.create_project()
+        build = self.create_build(project)
+        job = self.create_job(build)
+        jobphase = self.create_jobphase(job)
+        jobstep = self.create_jobstep(jobphase, label='STEP1')
+        artifact = self.create_artifact(jobstep, 'junit.xml')
+
+        results = [
+            TestResult(
+                step=jobstep,
+                name='test_%d' % (i % 3),
+                package='project.tests',
+                result=Result.passed,
+                duration=10,
+                message_offsets=[('system-out', i * 100, 10)],
+            )
+            for i in range(5)
+        ]
+        manager = TestResultManager(jobstep, artifact)
+        manager.save(results)
+
+        testcase_list = sorted(TestCase.query.all(), key=lambda x: x.name)
+
+        assert [t.name for t in testcase_list] == [
+            'project.tests.test_0', 'project.tests.test_1', 'project.tests.test_2',
+        ]
+        assert testcase_list[0].result == Result.failed
+        assert testcase_list[1].result == Result.failed
+        assert testcase_list[2].result == Result.passed
+        assert len(testcase_list[0].messages) == 2
+        assert len(testcase_list[1].messages) == 2
+        assert len(testcase_list[2].messages) == 1
+
+        assert _stat(jobstep, 'test_count') == 3
+        assert _stat(jobstep, 'test_failures') == 2
+
+        failures = FailureReason.query.filter_by(step_id=jobstep.id).all()
+        assert len(failures) == 1
+        assert failures[0].reason == 'duplicate_test_name'
+
+    @mock.patch('changes.models.testresult.ArtifactStoreClient', ArtifactStoreMock)
+    @mock.patch('changes.storage.artifactstore.ArtifactStoreClient', ArtifactStoreMock)
+    def test_concurrent_duplicate_falls_back_to_single_inserts(self):
+        from changes.models.test import TestCase
+
+        project = self.create_project()
+        build = self.create_build(project)
+        job = self.create_job(build)
+        jobphase = self.create_jobphase(job)
+        jobstep = self.create_jobstep(jobphase, label='STEP1')
+        jobstep2 = self.create_jobstep(jobphase, label='STEP2')
+        artifact2 = self.create_artifact(jobstep2, 'junit.xml')
+
+        existing = self.create_test(
+            job=job, step=jobstep, name='project.tests.test_foo', result=Result.passed)
+
+        results = [
+            TestResult(
+                step=jobstep2,
+                name='test_foo',
+                package='project.tests',
+                result=Result.passed,
+                duration=11,
+            ),
+            TestResult(
+                step=jobstep2,
+                name='test_bar',
+                package='project.tests',
+                result=Result.passed,
+                duration=13,
+            ),
+        ]
+        manager = TestResultManager(jobstep2, artifact2)
+        # Simulate the other step committing between our lookup and insert.
+        with mock.patch('changes.models.testresult._get_existing_testcase_ids', return_value={}):
+            manager.save(results)
+
+        testcase_list = sorted(TestCase.query.all(), key=lambda x: x.name)
+
+        assert len(testcase_list) == 2
+        assert testcase_list[0].name == 'project.tests.test_bar'
+        assert testcase_list[0].step_id == jobstep2.id
+        assert testcase_list[1].id == existing.id
+        assert testcase_list[1].result == Result.failed
+        assert testcase_list[1].message.endswith('\nSTEP1\nSTEP2\n')
+
+        assert _stat(jobstep2, 'test_count') == 1
+
+        failures = FailureReason.query.filter_by(step_id=jobstep2.id).all()
+        assert len(failures) == 1
+
+    @mock.patch('changes.models.testresult.ArtifactStoreClient', ArtifactStoreMock)
+    @mock.patch('changes.storage.artifactstore.ArtifactStoreClient', ArtifactStoreMock)
+    def test_stats_accumulate_across_artifacts(self):
+        project = self.create_project()
+        build = self.create_build(project)
+        job = self.create_job(build)
+        jobphase = self.create_jobphase(job)
+        jobstep = self.create_jobstep(jobphase)
+
+        for i in range(3):
+            artifact = self.create_artifact(jobstep, 'junit%d.xml' % i)
+            TestResultManager(jobstep, artifact).save([
+                TestResult(
+                    step=jobstep,
+                    name='test_%d_passed' % i,
+                    package='project.tests',
+                    result=Result.passed,
+                    duration=10,
+                    reruns=i,
+                ),
+                TestResult(
+                    step=jobstep,
+                    name='test_%d_failed' % i,
+                    package='project.tests',
+                    result=Result.failed,
+                    duration=5,
+                ),
+            ])
+
+        assert _stat(jobstep, 'test_count') == 6
+        assert _stat(jobstep, 'test_failures') == 3
+        assert _stat(jobstep, 'test_duration') == 45
+        assert _stat(jobstep, 'test_rerun_count') == 2
+
+        artifact = self.create_artifact(jobstep, 'junit3.xml')
+        TestResultManager(jobstep, artifact).merge([
+            TestResult(
+                step=jobstep,
+                name='test_0_passed',
+                package='project.tests',
+                result=Result.failed,
+                duration=7,
+                reruns=1,
+            ),
+        ])
+
+        assert _stat(jobstep, 'test_count') == 6
+        assert _stat(jobstep, 'test_failures') == 4
+        assert _stat(jobstep, 'test_duration') == 52
+        assert _stat(jobstep, 'test_rerun_count') == 3
+        assert _stat(jobstep, 'test_result_passed') == 2
+        assert _stat(jobstep, 'test_result_failed') == 4
+
+        for name, value in count_test_stats(jobstep).items():
+            assert _stat(jobstep, name) == value
+
+    def test_merge_duplicate_of_other_step(self):
+        from changes.models.test import TestCase
+
+        project = self.create_project()
+        build = self.create_build(project)
+        job = self.create_job(build)
+        jobphase = self.create_jobphase(job)
+        jobstep = self.create_jobstep(jobphase, label='STEP1')
+        jobstep2 = self.create_jobstep(jobphase, label='STEP2')
+
+        TestResultManager(jobstep, self.create_artifact(jobstep, 'junit.xml')).save([
+            TestResult(step=jobstep, name='test_foo', package='project.tests',
+                       result=Result.passed, duration=12),
+        ])
+        # a later batch of STEP2's artifact repeats a test only STEP1 saved
+        manager = TestResultManager(jobstep2, self.create_artifact(jobstep2, 'junit.xml'))
+        manager.save([
+            TestResult(step=jobstep2, name='test_bar', package='project.tests',
+                       result=Result.passed, duration=5),
+        ])
+        manager.merge([
+            TestResult(step=jobstep2, name='test_foo', package='project.tests',
+                       result=Result.passed, duration=7),
+        ])
+
+        testcase = TestCase.query.filter_by(step_id=jobstep.id).one()
+        assert testcase.result == Result.failed
+        assert testcase.duration == 12
+        assert testcase.message.endswith('\nSTEP1\nSTEP2\n')
+
+        assert _stat(jobstep, 'test_failures') == 1
+        assert _stat(jobstep2, 'test_count') == 1
+        assert _stat(jobstep2, 'test_duration') == 5
+
+        failures = FailureReason.query.filter_by(step_id=jobstep2.id).all()
+        assert len(failures) == 1
+        assert failures[0].reason == 'duplicate_test_name'
+
+    def test_recount_test_stats(self):
+        project = self.create_project()
+        build = self.create_build(project)
+        job = self.create_job(build)
+        jobphase = self.create_jobphase(job)
+        jobstep = self.create_jobstep(jobphase)
+
+        self.create_test(job=job, step=jobstep, name='test_foo', result=Result.failed, duration=3, reruns=2)
+        self.create_test(job=job, step=jobstep, name='test_bar', result=Result.passed, duration=4)
+        self.create_itemstat(jobstep.id, 'test_count', 10)
+        self.create_itemstat(jobstep.id, 'test_result_skipped', 3)
+
+        recount_test_stats(jobstep)
+
+        assert _stat(jobstep, 'test_count') == 2
+        assert _stat(jobstep, 'test_failures') == 1
+        assert _stat(jobstep, 'test_duration') == 7
+        assert _stat(jobstep, 'test_rerun_count') == 1
+        assert _stat(jobstep, 'test_result_failed') == 1
+        assert _stat(jobstep, 'test_result_passed') == 1
+        assert _stat(jobstep, 'test_result_skipped') == 0
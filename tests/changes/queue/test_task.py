@@ -3,6 +3,7 @@ from __future__ import absolute_import
 import mock
 
 from datetime import datetime, timedelta
+from flask import current_app
 from uuid import UUID
 
 from changes.config import db, statsreporter
@@ -10,6 +11,7 @@ from changes.constants import Result, Status
 from changes.ext.statsreporter import Stats
 from changes.models.task import Task
 from changes.testutils import TestCase
+from changes.queue import task_state
 from changes.queue.task import tracked_task
 
 
@@ -28,6 +30,11 @@ def error_task(foo='bar'):
     raise Exception
 
 
+@tracked_task
+def superseded_task(foo='bar'):
+    raise superseded_task.Superseded
+
+
 class LagTest(TestCase):
     def test_report_lag(self):
         creation_date = datetime(2016, 8, 12, 17, 42, 27)
@@ -153,6 +160,100 @@ class DelayIfNeededTest(TestCase):
         })
 
 
+class DelayManyTest(TestCase):
+    @mock.patch('changes.config.queue.delay_many')
+    def test_simple(self, queue_delay_many):
+        task_ids = [
+            UUID('33846695b2774b29a71795a009e8168a'),
+            UUID('4a4f2c8c9b8f4b5fa5b4bb3d4fbbf7a1'),
+        ]
+        parent_task_id = UUID('659974858dcf4aa08e73a940e1066328')
+        existing = self.create_task(
+            task_name='success_task',
+            task_id=task_ids[1],
+            parent_id=parent_task_id,
+            status=Status.in_progress,
+            date_created=datetime(2013, 9, 19, 22, 15, 22),
+        )
+
+        success_task.delay_many([{
+            'foo': foo,
+            'task_id': task_id.hex,
+            'parent_task_id': parent_task_id.hex,
+        } for foo, task_id in zip(['bar', 'baz'], task_ids)])
+
+        queue_delay_many.assert_called_once_with('success_task', [{
+            'foo': foo,
+            'task_id': task_id.hex,
+            'parent_task_id': parent_task_id.hex,
+        } for foo, task_id in zip(['bar', 'baz'], task_ids)])
+
+        task = Task.query.filter(
+            Task.task_id == task_ids[0],
+            Task.task_name == 'success_task'
+        ).first()
+
+        assert task
+        assert task.status == Status.queued
+        assert task.parent_id == parent_task_id
+        assert task.data == {
+            'kwargs': {'foo': 'bar'},
+        }
+        assert task.date_created == task.date_modified
+
+        db.session.refresh(existing)
+        assert existing.status == Status.in_progress
+        assert existing.date_modified > datetime(2013, 9, 19, 22, 15, 22)
+
+    @mock.patch('changes.config.queue.delay_many')
+    def test_duplicates(self, queue_delay_many):
+        task_id = UUID('33846695b2774b29a71795a009e8168a')
+
+        success_task.delay_many([
+            {'foo': 'bar', 'task_id': task_id.hex},
+            {'foo': 'bar', 'task_id': task_id.hex},
+        ])
+
+        queue_delay_many.assert_called_once_with('success_task', [
+            {'foo': 'bar', 'task_id': task_id.hex},
+        ])
+        assert Task.query.filter(Task.task_id == task_id).count() == 1
+
+
+class DelayIfNeededManyTest(TestCase):
+    @mock.patch('changes.config.queue.delay_many')
+    def test_simple(self, queue_delay_many):
+        task_ids = [
+            UUID('33846695b2774b29a71795a009e8168a'),
+            UUID('4a4f2c8c9b8f4b5fa5b4bb3d4fbbf7a1'),
+            UUID('5e6d0e5a8f0c4f4c9d1a3c1f6c6b2d7e'),
+        ]
+        self.create_task(
+            task_name='success_task',
+            task_id=task_ids[1],
+            status=Status.in_progress,
+        )
+        stale_task = self.create_task(
+            task_name='success_task',
+            task_id=task_ids[2],
+            status=Status.in_progress,
+            date_created=datetime.utcnow() - timedelta(hours=2),
+        )
+
+        success_task.delay_if_needed_many([
+            {'foo': 'bar', 'task_id': task_id.hex} for task_id in task_ids
+        ])
+
+        queue_delay_many.assert_called_once_with('success_task', [
+            {'foo': 'bar', 'task_id': task_ids[0].hex},
+            {'foo': 'bar', 'task_id': task_ids[2].hex},
+        ])
+        assert Task.query.filter(Task.task_id == task_ids[0]).first()
+
+        db.session.refresh(stale_task)
+        assert stale_task.date_modified > datetime.utcnow() - timedelta(minutes=1)
+
+
 class VerifyAllChildrenTest(TestCase):
     def test_children_unfinished(self):
         parent_task_id = UUID('659974858dcf4aa08e73a940e1066328')
@@ -192,8 +293,8 @@ class VerifyAllChildrenTest(TestCase):
         assert result == Status.finished
 
     @mock.patch('changes.queue.task.TrackedTask.needs_requeued')
-    @mock.patch('changes.config.queue.delay')
-    def test_child_needs_run(self, queue_delay, needs_requeued):
+    @mock.patch('changes.config.queue.delay_many')
+    def test_child_needs_run(self, queue_delay_many, needs_requeued):
         child_id = UUID('33846695b2774b29a71795a009e8168a')
         parent_task_id = UUID('659974858dcf4aa08e73a940e1066328')
 
@@ -216,13 +317,11 @@ class VerifyAllChildrenTest(TestCase):
         assert result == Status.in_progress
 
         needs_requeued.assert_called_once_with(task)
-        queue_delay.assert_called_once_with(
-            'success_task', kwargs={
-                'task_id': child_id.hex,
-                'parent_task_id': parent_task_id.hex,
-                'foo': 'bar',
-            },
-        )
+        queue_delay_many.assert_called_once_with('success_task', [{
+            'task_id': child_id.hex,
+            'parent_task_id': parent_task_id.hex,
+            'foo': 'bar',
+        }])
 
     @mock.patch('changes.queue.task.TrackedTask.needs_expired')
     @mock.patch('changes.config.queue.delay')
@@ -361,3 +460,146 @@ class RunTest(TestCase):
             },
             countdown=61,
         )
+
+    @mock.patch('changes.config.queue.delay')
+    @mock.patch('changes.config.queue.retry')
+    def test_superseded(self, queue_retry, queue_delay):
+        task_id = UUID('33846695b2774b29a71795a009e8168a')
+        parent_task_id = UUID('659974858dcf4aa08e73a940e1066328')
+
+        self.create_task(
+            task_name='superseded_task',
+            task_id=task_id,
+            parent_id=parent_task_id,
+            status=Status.in_progress,
+        )
+
+        superseded_task(
+            foo='bar',
+            task_id=task_id.hex,
+            parent_task_id=parent_task_id.hex,
+        )
+
+        task = Task.query.filter(
+            Task.task_id == task_id,
+            Task.task_name == 'superseded_task'
+        ).first()
+
+        assert task.status == Status.in_progress
+        assert task.num_retries == 0
+        assert not queue_delay.called
+        assert not queue_retry.called
+
+
+class TaskStateTest(TestCase):
+    def setUp(self):
+        super(TaskStateTest, self).setUp()
+        patcher = mock.patch.dict(current_app.config, {'TASK_STATE_REDIS_ENABLED': True})
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def get_task(self, task_name, task_id):
+        db.session.expire_all()
+        return Task.query.filter(
+            Task.task_id == task_id,
+            Task.task_name == task_name,
+        ).first()
+
+    @mock.patch('changes.config.queue.delay')
+    def test_unfinished(self, queue_delay):
+        task_id = UUID('33846695b2774b29a71795a009e8168a')
+        parent_task_id = UUID('659974858dcf4aa08e73a940e1066328')
+        date_created = datetime.utcnow() - timedelta(minutes=5)
+        self.create_task(
+            task_name='unfinished_task',
+            task_id=task_id,
+            parent_id=parent_task_id,
+            status=Status.queued,
+            date_created=date_created,
+            date_modified=date_created,
+        )
+
+        for _ in range(2):
+            unfinished_task(
+                foo='bar',
+                task_id=task_id.hex,
+                parent_task_id=parent_task_id.hex,
+            )
+        assert queue_delay.call_count == 2
+
+        # only the first run (which cached the state) wrote to the task
+        task = self.get_task('unfinished_task', task_id)
+        assert task.status == Status.in_progress
+        date_continued = task.date_modified
+        assert date_continued > date_created
+
+        state = task_state.get('unfinished_task', task_id)
+        assert state.status == Status.in_progress
+        assert state.parent_id == parent_task_id
+        assert state.date_modified > date_continued
+
+        assert task_state.flush() == 1
+        task = self.get_task('unfinished_task', task_id)
+        assert task.status == Status.in_progress
+        assert task.date_modified == state.date_modified
+        assert task_state.flush() == 0
+
+    @mock.patch('changes.config.queue.delay')
+    def test_finished(self, queue_delay):
+        task_id = UUID('33846695b2774b29a71795a009e8168a')
+        task = self.create_task(
+            task_name='success_task',
+            task_id=task_id,
+            status=Status.in_progress,
+        )
+        task_state.prime(task)
+
+        success_task(task_id=task_id.hex)
+
+        assert task_state.get('success_task', task_id) is None
+        assert self.get_task('success_task', task_id).status == Status.finished
+
+        # a flush can't undo finishing
+        task_state.touch('success_task', task_id, datetime.utcnow(), Status.in_progress)
+        task_state.flush()
+        assert self.get_task('success_task', task_id).status == Status.finished
+
+    @mock.patch('changes.config.queue.delay')
+    def test_delay_if_needed(self, queue_delay):
+        task_id = UUID('33846695b2774b29a71795a009e8168a')
+        task = self.create_task(
+            task_name='success_task',
+            task_id=task_id,
+            status=Status.in_progress,
+            date_modified=datetime.utcnow() - timedelta(hours=2),
+        )
+        task_state.prime(task)
+
+        task_state.touch('success_task', task_id, datetime.utcnow())
+        success_task.delay_if_needed(task_id=task_id.hex)
+        assert not queue_delay.called
+
+        task_state.touch('success_task', task_id, datetime.utcnow() - timedelta(hours=2))
+        success_task.delay_if_needed(task_id=task_id.hex)
+        queue_delay.assert_called_once_with('success_task', kwargs={
+            'task_id': task_id.hex,
+        })
+
+    def test_verify_all_children(self):
+        parent_task_id = UUID('659974858dcf4aa08e73a940e1066328')
+        task = self.create_task(
+            task_name='success_task',
+            task_id=UUID('33846695b2774b29a71795a009e8168a'),
+            parent_id=parent_task_id,
+            status=Status.queued,
+            date_modified=datetime.utcnow() - timedelta(hours=3),
+        )
+        task_state.prime(task)
+        task_state.touch('success_task', task.task_id, datetime.utcnow(), Status.in_progress)
+
+        success_task.task_id = parent_task_id.hex
+        assert success_task.verify_all_children() == Status.in_progress
+
+        # the merged state wasn't written
+        task = self.get_task('success_task', task.task_id)
+        assert task.status == Status.queued
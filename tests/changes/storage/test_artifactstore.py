@@ -0,0 +1,110 @@
+from __future__ import absolute_import
+
+import mock
+import shutil
+import tempfile
+
+from flask import current_app
+from uuid import uuid4
+
+from changes.lib.artifact_store_mock import ArtifactStoreMock
+from changes.storage import artifactstore
+from changes.storage.artifactstore import ArtifactStoreFileStorage
+from changes.testutils import TestCase
+
+
+@mock.patch('changes.storage.artifactstore.ArtifactStoreClient', ArtifactStoreMock)
+class ArtifactStoreFileStorageTest(TestCase):
+    def setUp(self):
+        super(ArtifactStoreFileStorageTest, self).setUp()
+        directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, directory)
+        patcher = mock.patch.dict(current_app.config, {
+            'ARTIFACT_CONTENT_CACHE_DIR': directory,
+        })
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        patcher = mock.patch.dict(artifactstore._sized_artifacts, clear=True)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+        self.bucket_name = uuid4().hex
+        ArtifactStoreMock('').create_bucket(self.bucket_name)
+
+    def test_caches_content(self):
+        storage = ArtifactStoreFileStorage()
+        filename = storage.save(
+            ArtifactStoreFileStorage.get_filename_from_artifact_name(self.bucket_name, 'foo.log'),
+            mock.Mock(read=lambda: 'hello world'),
+        )
+
+        with mock.patch.object(ArtifactStoreMock, 'get_artifact_content',
+                               autospec=True, side_effect=ArtifactStoreMock.get_artifact_content.im_func) as get_content, \
+                mock.patch.object(ArtifactStoreMock, 'iter_artifact_content',
+                                  autospec=True, side_effect=ArtifactStoreMock.iter_artifact_content.im_func) as iter_content:
+            assert storage.get_size(filename) == 11
+            # sizes alone don't fill the cache
+            assert iter_content.call_count == 0
+
+            assert storage.get_file(filename).read() == 'hello world'
+            assert ArtifactStoreFileStorage().get_file(filename, offset=6, length=3).read() == 'wor'
+            assert ArtifactStoreFileStorage().get_size(filename) == 11
+
+        assert iter_content.call_count == 1
+        assert get_content.call_count == 0
+
+    def test_open_artifact_not_cached(self):
+        client = ArtifactStoreMock('')
+        artifact_name = client.create_chunked_artifact(self.bucket_name, 'foo.log').name
+        client.post_artifact_chunk(self.bucket_name, artifact_name, 0, 'hello')
+        filename = ArtifactStoreFileStorage.get_filename_from_artifact_name(self.bucket_name, artifact_name)
+
+        storage = ArtifactStoreFileStorage()
+        with mock.patch.object(ArtifactStoreMock, 'get_artifact',
+                               autospec=True, side_effect=ArtifactStoreMock.get_artifact.im_func) as get_artifact:
+            assert storage.get_size(filename) == 5
+            assert storage.get_file(filename).read() == 'hello'
+        # the artifact fetched for its size is reused to tell it's still open
+        assert get_artifact.call_count == 1
+
+        client.post_artifact_chunk(self.bucket_name, artifact_name, 5, ' world')
+        assert storage.get_file(filename, offset=6).read() == 'world'
+        assert storage.get_file(filename).read() == 'hello world'
+
+    def test_ranged_miss_not_cached(self):
+        storage = ArtifactStoreFileStorage()
+        filename = storage.save(
+            ArtifactStoreFileStorage.get_filename_from_artifact_name(self.bucket_name, 'foo.log'),
+            mock.Mock(read=lambda: 'hello world'),
+        )
+
+        with mock.patch.object(ArtifactStoreMock, 'get_artifact',
+                               autospec=True, side_effect=ArtifactStoreMock.get_artifact.im_func) as get_artifact, \
+                mock.patch.object(ArtifactStoreMock, 'iter_artifact_content',
+                                  autospec=True, side_effect=ArtifactStoreMock.iter_artifact_content.im_func) as iter_content:
+            assert storage.get_file(filename, offset=6, length=3).read() == 'wor'
+            # nor are whole reads of artifacts whose sizes weren't just fetched
+            assert storage.get_file(filename).read() == 'hello world'
+
+        assert get_artifact.call_count == 0
+        assert iter_content.call_count == 0
+
+    def test_too_large_not_cached(self):
+        patcher = mock.patch.dict(current_app.config, {
+            'ARTIFACT_CONTENT_CACHE_MAX_ENTRY_BYTES': 5,
+        })
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+        storage = ArtifactStoreFileStorage()
+        filename = storage.save(
+            ArtifactStoreFileStorage.get_filename_from_artifact_name(self.bucket_name, 'foo.log'),
+            mock.Mock(read=lambda: 'hello world'),
+        )
+
+        with mock.patch.object(ArtifactStoreMock, 'iter_artifact_content',
+                               autospec=True, side_effect=ArtifactStoreMock.iter_artifact_content.im_func) as iter_content:
+            assert storage.get_size(filename) == 11
+            assert storage.get_file(filename).read() == 'hello world'
+
+        assert iter_content.call_count == 0
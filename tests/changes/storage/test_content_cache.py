@@ -0,0 +1,77 @@
+from __future__ import absolute_import
+
+import mock
+import os
+import shutil
+import tempfile
+
+from changes.storage.content_cache import ContentCache
+from changes.testutils import TestCase
+
+
+class ContentCacheTest(TestCase):
+    def setUp(self):
+        super(ContentCacheTest, self).setUp()
+        self.directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.directory)
+
+    def test_get(self):
+        cache = ContentCache(self.directory, max_bytes=100)
+        assert cache.get_size('foo') is None
+        assert cache.open('foo') is None
+
+        cache.put('foo', 'hello world')
+        assert cache.get_size('foo') == 11
+        assert cache.open('foo').read() == 'hello world'
+        fp = cache.open('foo')
+        assert fp.read(5) == 'hello'
+        assert fp.read() == ' world'
+        fp.close()
+        assert cache.open('foo', offset=6).read() == 'world'
+        assert cache.open('foo', offset=2, length=3).read() == 'llo'
+
+        cache.put('empty', '')
+        assert cache.open('empty').read() == ''
+
+    def test_evicts_least_recently_used(self):
+        cache = ContentCache(self.directory, max_bytes=25)
+        cache.put('a', 'a' * 10)
+        cache.put('b', 'b' * 10)
+        # make `b` older than `a`, as if `a` was read since
+        for key, mtime in (('a', 2000), ('b', 1000)):
+            os.utime(cache._get_path(key), (mtime, mtime))
+
+        cache.put('c', 'c' * 10)
+
+        assert cache.get_size('a') == 10
+        assert cache.get_size('b') is None
+        assert cache.get_size('c') == 10
+
+    def test_put_chunks(self):
+        cache = ContentCache(self.directory, max_bytes=100)
+        assert cache.put('foo', iter(['hello', ' ', 'world']))
+        assert cache.open('foo').read() == 'hello world'
+
+    def test_evicts_only_when_full(self):
+        cache = ContentCache(self.directory, max_bytes=25)
+        with mock.patch.object(ContentCache, '_evict', autospec=True,
+                               side_effect=ContentCache._evict.im_func) as evict:
+            cache.put('a', 'a' * 10)
+            cache.put('b', 'b' * 10)
+            # the first put lists the directory, the second one fits
+            assert evict.call_count == 1
+
+            cache.put('c', 'c' * 10)
+            assert evict.call_count == 2
+
+        assert cache.get_size('a') is None
+        assert cache.get_size('b') == 10
+        assert cache.get_size('c') == 10
+
+    def test_too_large(self):
+        cache = ContentCache(self.directory, max_bytes=5)
+        assert not cache.put('a', 'a' * 10)
+        assert not cache.put('b', iter(['b' * 4, 'b' * 4]))
+        assert cache.get_size('a') is None
+        assert cache.get_size('b') is None
+        assert os.listdir(self.directory) == []
@@ -0,0 +1,38 @@
+import mock
+
+from changes.utils.cache import LRUCache
+
+
+def test_lru_cache():
+    cache = LRUCache(max_size=2)
+    cache['a'] = 1
+    cache['b'] = 2
+    assert cache.get('a') == 1
+
+    # 'b' is now the least recently used
+    cache['c'] = 3
+    assert len(cache) == 2
+    assert 'b' not in cache
+    assert cache.get('b') is None
+    assert cache.get('a') == 1
+    assert cache.get('c') == 3
+
+    cache['a'] = 4
+    assert cache.get('a') == 4
+    assert len(cache) == 2
+
+    cache.clear()
+    assert len(cache) == 0
+
+
+def test_lru_cache_ttl():
+    cache = LRUCache(max_size=2, ttl=10)
+    with mock.patch('changes.utils.cache.time.time', return_value=100):
+        cache['a'] = 1
+    with mock.patch('changes.utils.cache.time.time', return_value=109):
+        assert 'a' in cache
+        assert cache.get('a') == 1
+    with mock.patch('changes.utils.cache.time.time', return_value=110):
+        assert 'a' not in cache
+        assert cache.get('a') is None
+        assert len(cache) == 0
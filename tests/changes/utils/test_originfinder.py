@@ -1,7 +1,11 @@
+import mock
+
 from datetime import datetime
 
 from changes.constants import Result, Status
+from changes.jobs.update_project_stats import update_test_failure_streaks
 from changes.testutils import TestCase
+from changes.utils import originfinder
 from changes.utils.originfinder import find_failure_origins
 
 
@@ -44,3 +48,102 @@ class FindFailureOriginsTest(TestCase):
             foo_d: build_b,
             bar_d: build_c
         }
+
+    def create_finished_build(self, project, day, failing=(), passing=()):
+        build = self.create_build(
+            project=project, status=Status.finished,
+            result=Result.failed if failing else Result.passed,
+            date_created=datetime(2013, 9, day))
+        job = self.create_job(
+            build=build, status=Status.finished, result=build.result)
+        tests = {}
+        for name in failing:
+            tests[name] = self.create_test(job, name=name, result=Result.failed)
+        for name in passing:
+            tests[name] = self.create_test(job, name=name, result=Result.passed)
+        return build, tests
+
+    def test_from_streaks(self):
+        project = self.create_project()
+        builds = [
+            self.create_finished_build(project, 1, passing=['foo', 'bar', 'baz']),
+            self.create_finished_build(project, 2, failing=['foo'], passing=['bar', 'baz']),
+            self.create_finished_build(project, 3, failing=['foo', 'bar'], passing=['baz']),
+        ]
+        for build, _ in builds:
+            update_test_failure_streaks(project_id=project.id.hex, build_id=build.id.hex)
+
+        # not recorded yet, as it has just finished
+        build_d, tests_d = self.create_finished_build(project, 4, failing=['foo', 'bar', 'baz'])
+
+        with mock.patch.object(originfinder, '_scan_failure_origins') as scan:
+            result = find_failure_origins(build_d, tests_d.values())
+        assert not scan.called
+        assert result == {
+            tests_d['foo']: builds[1][0],
+            tests_d['bar']: builds[2][0],
+            tests_d['baz']: build_d,
+        }
+
+        update_test_failure_streaks(project_id=project.id.hex, build_id=build_d.id.hex)
+
+        with mock.patch.object(originfinder, '_scan_failure_origins') as scan:
+            result = find_failure_origins(build_d, tests_d.values())
+        assert not scan.called
+        assert result == {
+            tests_d['foo']: builds[1][0],
+            tests_d['bar']: builds[2][0],
+            tests_d['baz']: build_d,
+        }
+
+    def test_from_ended_streaks(self):
+        project = self.create_project()
+        build_a, _ = self.create_finished_build(project, 1, passing=['foo'])
+        build_b, _ = self.create_finished_build(project, 2, failing=['foo'])
+        build_c, tests_c = self.create_finished_build(project, 3, failing=['foo'])
+        build_d, _ = self.create_finished_build(project, 4, passing=['foo'])
+        for build in (build_a, build_b, build_c, build_d):
+            update_test_failure_streaks(project_id=project.id.hex, build_id=build.id.hex)
+
+        # the streak ended, so it is scanned for
+        result = find_failure_origins(build_c, [tests_c['foo']])
+        assert result == {tests_c['foo']: build_b}
+
+    def test_older_than_streaks(self):
+        project = self.create_project()
+        build_a, _ = self.create_finished_build(project, 1, passing=['foo'])
+        build_b, _ = self.create_finished_build(project, 2, failing=['foo'])
+        build_c, tests_c = self.create_finished_build(project, 3, failing=['foo'])
+        update_test_failure_streaks(project_id=project.id.hex, build_id=build_c.id.hex)
+
+        with mock.patch.object(originfinder, '_scan_failure_origins') as scan:
+            scan.return_value = {tests_c['foo']: build_b}
+            result = find_failure_origins(build_b, [tests_c['foo']])
+        scan.assert_called_once_with(build_b, [tests_c['foo']])
+        assert result == {tests_c['foo']: build_b}
+
+    def test_late_builds(self):
+        project = self.create_project()
+        build_a, _ = self.create_finished_build(project, 1, passing=['foo'])
+        build_b, _ = self.create_finished_build(project, 2, failing=['foo'])
+        build_c, tests_c = self.create_finished_build(project, 3, failing=['foo'])
+        # build_b finishes after build_c
+        for build in (build_a, build_c, build_b):
+            update_test_failure_streaks(project_id=project.id.hex, build_id=build.id.hex)
+
+        with mock.patch.object(originfinder, '_scan_failure_origins') as scan:
+            result = find_failure_origins(build_c, [tests_c['foo']])
+        assert not scan.called
+        assert result == {tests_c['foo']: build_b}
+
+        # passes in the middle of the streak, so where it started is scanned for
+        build_e, tests_e = self.create_finished_build(project, 5, failing=['foo'])
+        update_test_failure_streaks(project_id=project.id.hex, build_id=build_e.id.hex)
+        build_d, _ = self.create_finished_build(project, 4, passing=['foo'])
+        update_test_failure_streaks(project_id=project.id.hex, build_id=build_d.id.hex)
+
+        with mock.patch.object(originfinder, '_scan_failure_origins') as scan:
+            scan.return_value = {tests_e['foo']: build_e}
+            result = find_failure_origins(build_e, [tests_e['foo']])
+        scan.assert_called_once_with(build_e, [tests_e['foo']])
+        assert result == {tests_e['foo']: build_e}
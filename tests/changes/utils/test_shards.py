@@ -1,3 +1,6 @@
+import mock
+
+from changes.utils import shards
 from changes.utils.shards import shard
 from changes.testutils.cases import TestCase
 
@@ -34,3 +37,64 @@ class ShardingTestCase(TestCase):
         # more shards than tests
         groups = shard(tests, len(tests) * 2, test_weights, avg_test_time, normalize_object_name=lambda x: tuple(x.split('/')))
         assert len(groups) == len(tests)
+
+    def test_shard_improves_greedy(self):
+        # longest-first greedy puts 3+2 and 3+2+2 together (makespan 8)
+        # where 3+3 and 2+2+2 is possible
+        tests = ['a', 'b', 'c', 'd', 'e']
+        test_weights = {'a': 2, 'b': 2, 'c': 1, 'd': 1, 'e': 1}
+
+        groups = shard(tests, 2, test_weights, 1)
+        assert sorted(weight for weight, _ in groups) == [6, 6]
+
+    def test_shard_variance(self):
+        # 'a' and 'b' are as slow on average, but 'a' is much less predictable
+        tests = ['a', 'b', 'c', 'd']
+        test_weights = {'a': 99, 'b': 99, 'c': 49, 'd': 49}
+        test_variances = {'a': 10000, 'b': 0, 'c': 0, 'd': 0}
+
+        groups = shard(tests, 2, test_weights, 50)
+        assert sorted(len(objects) for _, objects in groups) == [2, 2]
+
+        groups = shard(tests, 2, test_weights, 50, object_variances=test_variances)
+        groups.sort()
+        assert groups[0] == (100, ['a'])
+        assert groups[1] == (200, ['b', 'd', 'c'])
+
+    def test_shard_overhead(self):
+        tests = ['a', 'b', 'c', 'd']
+        test_weights = {'a': 9, 'b': 9, 'c': 9, 'd': 9}
+
+        groups = shard(tests, 4, test_weights, 10)
+        assert len(groups) == 4
+
+        # a shard costs far more to set up than it saves
+        groups = shard(tests, 4, test_weights, 10, shard_overhead=1000)
+        assert sorted(weight for weight, _ in groups) == [20, 20]
+
+        # but not when its objects take long enough
+        groups = shard(tests, 4, test_weights, 10, shard_overhead=5)
+        assert len(groups) == 4
+
+        test_weights = {'a': 999, 'b': 999, 'c': 0, 'd': 0}
+        groups = shard(tests, 4, test_weights, 10, shard_overhead=100)
+        assert sorted(weight for weight, _ in groups) == [1001, 1001]
+
+    def test_shard_overhead_bounded_search(self):
+        tests = ['test_%d' % i for i in xrange(5000)]
+        test_weights = {name: 10 + i % 100 for i, name in enumerate(tests)}
+
+        with mock.patch.object(shards, '_assign', wraps=shards._assign) as assign:
+            groups = shard(tests, 200, test_weights, 50, shard_overhead=1000)
+
+        # the search over shard counts takes about log2(200) assignments
+        assert assign.call_count <= 12
+        assert 1 < len(groups) < 200
+        assert sorted(name for _, names in groups for name in names) == sorted(tests)
+
+    def test_shard_no_objects(self):
+        assert shard([], 3, {}, 10) == []
+        assert shard([], 3, {}, 10, shard_overhead=100) == []
+
+    def test_shard_no_shards(self):
+        assert shard(['foo', 'bar'], 0, {}, 10) == []
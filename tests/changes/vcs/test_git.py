@@ -10,6 +10,7 @@ from changes.vcs.base import (
         ContentReadError, MissingFileError, UnknownChildRevision, UnknownParentRevision, UnknownRevision,
 )
 from changes.vcs.git import GitVcs
+from changes.vcs.server import GitCatFileServer, close_servers
 
 from tests.changes.vcs.asserts import VcsAsserts
 
@@ -432,6 +433,20 @@ index 0000000..d0c77a5
 
         assert isinstance(patch_hash, str) and len(patch_hash) == 40
 
+    def test_get_patch_hashes(self):
+        self._add_file('BAZ', self.remote_path, commit_msg="baz")
+        vcs = self.get_vcs()
+        vcs.clone()
+        vcs.update()
+        shas = [r.id for r in vcs.log()]
+
+        patch_hashes = vcs.get_patch_hashes(shas)
+
+        assert set(patch_hashes) == set(shas)
+        assert len(set(patch_hashes.values())) == len(shas)
+        for patch_hash in patch_hashes.values():
+            assert isinstance(patch_hash, str) and len(patch_hash) == 40
+
 
 class GetRepositoryTestCase(TestCase):
 
@@ -447,3 +462,23 @@ class GetRepositoryTestCase(TestCase):
             ('example.com:some-prefix/test-with-hyphen', 'test-with-hyphen.git'),
         ]:
             assert GitVcs.get_repository_name(url) == expected_name
+
+
+class GitVcsCommandServerTest(GitVcsTest):
+    """Runs the same tests with reads going through command servers."""
+    def setUp(self):
+        super(GitVcsCommandServerTest, self).setUp()
+        self.addCleanup(close_servers)
+
+    def get_vcs(self):
+        vcs = super(GitVcsCommandServerTest, self).get_vcs()
+        vcs.command_server = True
+        return vcs
+
+    def test_server_error_output_not_piped(self):
+        vcs = self.get_vcs()
+        vcs.clone()
+        vcs.update()
+
+        with vcs._get_server(GitCatFileServer) as server:
+            assert server.proc.stderr is None
@@ -9,6 +9,7 @@ from subprocess import check_call
 from changes.testutils import TestCase
 from changes.vcs.base import CommandError, UnknownRevision
 from changes.vcs.hg import MercurialVcs
+from changes.vcs.server import close_servers
 
 from tests.changes.vcs.asserts import VcsAsserts
 
@@ -307,3 +308,17 @@ diff -r 2104491cf7a3 FOO1
         patch_hash = vcs.get_patch_hash(sha)
 
         assert patch_hash is None
+
+
+@pytest.mark.skipif(not has_current_hg_version(),
+                    reason='missing or invalid mercurial version')
+class MercurialVcsCommandServerTest(MercurialVcsTest):
+    """Runs the same tests with reads going through command servers."""
+    def setUp(self):
+        super(MercurialVcsCommandServerTest, self).setUp()
+        self.addCleanup(close_servers)
+
+    def get_vcs(self):
+        vcs = super(MercurialVcsCommandServerTest, self).get_vcs()
+        vcs.command_server = True
+        return vcs
@@ -0,0 +1,71 @@
+from __future__ import absolute_import
+
+import pytest
+
+from subprocess import PIPE, Popen, check_call, check_output
+
+from changes.testutils import TestCase
+from changes.vcs.server import (
+    CommandServerError, GitCatFileServer, close_servers, get_server,
+)
+
+
+class GetServerTest(TestCase):
+    path = '/tmp/changes-server-test'
+
+    def setUp(self):
+        check_call(['rm', '-rf', self.path])
+        check_call(['git', 'init', self.path])
+        with open('%s/FOO' % (self.path,), 'w') as f:
+            f.write('foo\n')
+        check_call(['git', 'add', 'FOO'], cwd=self.path)
+        check_call(['git', '-c', 'user.name=Foo Bar', '-c', 'user.email=foo@example.com',
+                    'commit', '-m', 'test'], cwd=self.path)
+        self.sha = check_output(['git', 'rev-parse', 'HEAD'], cwd=self.path).strip()
+        self.addCleanup(check_call, ['rm', '-rf', self.path])
+        self.addCleanup(close_servers)
+        self.started = []
+
+    def start(self, args):
+        proc = Popen(['git'] + args, cwd=self.path, stdin=PIPE, stdout=PIPE)
+        self.started.append(proc)
+        return proc
+
+    def test_reuses_server(self):
+        with get_server(GitCatFileServer, self.path, self.start) as server:
+            info, content = server.read('%s:FOO' % (self.sha,))
+            assert info.endswith(' blob 4')
+            assert content == 'foo\n\n'
+            first = server
+
+        with get_server(GitCatFileServer, self.path, self.start) as server:
+            assert server is first
+            info, content = server.read('%s:BAR' % (self.sha,))
+            assert info.endswith(' missing')
+            assert content == ''
+
+        assert len(self.started) == 1
+
+    def test_concurrent_use(self):
+        with get_server(GitCatFileServer, self.path, self.start) as first:
+            with get_server(GitCatFileServer, self.path, self.start) as second:
+                assert first is not second
+        assert len(self.started) == 2
+
+    def test_replaces_dead_server(self):
+        with get_server(GitCatFileServer, self.path, self.start) as server:
+            first = server
+        first.proc.kill()
+        first.proc.wait()
+
+        with pytest.raises((CommandServerError, IOError)):
+            with get_server(GitCatFileServer, self.path, self.start) as server:
+                assert server is first
+                server.read('%s:FOO' % (self.sha,))
+        assert first.closed
+
+        with get_server(GitCatFileServer, self.path, self.start) as server:
+            assert server is not first
+            info, _ = server.read('%s:FOO' % (self.sha,))
+            assert info.endswith(' blob 4')
+        assert len(self.started) == 2